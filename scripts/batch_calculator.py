@@ -2,7 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import json
 import time
+import hashlib
 import pandas as pd
 from pathlib import Path
 from loguru import logger
@@ -11,216 +13,347 @@ import argparse
 # 添加当前目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent))
 
+from batch_spill import SPILL_FORMATS, BatchSpill
+from kernel_backends import KERNEL_BACKENDS
+from memory_budget import MemoryBudget, RSSMonitor, history_length
+from run_manifest import RunManifest, manifest_path_for
+from sharding import SHARD_STRATEGIES, merge_shards_main, shard_output_path, write_shard_sidecar
 from qlib_indicators import QlibIndicatorsEnhancedCalculator
+from result_assembler import ResultAssembler
+
+DEFAULT_BATCH_SIZE = 20
 
 class BatchIndicatorCalculator:
     """
     批处理指标计算器
     将大量股票分批处理，避免内存溢出和索引冲突
+    
+    指定 memory_limit_mb 时按内存预算自适应地决定每批的股票数量（batch_size 为每批上限），
+    否则每批固定 batch_size 只股票；每个批次的结果以 spill_format 格式落盘。
+    num_shards > 1 时只计算第 shard_index 个分片的股票，输出文件名带分片标记；
+    kernel_backend 选择滚动窗口内核的实现 (auto/numpy/numba)
     """
     
-    def __init__(self, data_dir: str = None, batch_size: int = 20, max_workers: int = 8):
+    def __init__(self, data_dir: str = None, batch_size: int = None, max_workers: int = 8,
+                 memory_limit_mb: float = None, spill_format: str = 'arrow',
+                 num_shards: int = 1, shard_index: int = 0, shard_strategy: str = 'balanced',
+                 kernel_backend: str = 'numpy'):
+        if spill_format not in SPILL_FORMATS:
+            raise ValueError(f"Unsupported spill format: {spill_format}, expected one of {SPILL_FORMATS}")
         self.batch_size = batch_size
         self.max_workers = max_workers
+        self.spill_format = spill_format
         
         # 创建计算器
+        shard_settings = dict(num_shards=num_shards, shard_index=shard_index, shard_strategy=shard_strategy,
+                              kernel_backend=kernel_backend)
         if data_dir:
             self.calculator = QlibIndicatorsEnhancedCalculator(
                 data_dir=data_dir,
                 enable_parallel=True,
-                max_workers=max_workers
+                max_workers=max_workers,
+                **shard_settings
             )
         else:
             self.calculator = QlibIndicatorsEnhancedCalculator(
                 enable_parallel=True,
-                max_workers=max_workers
+                max_workers=max_workers,
+                **shard_settings
             )
         
-        logger.info(f"批处理配置: 批次大小={batch_size}, 线程数={max_workers}")
+        self.memory_budget = None
+        if memory_limit_mb:
+            self.memory_budget = MemoryBudget(memory_limit_mb, self.planned_column_count(), max_batch_size=batch_size)
+            logger.info(f"批处理配置: {self.memory_budget.describe()}, 线程数={max_workers}")
+        else:
+            logger.info(f"批处理配置: 批次大小={batch_size or DEFAULT_BATCH_SIZE}, 线程数={max_workers}")
+    
+    def planned_column_count(self) -> int:
+        """指标计划输出的列数（估算每只股票内存用）"""
+        plan = self.calculator.plan
+        catalog = self.calculator.indicator_catalog()
+        return len(QlibIndicatorsEnhancedCalculator.BASE_COLUMNS) + sum(
+            len(plan.select(family, columns)) for family, columns in catalog.items()
+        )
+    
+    def get_stocks(self, max_stocks: int = None):
+        return self.calculator.select_stocks(max_stocks)
     
     def get_stock_batches(self, max_stocks: int = None):
-        """将股票分批"""
-        stocks = self.calculator.get_available_stocks()
-        
-        if max_stocks:
-            stocks = stocks[:max_stocks]
+        """将股票按固定大小分批"""
+        return self._fixed_batches(self.get_stocks(max_stocks))
+    
+    def _fixed_batches(self, stocks):
+        batch_size = self.batch_size or DEFAULT_BATCH_SIZE
         
         # 分批
         batches = []
-        for i in range(0, len(stocks), self.batch_size):
-            batch = stocks[i:i + self.batch_size]
+        for i in range(0, len(stocks), batch_size):
+            batch = stocks[i:i + batch_size]
             batches.append(batch)
         
         logger.info(f"总股票数: {len(stocks)}, 分为 {len(batches)} 个批次")
         return batches
     
-    def process_single_batch(self, batch_stocks, batch_num, total_batches):
-        """处理单个批次"""
-        logger.info(f"🔄 开始处理批次 {batch_num}/{total_batches} ({len(batch_stocks)} 只股票)")
+    def iter_stock_batches(self, stocks, start: int = 1):
+        """
+        逐个产出 (批次编号, 批次总数, 股票列表)，批次编号从 start 开始（续算时接着上一次的编号）
+        
+        按内存预算分批时，每个批次的大小在上一批次完成后才决定（批次总数为 None）
+        """
+        if self.memory_budget is None:
+            batches = self._fixed_batches(stocks)
+            for i, batch in enumerate(batches, start):
+                yield i, start - 1 + len(batches), batch
+            return
+        
+        remaining = list(stocks)
+        lengths = {symbol: history_length(self.calculator.features_dir, symbol) for symbol in remaining}
+        logger.info(f"总股票数: {len(remaining)}, 按内存预算分批 (共 {sum(lengths.values())} 个股票交易日)")
+        batch_num = start - 1
+        while remaining:
+            batch, remaining = self.memory_budget.take_batch(remaining, lengths)
+            batch_num += 1
+            yield batch_num, None, batch
+    
+    def _calculate_batch(self, batch_stocks):
+        """计算一个批次的指标（异常交给调用方处理）"""
+        return self.calculator.calculate_all_indicators(stocks=batch_stocks)
+    
+    def process_single_batch(self, batch_stocks, batch_num, total_batches=None):
+        """处理单个批次；内存不足时拆分为两半分别重试"""
+        label = f"{batch_num}/{total_batches}" if total_batches else f"{batch_num}"
+        logger.info(f"🔄 开始处理批次 {label} ({len(batch_stocks)} 只股票)")
         
         start_time = time.time()
         
         try:
-            # 临时修改股票列表
-            original_get_stocks = self.calculator.get_available_stocks
-            self.calculator.get_available_stocks = lambda: batch_stocks
-            
-            # 计算指标
-            result = self.calculator.calculate_all_indicators()
-            
-            # 恢复原始方法
-            self.calculator.get_available_stocks = original_get_stocks
-            
-            elapsed_time = time.time() - start_time
-            
-            if not result.empty:
-                logger.info(f"✅ 批次 {batch_num} 完成: {len(result)} 行, {len(result.columns)-1} 个指标 (耗时: {elapsed_time:.2f}s)")
-                return result
-            else:
-                logger.warning(f"⚠️ 批次 {batch_num} 结果为空")
-                return None
-                
+            with RSSMonitor() as monitor:
+                result = self._calculate_batch(batch_stocks)
+        except MemoryError:
+            return self._split_and_retry(batch_stocks, batch_num)
         except Exception as e:
             logger.error(f"❌ 批次 {batch_num} 处理失败: {e}")
             return None
+        
+        elapsed_time = time.time() - start_time
+        if monitor.growth is not None:
+            logger.info(f"💾 批次 {batch_num} 内存峰值: {monitor.peak / 1024 / 1024:.0f}MB "
+                        f"(增长 {monitor.growth / 1024 / 1024:.0f}MB)")
+        
+        if not result.empty:
+            if self.memory_budget is not None:
+                self.memory_budget.observe(len(result), monitor.growth)
+            logger.info(f"✅ 批次 {batch_num} 完成: {len(result)} 行, {len(result.columns)-1} 个指标 (耗时: {elapsed_time:.2f}s)")
+            return result
+        else:
+            logger.warning(f"⚠️ 批次 {batch_num} 结果为空")
+            return None
+    
+    def _split_and_retry(self, batch_stocks, batch_num):
+        """批次内存不足：拆分为两半依次计算，单只股票仍然不足时跳过该股票"""
+        if self.memory_budget is not None:
+            self.memory_budget.penalize()
+        if len(batch_stocks) == 1:
+            logger.error(f"❌ 批次 {batch_num}: {batch_stocks[0]} 单独计算时内存不足，跳过")
+            return None
+        
+        middle = len(batch_stocks) // 2
+        logger.warning(f"⚠️ 批次 {batch_num} 内存不足，拆分为 {middle} + {len(batch_stocks) - middle} 只股票重试")
+        assembler = ResultAssembler()
+        for i, part in enumerate((batch_stocks[:middle], batch_stocks[middle:]), 1):
+            result = self.process_single_batch(part, f"{batch_num}.{i}")
+            if result is not None:
+                assembler.add(result)
+        return assembler.assemble() if len(assembler) else None
+    
+    def batch_fingerprint(self, batch_stocks) -> str:
+        """批次的输入指纹：批次内每只股票的输入指纹（行情、财务数据与指标配置）"""
+        digest = hashlib.sha1()
+        for symbol in batch_stocks:
+            digest.update(self.calculator.stock_fingerprint(symbol).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _completed_batches(self, manifest, spill, stocks):
+        """
+        续算：返回清单中已完成且仍然有效的批次所覆盖的股票，以及下一个批次编号
+        
+        输入已变化、结果文件丢失、包含已不在股票列表中的股票或未完成的批次，
+        其清单记录与结果文件被删除，对应的股票重新计算
+        """
+        universe = set(stocks)
+        completed = set()
+        next_batch = 1
+        for record in manifest.units():
+            batch_stocks = record['stocks']
+            if (record['status'] == 'done' and set(batch_stocks) <= universe and not completed & set(batch_stocks)
+                    and manifest.is_complete(record['unit'], self.batch_fingerprint(batch_stocks))):
+                completed.update(batch_stocks)
+                next_batch = max(next_batch, int(record['unit'].rsplit('_', 1)[-1]) + 1)
+                continue
+            if record['output']:
+                Path(record['output']).unlink(missing_ok=True)
+            manifest.remove(record['unit'])
+        
+        # 写出后未记入清单的批次文件（进程在记录前中断）
+        valid_outputs = {Path(record['output']) for record in manifest.units('done')}
+        for path in spill.files:
+            if path not in valid_outputs:
+                path.unlink()
+        return completed, next_batch
     
     def merge_batch_results(self, batch_results):
-        """安全合并批次结果"""
+        """在内存中合并批次结果（单次拼接，按 Symbol/Date 去重）；run_batch_calculation 改为落盘后流式合并"""
         logger.info(f"开始合并 {len(batch_results)} 个批次结果...")
         
-        if not batch_results:
+        assembler = ResultAssembler()
+        for batch_df in batch_results:
+            assembler.add(batch_df)
+        if not len(assembler):
             logger.error("没有有效的批次结果可以合并")
             return pd.DataFrame()
         
-        try:
-            # 最安全的逐个合并方式
-            combined_df = None
-            total_rows = 0
-            
-            for i, batch_df in enumerate(batch_results):
-                if batch_df is None or batch_df.empty:
-                    continue
-                
-                # 彻底清理DataFrame
-                clean_df = batch_df.copy()
-                clean_df = clean_df.reset_index(drop=True)
-                
-                # 确保列名一致
-                if combined_df is not None:
-                    # 统一列结构
-                    all_cols = sorted(set(combined_df.columns) | set(clean_df.columns))
-                    
-                    # 为缺失的列添加NaN
-                    for col in all_cols:
-                        if col not in combined_df.columns:
-                            combined_df[col] = pd.NA
-                        if col not in clean_df.columns:
-                            clean_df[col] = pd.NA
-                    
-                    # 重新排序列
-                    combined_df = combined_df[all_cols]
-                    clean_df = clean_df[all_cols]
-                
-                if combined_df is None:
-                    combined_df = clean_df
-                else:
-                    # 使用最基本的append方式
-                    combined_df = pd.concat([combined_df, clean_df], ignore_index=True, sort=False)
-                
-                total_rows += len(clean_df)
-                logger.info(f"合并批次 {i+1}: +{len(clean_df)} 行 (总计: {total_rows} 行)")
-            
-            if combined_df is not None and not combined_df.empty:
-                # 去重
-                initial_rows = len(combined_df)
-                combined_df = combined_df.drop_duplicates()
-                final_rows = len(combined_df)
-                
-                if initial_rows != final_rows:
-                    logger.info(f"去重: {initial_rows} -> {final_rows} 行")
-                
-                logger.info(f"✅ 合并完成: {final_rows} 行, {len(combined_df.columns)-1} 个指标")
-                return combined_df
-            else:
-                logger.error("合并后结果为空")
-                return pd.DataFrame()
-                
-        except Exception as e:
-            logger.error(f"合并批次结果失败: {e}")
-            return pd.DataFrame()
+        combined_df = assembler.assemble()
+        logger.info(f"✅ 合并完成: {len(combined_df)} 行, {len(combined_df.columns)-1} 个指标")
+        return combined_df
     
-    def run_batch_calculation(self, max_stocks: int = None, output_file: str = "batch_indicators.csv"):
-        """运行批处理计算"""
+    def run_batch_calculation(self, max_stocks: int = None, output_file: str = "batch_indicators.csv",
+                              spill_dir: str = None, keep_spill: bool = False, resume: bool = False):
+        """
+        运行批处理计算
+        
+        每个批次算完立即写入溢出目录（默认为输出文件旁的 <文件名>_spill/），并记入运行清单
+        (<文件名>_manifest.sqlite)；全部批次完成后逐个读入合并为输出文件，内存中同一时间只有一个批次的结果。
+        resume=True 时跳过清单中已完成且输入未变化的批次，只计算其余股票
+        """
         logger.info("🚀 开始批处理指标计算")
         logger.info("=" * 60)
         
         start_time = time.time()
+        calculator = self.calculator
+        output_path = Path(output_file)
+        if calculator.num_shards > 1:
+            output_path = shard_output_path(output_path, calculator.num_shards, calculator.shard_index)
+        spill = BatchSpill(spill_dir or output_path.with_name(f"{output_path.stem}_spill"), self.spill_format)
+        manifest = RunManifest(manifest_path_for(output_path))
         
-        # 获取股票批次
-        batches = self.get_stock_batches(max_stocks)
-        
-        if not batches:
+        stocks = self.get_stocks(max_stocks)
+        total_stocks = len(stocks)
+        if not total_stocks:
             logger.error("没有股票需要处理")
+            manifest.close()
             return False
         
-        # 处理各个批次
-        batch_results = []
-        successful_batches = 0
+        completed, next_batch = set(), 1
+        if resume:
+            completed, next_batch = self._completed_batches(manifest, spill, stocks)
+            logger.info(f"♻️ 续算: {len(completed)} 只股票已在之前的批次中完成 ({manifest.path})")
+        else:
+            if spill.files:
+                logger.info(f"清理上一次运行遗留的 {len(spill.files)} 个批次文件: {spill.spill_dir}")
+            spill.cleanup()
+            manifest.reset()
+        
+        # 处理各个批次，结果立即落盘并记入清单
+        successful_batches = len(manifest.units('done'))
+        total_batches = successful_batches
+        processed_stocks = len(completed)
         
-        for i, batch in enumerate(batches, 1):
+        for i, batch_count, batch in self.iter_stock_batches([s for s in stocks if s not in completed], next_batch):
+            total_batches += 1
+            processed_stocks += len(batch)
+            unit = f"batch_{i:05d}"
+            fingerprint = self.batch_fingerprint(batch)
+            manifest.mark_running(unit, fingerprint, batch)
             try:
-                result = self.process_single_batch(batch, i, len(batches))
+                result = self.process_single_batch(batch, i, batch_count)
                 if result is not None and not result.empty:
-                    batch_results.append(result)
+                    path = spill.write(unit, result)
+                    manifest.mark_done(unit, fingerprint, path, len(result), batch)
+                    del result
                     successful_batches += 1
+                    logger.debug(f"批次 {i} 已写入 {path}")
                     
                     # 显示进度
-                    progress = i / len(batches) * 100
-                    logger.info(f"📊 整体进度: {progress:.1f}% ({i}/{len(batches)} 批次)")
+                    progress = processed_stocks / total_stocks * 100
+                    logger.info(f"📊 整体进度: {progress:.1f}% ({processed_stocks}/{total_stocks} 只股票, {i} 个批次)")
                     
                 else:
+                    manifest.mark_failed(unit, fingerprint, 'empty result', batch)
                     logger.warning(f"批次 {i} 无有效结果")
                     
             except Exception as e:
+                manifest.mark_failed(unit, fingerprint, str(e), batch)
                 logger.error(f"批次 {i} 处理异常: {e}")
                 continue
         
-        # 合并所有批次结果
-        if batch_results:
-            final_result = self.merge_batch_results(batch_results)
-            
-            if not final_result.empty:
-                # 保存结果
-                try:
-                    output_path = Path(output_file)
-                    final_result.to_csv(output_path, index=False, encoding='utf-8-sig')
-                    
-                    total_time = time.time() - start_time
-                    
-                    logger.info("=" * 60)
-                    logger.info("🎉 批处理完成！")
-                    logger.info(f"✅ 成功批次: {successful_batches}/{len(batches)}")
-                    logger.info(f"📊 总股票数: {final_result['Symbol'].nunique()}")
-                    logger.info(f"📈 总指标数: {len(final_result.columns)-1}")
-                    logger.info(f"📋 总数据行数: {len(final_result)}")
-                    logger.info(f"⏱️ 总耗时: {total_time:.2f} 秒")
-                    logger.info(f"💾 结果保存至: {output_path.absolute()}")
-                    logger.info("=" * 60)
-                    
-                    return True
-                    
-                except Exception as e:
-                    logger.error(f"保存结果失败: {e}")
-                    return False
-            else:
-                logger.error("最终合并结果为空")
-                return False
-        else:
+        if not successful_batches:
             logger.error("没有成功的批次结果")
+            manifest.close()
+            return False
+        
+        # 逐个读入批次文件，流式合并为输出文件
+        try:
+            logger.info(f"开始合并 {successful_batches} 个批次文件...")
+            summary = spill.write_csv(output_path)
+        except Exception as e:
+            logger.error(f"保存结果失败: {e}")
+            manifest.close()
             return False
+        
+        failed_batches = manifest.summary()['failed']
+        manifest.set_meta('completed_at', time.time())
+        manifest.close()
+        if calculator.num_shards > 1:
+            write_shard_sidecar(output_path, calculator.num_shards, calculator.shard_index, calculator.shard_strategy,
+                                calculator.shard_universe, calculator.shard_stocks, rows=summary['rows'])
+        if failed_batches:
+            # 保留批次文件，--resume 时只重新计算失败批次中的股票
+            logger.warning(f"⚠️ {failed_batches} 个批次失败，可用 --resume 只重新计算这些批次")
+        elif not keep_spill:
+            spill.cleanup()
+        
+        total_time = time.time() - start_time
+        
+        logger.info("=" * 60)
+        logger.info("🎉 批处理完成！")
+        logger.info(f"✅ 成功批次: {successful_batches}/{total_batches}")
+        logger.info(f"📊 总股票数: {summary['symbols']}")
+        logger.info(f"📈 总指标数: {summary['columns']-1}")
+        logger.info(f"📋 总数据行数: {summary['rows']}")
+        logger.info(f"⏱️ 总耗时: {total_time:.2f} 秒")
+        logger.info(f"💾 结果保存至: {output_path.absolute()}")
+        logger.info("=" * 60)
+        
+        return True
+
+# 配置文件 (config_example.json 的格式) 中的字段 -> 命令行参数
+CONFIG_FIELDS = {
+    ('data_settings', 'data_dir'): 'data_dir',
+    ('compute_settings', 'max_stocks'): 'max_stocks',
+    ('compute_settings', 'batch_size'): 'batch_size',
+    ('compute_settings', 'max_workers'): 'max_workers',
+    ('advanced_settings', 'memory_limit_mb'): 'memory_limit_mb',
+}
+
+
+def load_config_defaults(config_file: str) -> dict:
+    """读取配置文件中批处理用到的字段，作为命令行参数的默认值（命令行显式指定的参数优先）"""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    defaults = {}
+    for (section, key), dest in CONFIG_FIELDS.items():
+        value = config.get(section, {}).get(key)
+        if value is not None:
+            defaults[dest] = value
+    return defaults
+
 
 def main():
     """主函数"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge-shards':
+        sys.exit(0 if merge_shards_main(sys.argv[2:], prog=f"{Path(sys.argv[0]).name} merge-shards") else 1)
+    
     parser = argparse.ArgumentParser(
         description='批处理Qlib指标计算器 - 分批处理大量股票',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -237,18 +370,50 @@ def main():
   
   # 小批次处理（内存受限环境）
   python batch_calculator.py --batch-size 5 --max-workers 2
+  
+  # 按内存预算自适应分批（32GB 节点），--batch-size 为每批上限
+  python batch_calculator.py --memory-limit-mb 28000
+  
+  # 从配置文件读取参数（advanced_settings.memory_limit_mb 等）
+  python batch_calculator.py --config config_example.json
+  
+  # 中断后继续：跳过已完成的批次
+  python batch_calculator.py --resume
+  
+  # 多台机器分片计算（每台机器运行一个分片），全部完成后校验并合并
+  python batch_calculator.py --num-shards 4 --shard-index 0
+  python batch_calculator.py merge-shards --output batch_indicators.csv
         '''
     )
     
     parser.add_argument('--data-dir', help='Qlib数据目录路径')
     parser.add_argument('--max-stocks', type=int, help='最大股票数量')
-    parser.add_argument('--batch-size', type=int, default=20, help='每批处理的股票数量 (默认: 20)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                       help=f'每批处理的股票数量；按内存预算分批时为每批上限 (默认: {DEFAULT_BATCH_SIZE}，内存预算模式不限)')
     parser.add_argument('--max-workers', type=int, default=8, help='最大线程数 (默认: 8)')
+    parser.add_argument('--memory-limit-mb', type=float, default=None,
+                       help='内存上限 (MB)：按每只股票的历史长度估算内存并用实测RSS校准，自适应调整批次大小')
+    parser.add_argument('--config', type=str, default=None,
+                       help='JSON配置文件 (格式同 config_example.json)，命令行参数优先')
     parser.add_argument('--output', default='batch_indicators.csv', help='输出文件名')
+    parser.add_argument('--spill-dir', default=None, help='批次结果的落盘目录 (默认: 输出文件旁的 <文件名>_spill/)')
+    parser.add_argument('--spill-format', choices=SPILL_FORMATS, default='arrow', help='批次结果的落盘格式 (默认: arrow)')
+    parser.add_argument('--keep-spill', action='store_true', help='合并完成后保留批次文件')
+    parser.add_argument('--resume', action='store_true',
+                       help='从上一次中断的运行继续：跳过运行清单中已完成且输入未变化的批次')
+    parser.add_argument('--num-shards', type=int, default=1, help='把股票划分为N个分片，由多台机器分别计算 (默认: 1，不分片)')
+    parser.add_argument('--shard-index', type=int, default=0, help='本机计算的分片编号，从0开始 (默认: 0)')
+    parser.add_argument('--shard-strategy', choices=SHARD_STRATEGIES, default='balanced',
+                       help='分片划分方式: balanced 按历史长度均衡工作量, hash 按股票代码哈希 (默认: balanced)')
+    parser.add_argument('--kernel-backend', choices=KERNEL_BACKENDS, default='numpy',
+                       help='滚动窗口内核的实现: numpy, numba (未安装时回退到 numpy), auto 有 numba 时使用 numba (默认: numpy)')
     parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], 
                        default='INFO', help='日志级别')
     
     args = parser.parse_args()
+    if args.config:
+        parser.set_defaults(**load_config_defaults(args.config))
+        args = parser.parse_args()
     
     # 设置日志
     logger.remove()
@@ -263,13 +428,22 @@ def main():
         batch_calc = BatchIndicatorCalculator(
             data_dir=args.data_dir,
             batch_size=args.batch_size,
-            max_workers=args.max_workers
+            max_workers=args.max_workers,
+            memory_limit_mb=args.memory_limit_mb,
+            spill_format=args.spill_format,
+            num_shards=args.num_shards,
+            shard_index=args.shard_index,
+            shard_strategy=args.shard_strategy,
+            kernel_backend=args.kernel_backend
         )
         
         # 运行计算
         success = batch_calc.run_batch_calculation(
             max_stocks=args.max_stocks,
-            output_file=args.output
+            output_file=args.output,
+            spill_dir=args.spill_dir,
+            keep_spill=args.keep_spill,
+            resume=args.resume
         )
         
         if success:
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批处理结果的落盘与流式合并
+
+BatchSpill 让批处理的峰值内存只取决于单个批次：
+- 每个批次算完立即写为一个溢出文件（Arrow IPC 或 Parquet），内存中不保留批次结果
+- 最终输出时先只读取各文件的 schema，得到统一的列顺序与类型（unify_dtypes），
+  再逐个文件读入、对齐列结构后追加写出，同一时间只有一个批次在内存中
+- 重复行按 (Symbol, Date) 判断：批次内去重，同一只股票出现在多个批次时保留先写入的批次
+- 未安装 pyarrow 时退化为 pickle 文件
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from dtype_policy import densify
+from result_assembler import conform, drop_duplicate_keys, unify_dtypes
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    logger.warning("pyarrow not installed, batch spill files will be written as pickle")
+    pa = None
+
+SPILL_FORMATS = ('arrow', 'parquet')
+SPILL_SUFFIXES = {'arrow': '.arrow', 'parquet': '.parquet', 'pickle': '.pkl'}
+
+
+class BatchSpill:
+    """按批次写出的溢出文件目录；文件按名称排序即为写入顺序"""
+
+    def __init__(self, spill_dir: Union[str, Path], spill_format: str = 'arrow'):
+        if spill_format not in SPILL_FORMATS:
+            raise ValueError(f"Unsupported spill format: {spill_format}, expected one of {SPILL_FORMATS}")
+        self.spill_dir = Path(spill_dir)
+        self.spill_format = spill_format if pa is not None else 'pickle'
+        self.suffix = SPILL_SUFFIXES[self.spill_format]
+
+    @property
+    def files(self) -> List[Path]:
+        if not self.spill_dir.exists():
+            return []
+        return sorted(self.spill_dir.glob(f"*{self.suffix}"))
+
+    def path_for(self, name: str) -> Path:
+        return self.spill_dir / f"{name}{self.suffix}"
+
+    def write(self, name: str, df: pd.DataFrame) -> Path:
+        """写出一个批次（先写临时文件再改名，中断时不会留下不完整的溢出文件）"""
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(name)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        df = densify(df).reset_index(drop=True)
+        if self.spill_format == 'arrow':
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        elif self.spill_format == 'parquet':
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), str(tmp_path))
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def read(self, path: Path) -> pd.DataFrame:
+        if self.spill_format == 'arrow':
+            with pa.memory_map(str(path)) as source:
+                return pa.ipc.open_file(source).read_all().to_pandas()
+        if self.spill_format == 'parquet':
+            return pq.read_table(str(path)).to_pandas()
+        return pd.read_pickle(path)
+
+    def read_dtypes(self, path: Path) -> Dict[str, np.dtype]:
+        """只读取文件的列结构（Arrow/Parquet 不读取数据）"""
+        if self.spill_format == 'arrow':
+            with pa.memory_map(str(path)) as source:
+                schema = pa.ipc.open_file(source).schema
+        elif self.spill_format == 'parquet':
+            schema = pq.read_schema(str(path))
+        else:
+            return dict(pd.read_pickle(path).dtypes)
+        return dict(schema.empty_table().to_pandas().dtypes)
+
+    def unified_dtypes(self, files: Optional[List[Path]] = None) -> Dict[str, np.dtype]:
+        return unify_dtypes([self.read_dtypes(path) for path in (files or self.files)])
+
+    def iter_frames(self, files: Optional[List[Path]] = None) -> Iterator[pd.DataFrame]:
+        """逐个批次读入并对齐到统一列结构，跳过已在之前批次出现过的股票"""
+        files = files or self.files
+        dtypes = self.unified_dtypes(files)
+        seen_symbols = set()
+        for path in files:
+            frame = drop_duplicate_keys(self.read(path))
+            if 'Symbol' in frame.columns:
+                symbols = set(frame['Symbol'].unique())
+                repeated = symbols & seen_symbols
+                if repeated:
+                    logger.warning(f"⚠️ {path.name}: {len(repeated)} 只股票已在之前的批次中出现，保留先写入的结果")
+                    frame = frame[~frame['Symbol'].isin(repeated)].reset_index(drop=True)
+                seen_symbols |= symbols
+            yield conform(frame, dtypes)
+
+    def write_csv(self, output_path: Union[str, Path], encoding: str = 'utf-8-sig') -> dict:
+        """把全部批次流式写为一个CSV文件，返回 {'rows', 'symbols', 'columns', 'files'}"""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        files = self.files
+        rows = 0
+        symbols = set()
+        columns = 0
+        with open(output_path, 'w', encoding=encoding, newline='') as f:
+            for i, frame in enumerate(self.iter_frames(files)):
+                frame.to_csv(f, header=(i == 0), index=False)
+                rows += len(frame)
+                columns = frame.shape[1]
+                if 'Symbol' in frame.columns:
+                    symbols.update(frame['Symbol'].unique())
+                logger.info(f"合并批次文件 {i + 1}/{len(files)}: +{len(frame)} 行 (总计: {rows} 行)")
+        return {'rows': rows, 'symbols': len(symbols), 'columns': columns, 'files': len(files)}
+
+    def cleanup(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+指标计算器的基准测试
+
+- synthetic: 生成可复现的合成 Qlib 数据目录（calendars / instruments / features/*/*.day.bin）
+- bench_indicators: 在合成数据上比较各执行模式的吞吐量、各阶段耗时与内存峰值
+"""
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标计算器的基准测试
+
+在合成数据（或指定的 Qlib 数据目录）上依次运行各执行模式，记录：
+- 墙钟时间、每秒处理的股票数与输出行数
+- 各阶段（read、各指标族、queue、stock、merge、panel）的平均与 p95 耗时
+- 内存峰值（RSS）：主进程，以及进程池模式下最大的工作进程
+
+每个模式在独立的子进程中运行，内存峰值互不影响。
+结果以一行 JSON 追加到结果文件，包含 git 提交、机器与库版本信息，
+相同配置的历史记录可以用 --history 对比不同提交之间的变化。
+
+示例:
+    python scripts/benchmarks/bench_indicators.py --stocks 200 --days 1000
+    python scripts/benchmarks/bench_indicators.py --modes sequential,thread --repeat 3 --history 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+# 添加当前目录与 scripts 目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from synthetic import write_synthetic_tree
+
+# 执行模式 -> 计算器参数；新增执行模式时在这里注册
+MODES = {
+    'sequential': {'enable_parallel': False},
+    'thread': {'enable_parallel': True, 'executor': 'thread'},
+    'process': {'enable_parallel': True, 'executor': 'process'},
+    'panel': {'enable_parallel': True, 'engine': 'panel'},
+}
+BASELINE_MODE = 'sequential'
+DEFAULT_OUTPUT = 'benchmark_results.jsonl'
+
+
+def _max_rss_mb(who: int) -> float:
+    # Linux 上 ru_maxrss 的单位是 KB
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def run_mode(data_dir: str, mode: str, max_workers: Optional[int] = None,
+             max_stocks: Optional[int] = None) -> dict:
+    """在当前进程中运行一个执行模式并返回测量结果（内存峰值是整个进程的峰值）"""
+    from qlib_indicators import QlibIndicatorsEnhancedCalculator
+
+    if mode not in MODES:
+        raise ValueError(f"Unsupported mode: {mode}, expected one of {tuple(MODES)}")
+    calculator = QlibIndicatorsEnhancedCalculator(
+        data_dir=data_dir,
+        financial_data_dir=str(Path(data_dir) / 'financial_data'),
+        max_workers=max_workers,
+        timing_report='json',
+        **MODES[mode],
+    )
+    # 只计时，不做内存跟踪（tracemalloc 会明显拖慢计算）
+    calculator.profiler.close()
+
+    start = time.perf_counter()
+    results = calculator.calculate_all_indicators(max_stocks)
+    wall = time.perf_counter() - start
+
+    n_stocks = int(results['Symbol'].nunique()) if not results.empty else 0
+    stages = {
+        stage: {
+            'count': stats['count'],
+            'mean_ms': stats['wall_mean_s'] * 1000,
+            'p95_ms': stats['wall_p95_s'] * 1000,
+            'total_s': stats['wall_total_s'],
+        }
+        for stage, stats in sorted(calculator.profiler.summary().items())
+    }
+    return {
+        'mode': mode,
+        'max_workers': calculator.max_workers if calculator.enable_parallel else 1,
+        'wall_s': wall,
+        'stocks': n_stocks,
+        'rows': len(results),
+        'columns': results.shape[1],
+        'stocks_per_s': n_stocks / wall if wall > 0 else 0.0,
+        'rows_per_s': len(results) / wall if wall > 0 else 0.0,
+        'peak_rss_mb': _max_rss_mb(resource.RUSAGE_SELF),
+        'peak_child_rss_mb': _max_rss_mb(resource.RUSAGE_CHILDREN),
+        'stages': stages,
+    }
+
+
+def run_mode_isolated(data_dir: str, mode: str, max_workers: Optional[int] = None,
+                      max_stocks: Optional[int] = None) -> dict:
+    """在独立的子进程中运行一个执行模式，结果以 JSON 从标准输出的最后一行传回"""
+    command = [sys.executable, str(Path(__file__).resolve()), '--child-mode', mode, '--data-dir', str(data_dir)]
+    if max_workers:
+        command += ['--max-workers', str(max_workers)]
+    if max_stocks:
+        command += ['--max-stocks', str(max_stocks)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark mode {mode} failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize_runs(runs: List[dict]) -> dict:
+    """多次重复取墙钟时间最短的一次，同时保留每次的墙钟时间"""
+    best = dict(min(runs, key=lambda run: run['wall_s']))
+    best['wall_runs_s'] = [run['wall_s'] for run in runs]
+    best['peak_rss_mb'] = max(run['peak_rss_mb'] for run in runs)
+    best['peak_child_rss_mb'] = max(run['peak_child_rss_mb'] for run in runs)
+    return best
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        completed = subprocess.run(['git', *args], capture_output=True, text=True,
+                                   cwd=str(Path(__file__).resolve().parent), timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return completed.stdout.strip() if completed.returncode == 0 else None
+
+
+def environment_info() -> dict:
+    """提交、机器与库版本，用于判断两条记录是否可比"""
+    import talib
+
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': _git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'versions': {
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'talib': getattr(talib, '__version__', None),
+        },
+    }
+
+
+def print_table(results: Dict[str, dict]):
+    baseline = results.get(BASELINE_MODE)
+    print(f"{'mode':<12}{'workers':>8}{'wall_s':>10}{'stocks/s':>10}{'rows/s':>12}"
+          f"{'rss_mb':>10}{'child_mb':>10}{'speedup':>9}")
+    for mode, result in results.items():
+        speedup = f"{result['speedup']:.2f}x" if result.get('speedup') else '-'
+        print(f"{mode:<12}{result['max_workers']:>8}{result['wall_s']:>10.2f}{result['stocks_per_s']:>10.2f}"
+              f"{result['rows_per_s']:>12.0f}{result['peak_rss_mb']:>10.0f}{result['peak_child_rss_mb']:>10.0f}"
+              f"{speedup:>9}")
+
+    stages = sorted({stage for result in results.values() for stage in result['stages']})
+    if not stages:
+        return
+    print()
+    print(f"{'stage (mean/p95 ms)':<22}" + ''.join(f"{mode:>20}" for mode in results))
+    for stage in stages:
+        cells = []
+        for result in results.values():
+            stats = result['stages'].get(stage)
+            cells.append(f"{stats['mean_ms']:.1f}/{stats['p95_ms']:.1f}" if stats else '-')
+        print(f"{stage:<22}" + ''.join(f"{cell:>20}" for cell in cells))
+    if baseline is None:
+        print(f"\n(未运行 {BASELINE_MODE} 模式，不计算加速比)")
+
+
+def print_history(output: Path, config: dict, limit: int):
+    """列出结果文件中相同配置的最近几条记录（按执行模式比较每秒股票数）"""
+    if not output.exists():
+        return
+    records = []
+    for line in output.read_text(encoding='utf-8').splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if record.get('config') == config:
+            records.append(record)
+    records = records[-limit:]
+    if not records:
+        return
+    modes = list(dict.fromkeys(mode for record in records for mode in record['results']))
+    print(f"\n相同配置的最近 {len(records)} 条记录 (stocks/s):")
+    print(f"{'timestamp':<21}{'commit':<14}" + ''.join(f"{mode:>12}" for mode in modes))
+    for record in records:
+        commit = (record.get('commit') or '?') + ('*' if record.get('dirty') else '')
+        cells = [record['results'][mode]['stocks_per_s'] if mode in record['results'] else None for mode in modes]
+        print(f"{record['timestamp']:<21}{commit:<14}"
+              + ''.join(f"{cell:>12.2f}" if cell is not None else f"{'-':>12}" for cell in cells))
+
+
+def run_benchmark(data_dir: str, modes: List[str], max_workers: Optional[int] = None,
+                  max_stocks: Optional[int] = None, repeat: int = 1, isolate: bool = True) -> Dict[str, dict]:
+    """依次运行各执行模式，返回 {模式: 测量结果}（含相对 sequential 的加速比）"""
+    runner = run_mode_isolated if isolate else run_mode
+    results = {}
+    for mode in modes:
+        runs = []
+        for i in range(repeat):
+            logger.info(f"⏱️ {mode}: 第 {i + 1}/{repeat} 次")
+            runs.append(runner(data_dir, mode, max_workers, max_stocks))
+        results[mode] = summarize_runs(runs)
+        logger.info(f"✅ {mode}: {results[mode]['wall_s']:.2f}s, {results[mode]['stocks_per_s']:.2f} 只/秒")
+
+    baseline = results.get(BASELINE_MODE)
+    for result in results.values():
+        result['speedup'] = baseline['wall_s'] / result['wall_s'] if baseline and result['wall_s'] > 0 else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='指标计算器基准测试：比较各执行模式的吞吐量、各阶段耗时与内存峰值',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split('示例:')[1],
+    )
+    parser.add_argument('--data-dir', type=str, default=None,
+                        help='已有的 Qlib 数据目录（默认在临时目录生成合成数据，结束后删除）')
+    parser.add_argument('--stocks', type=int, default=100, help='合成数据的股票数量 (默认: 100)')
+    parser.add_argument('--days', type=int, default=1000, help='合成数据的交易日数量 (默认: 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子 (默认: 0)')
+    parser.add_argument('--modes', type=str, default=','.join(MODES),
+                        help=f"逗号分隔的执行模式 (默认: {','.join(MODES)})")
+    parser.add_argument('--max-workers', type=int, default=None, help='并行模式的最大并发数 (默认: 计算器默认值)')
+    parser.add_argument('--max-stocks', type=int, default=None, help='最多计算的股票数量（用于已有数据目录）')
+    parser.add_argument('--repeat', type=int, default=1, help='每个模式重复次数，取最快的一次 (默认: 1)')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT,
+                        help=f'结果文件，每次运行追加一行 JSON (默认: {DEFAULT_OUTPUT})')
+    parser.add_argument('--history', type=int, default=0, help='列出相同配置的最近 N 条记录 (默认: 0)')
+    parser.add_argument('--child-mode', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_mode:
+        # 子进程：只输出警告日志，最后一行打印 JSON 结果
+        logger.remove()
+        logger.add(sys.stderr, level='WARNING')
+        print(json.dumps(run_mode(args.data_dir, args.child_mode, args.max_workers, args.max_stocks)))
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"未知的执行模式: {unknown}，可选: {list(MODES)}")
+
+    temp_dir = None
+    if args.data_dir:
+        data_dir = args.data_dir
+        config = {'data_dir': str(Path(data_dir).resolve()), 'max_stocks': args.max_stocks}
+    else:
+        temp_dir = tempfile.mkdtemp(prefix='qlib_bench_')
+        data_dir = temp_dir
+        logger.info(f"生成合成数据: {args.stocks} 只股票 × {args.days} 个交易日 (seed={args.seed})")
+        write_synthetic_tree(data_dir, args.stocks, args.days, args.seed)
+        config = {'stocks': args.stocks, 'days': args.days, 'seed': args.seed, 'max_stocks': args.max_stocks}
+    config['max_workers'] = args.max_workers
+
+    try:
+        results = run_benchmark(data_dir, modes, args.max_workers, args.max_stocks, args.repeat)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    record = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        **environment_info(),
+        'config': config,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    print()
+    print_table(results)
+    print(f"\n结果已追加到 {output}")
+    if args.history:
+        print_history(output, config, args.history)
+
+
+if __name__ == '__main__':
+    main()
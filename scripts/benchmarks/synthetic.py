@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成合成的 Qlib 日线数据目录
+
+目录结构与 dump_bin.py 的输出一致：
+- calendars/day.txt：交易日历（工作日）
+- instruments/all.txt：股票代码\t起始日期\t结束日期
+- features/<代码小写>/{open,high,low,close,volume}.day.bin：首个 float32 为起始日在日历中的位置，其后为数据
+
+价格为几何随机游走，各股票的上市日期与最后交易日错开，用于覆盖不同长度的历史。
+相同的参数与随机种子生成完全相同的数据。
+"""
+
+import argparse
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+CALENDAR_START = '2015-01-01'
+INSTRUMENTS_SEP = '\t'
+
+
+def synthetic_symbols(n_stocks: int) -> List[str]:
+    return [f"SYN{i:05d}" for i in range(n_stocks)]
+
+
+def make_ohlcv(rng: np.random.Generator, n_days: int, start_price: float = 50.0) -> Dict[str, np.ndarray]:
+    """生成一只股票的 OHLCV 序列（high >= max(open, close)，low <= min(open, close)）"""
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.02, n_days)))
+    open_ = close * (1 + rng.normal(0, 0.01, n_days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n_days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n_days)))
+    volume = rng.integers(100_000, 10_000_000, n_days).astype(np.float64)
+    return {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+
+
+def write_synthetic_tree(root: Union[str, Path], n_stocks: int = 100, n_days: int = 1000,
+                         seed: int = 0) -> Path:
+    """
+    在 root 下写出 n_stocks 只股票、n_days 个交易日的合成数据，返回 root
+
+    第一只股票覆盖完整日历，其余股票在前三分之一的日历内随机上市，
+    奇数序号的股票提前最多 20 个交易日结束。
+    """
+    root = Path(root)
+    rng = np.random.default_rng(seed)
+    calendar = pd.bdate_range(CALENDAR_START, periods=n_days)
+    dates = calendar.strftime('%Y-%m-%d')
+
+    calendars_dir = root / 'calendars'
+    calendars_dir.mkdir(parents=True, exist_ok=True)
+    calendars_dir.joinpath('day.txt').write_text('\n'.join(dates) + '\n', encoding='utf-8')
+
+    instruments = []
+    for i, symbol in enumerate(synthetic_symbols(n_stocks)):
+        start = int(rng.integers(0, max(n_days // 3, 1))) if i else 0
+        end = n_days - 1 - (int(rng.integers(0, 20)) if i % 2 else 0)
+        end = max(end, start)
+        bars = make_ohlcv(rng, end - start + 1, start_price=float(rng.uniform(5, 200)))
+
+        stock_dir = root / 'features' / symbol.lower()
+        stock_dir.mkdir(parents=True, exist_ok=True)
+        for field in FIELDS:
+            np.hstack([[start], bars[field]]).astype('<f').tofile(str(stock_dir / f"{field}.day.bin"))
+        instruments.append(INSTRUMENTS_SEP.join((symbol, dates[start], dates[end])))
+
+    instruments_dir = root / 'instruments'
+    instruments_dir.mkdir(parents=True, exist_ok=True)
+    instruments_dir.joinpath('all.txt').write_text('\n'.join(instruments) + '\n', encoding='utf-8')
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成的 Qlib 日线数据目录')
+    parser.add_argument('root', help='输出目录')
+    parser.add_argument('--stocks', type=int, default=100, help='股票数量 (默认: 100)')
+    parser.add_argument('--days', type=int, default=1000, help='交易日数量 (默认: 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子 (默认: 0)')
+    args = parser.parse_args()
+
+    root = write_synthetic_tree(args.root, args.stocks, args.days, args.seed)
+    print(f"已生成 {args.stocks} 只股票 × {args.days} 个交易日的合成数据: {root}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标输出的 dtype 策略
+
+构建单只股票的结果时统一收窄列类型：
+- 蜡烛图形态 (CDL*) 只取 -200/-100/0/100/200，保存为 int16（±200 超出 int8 范围）
+- 取值为 0/1 的标志列（HT_TRENDMODE）保存为 int8
+- 价格列 (Open/High/Low/Close) 按配置保存为 float32 或 float64
+- 成交量、OBV、AD 等累积量以及市值保持 float64，避免 float32 的 7 位有效数字截断
+  （float32 只能精确表示 2^24 ≈ 1678 万以内的整数）
+- 其余浮点指标（比率、收益率、相关系数等）按配置收窄为 float32，或保持 float64
+- 可选把蜡烛图形态块转换为以 0 为填充值的稀疏列，写出文件前再还原为普通列
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+PATTERN_PREFIX = 'CDL'
+FLAG_COLUMNS = ('HT_TRENDMODE',)
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close')
+WIDE_COLUMNS = ('Volume', 'OBV', 'AD', 'MarketCap')
+FLOAT_DTYPES = ('float32', 'float64')
+
+PATTERN_DTYPE = np.dtype(np.int16)
+FLAG_DTYPE = np.dtype(np.int8)
+
+
+def is_pattern_column(column: str) -> bool:
+    return column.startswith(PATTERN_PREFIX)
+
+
+def densify(df: pd.DataFrame) -> pd.DataFrame:
+    """把稀疏列还原为普通列（CSV/Parquet/Feather 写出前调用）"""
+    sparse = [column for column, dtype in df.dtypes.items() if isinstance(dtype, pd.SparseDtype)]
+    if not sparse:
+        return df
+    return df.assign(**{column: df[column].sparse.to_dense() for column in sparse})
+
+
+class DtypePolicy:
+    """按列的语义决定输出类型"""
+
+    def __init__(self, price_dtype: str = 'float32', ratio_dtype: str = 'float32', sparse_patterns: bool = False):
+        for name, dtype in (('price_dtype', price_dtype), ('ratio_dtype', ratio_dtype)):
+            if dtype not in FLOAT_DTYPES:
+                raise ValueError(f"Unsupported {name}: {dtype}, expected one of {FLOAT_DTYPES}")
+        self.price_dtype = np.dtype(price_dtype)
+        self.ratio_dtype = np.dtype(ratio_dtype)
+        self.sparse_patterns = sparse_patterns
+
+    def target_dtype(self, column: str, dtype: np.dtype) -> Optional[np.dtype]:
+        """该列的输出类型；None 表示保持不变（日期、代码、位置索引等）"""
+        if dtype.kind not in 'biuf':
+            return None
+        if is_pattern_column(column):
+            return PATTERN_DTYPE
+        if column in FLAG_COLUMNS:
+            return FLAG_DTYPE
+        if dtype.kind != 'f':
+            return None
+        if column in PRICE_COLUMNS:
+            return self.price_dtype
+        if column in WIDE_COLUMNS:
+            return np.dtype(np.float64)
+        # 已经以 float32 计算的指标（如 Alpha360）不再放大
+        return self.ratio_dtype if self.ratio_dtype.itemsize < dtype.itemsize else None
+
+    def apply(self, df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """按策略转换单只股票的结果；整数类列含缺失值时保持原类型"""
+        if df is None or df.empty:
+            return df
+        converted = {}
+        for column, dtype in df.dtypes.items():
+            if not isinstance(dtype, np.dtype):
+                continue
+            target = self.target_dtype(column, dtype)
+            if target is None or target == dtype:
+                continue
+            values = df[column].values
+            if target.kind == 'i' and dtype.kind == 'f' and np.isnan(values).any():
+                continue
+            converted[column] = values.astype(target)
+        if not converted:
+            return df
+        return pd.DataFrame(
+            {column: converted[column] if column in converted else df[column] for column in df.columns},
+            index=df.index,
+        )
+
+    def sparsify(self, df: pd.DataFrame) -> pd.DataFrame:
+        """启用 sparse_patterns 时，把蜡烛图形态列转换为以 0 为填充值的稀疏列（在合并全部股票之后调用）"""
+        if not self.sparse_patterns or df.empty:
+            return df
+        patterns = [column for column in df.columns if is_pattern_column(column) and df[column].dtype == PATTERN_DTYPE]
+        if not patterns:
+            return df
+        return df.assign(**{
+            column: pd.arrays.SparseArray(df[column].values, fill_value=0) for column in patterns
+        })
+
+    def signature(self) -> Dict[str, str]:
+        """用于缓存键：dtype 策略变化时缓存的结果失效"""
+        return {'price': self.price_dtype.name, 'ratio': self.ratio_dtype.name}
+
+    def describe(self) -> str:
+        sparse = ', 形态稀疏存储' if self.sparse_patterns else ''
+        return f"行情 {self.price_dtype.name}, 指标 {self.ratio_dtype.name}, 形态 {PATTERN_DTYPE.name}{sparse}"
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按需加载的财务数据存储
+
+- 启动时只扫描各数据类型目录，建立 数据类型 -> 规范化股票代码 -> CSV文件 的索引，不读取文件内容；
+  行情目录名和财务文件名都通过 canonical_symbol 规范化，查找只需一次字典访问
+- 首次访问某只股票时才读取，读取结果保存在有上限的 LRU 缓存中
+- compact 把一个数据类型的全部 CSV 合并为一个未压缩的 Arrow (Feather v2) 列式文件，
+  后续运行以内存映射方式打开，按行区间切出单只股票；文件中记录了每只股票源 CSV 的指纹，
+  源文件变化（或新增）的股票自动回退为读取 CSV
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+from loguru import logger
+
+from indicator_cache import file_fingerprint
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    logger.warning("pyarrow not installed, compacted financial data will not be available")
+    pa = None
+
+DATA_TYPES = ('info', 'financials', 'balance_sheet', 'cashflow', 'dividends', 'financial_ratios')
+
+INDEX_COLUMN = '__index__'
+METADATA_KEY = b'financial_store'
+
+
+def canonical_symbol(symbol: str) -> str:
+    """规范化股票代码：大写，'.' 统一为 '_'（0002.HK / 0002_hk -> 0002_HK）"""
+    return symbol.strip().upper().replace('.', '_')
+
+
+def _arrow_type(dtypes: List[str]):
+    """同名列在各股票中的类型合并为一个 Arrow 类型：数值取公共类型，其余使用字符串"""
+    kinds = {pd.api.types.pandas_dtype(dtype).kind for dtype in dtypes}
+    if kinds == {'b'}:
+        return pa.bool_()
+    if kinds == {'i'}:
+        return pa.int64()
+    if kinds <= {'i', 'u', 'f'}:
+        return pa.float64()
+    return pa.string()
+
+
+def _to_arrow(values: pd.Series, arrow_type) -> 'pa.Array':
+    if arrow_type == pa.string():
+        return pa.array([None if pd.isna(value) else str(value) for value in values], pa.string())
+    return pa.array(values.to_numpy(), arrow_type, from_pandas=True)
+
+
+def _restore_dtype(values: pd.Series, dtype: str) -> pd.Series:
+    """把合并存储的列还原为该股票CSV中的原始类型"""
+    if str(values.dtype) == dtype:
+        return values
+    if dtype == 'bool':
+        return values.map({'True': True, 'False': False, True: True, False: False}).astype(bool)
+    if dtype == 'object':
+        return values.astype(object).where(values.notna(), None) if values.dtype != object else values
+    return values.astype(dtype)
+
+
+class FinancialDataStore:
+    """财务数据的符号索引 + 按需加载 + LRU 缓存（线程安全）"""
+
+    COMPACT_DIR = '_compact'
+    SUFFIX = '.arrow'
+
+    def __init__(self, root: Union[str, Path, None], max_cached_frames: int = 256):
+        self.root = Path(root) if root is not None else None
+        self.max_cached_frames = max_cached_frames
+        self.loads = 0
+        self._lock = threading.Lock()
+        # LRU缓存：(数据类型, 股票代码) -> DataFrame，按最近使用时间从旧到新排列
+        self._frames = OrderedDict()
+        # 数据类型 -> 规范化股票代码 -> CSV文件
+        self._index: Dict[str, Dict[str, Path]] = {}
+        # 数据类型 -> (内存映射的Arrow表, 每只股票的行区间与原始列结构)
+        self._compacted: Dict[str, tuple] = {}
+        self._build_index()
+
+    def _build_index(self):
+        if self.root is None:
+            logger.warning("未指定财务数据目录，将使用估算值")
+            return
+
+        for data_type in DATA_TYPES:
+            data_path = self.root / data_type
+            if not data_path.exists():
+                logger.warning(f"📁 财务数据目录不存在: {data_path}")
+                continue
+            files = {}
+            for csv_file in sorted(data_path.glob("*.csv")):
+                symbol = canonical_symbol(csv_file.stem)
+                if symbol in files:
+                    logger.debug(f"{data_type}: {csv_file.name} 与 {files[symbol].name} 对应同一股票，忽略")
+                    continue
+                files[symbol] = csv_file
+            if not files:
+                logger.warning(f"📁 {data_type} 目录为空")
+                continue
+            self._index[data_type] = files
+            self._open_compacted(data_type)
+            logger.info(f"✅ 索引 {data_type} 数据: {len(files)} 只股票"
+                        f"{' (列式文件)' if data_type in self._compacted else ''}")
+
+    def _compact_path(self, data_type: str) -> Path:
+        return self.root / self.COMPACT_DIR / f"{data_type}{self.SUFFIX}"
+
+    def _open_compacted(self, data_type: str):
+        path = self._compact_path(data_type)
+        if pa is None or not path.exists():
+            return
+        try:
+            table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+            layout = json.loads(table.schema.metadata[METADATA_KEY])
+        except (OSError, KeyError, ValueError, pa.ArrowException) as e:
+            logger.warning(f"无法打开财务数据列式文件 {path}: {e}")
+            return
+        self._compacted[data_type] = (table, layout)
+
+    def symbols(self, data_type: str) -> List[str]:
+        return list(self._index.get(data_type, {}))
+
+    def has(self, symbol: str, data_type: str = 'info') -> bool:
+        return canonical_symbol(symbol) in self._index.get(data_type, {})
+
+    def missing_symbols(self, symbols: List[str], data_type: str = 'info') -> List[str]:
+        """有行情数据但没有该类财务数据的股票"""
+        files = self._index.get(data_type, {})
+        return [symbol for symbol in symbols if canonical_symbol(symbol) not in files]
+
+    def files(self, symbol: str) -> List[Path]:
+        """该股票各数据类型的源CSV文件（用于指标缓存键）"""
+        symbol = canonical_symbol(symbol)
+        return [files[symbol] for files in self._index.values() if symbol in files]
+
+    def get(self, data_type: str, symbol: str) -> Optional[pd.DataFrame]:
+        """读取一只股票的某类财务数据，不存在时返回 None"""
+        symbol = canonical_symbol(symbol)
+        path = self._index.get(data_type, {}).get(symbol)
+        if path is None:
+            return None
+
+        key = (data_type, symbol)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+
+        try:
+            frame = self._read_compacted(data_type, symbol, path)
+            if frame is None:
+                frame = pd.read_csv(path, index_col=0)
+        except Exception as e:
+            logger.warning(f"Failed to load {data_type} for {symbol}: {e}")
+            return None
+
+        with self._lock:
+            self.loads += 1
+            self._frames[key] = frame
+            while len(self._frames) > self.max_cached_frames:
+                self._frames.popitem(last=False)
+        return frame
+
+    def _read_compacted(self, data_type: str, symbol: str, path: Path) -> Optional[pd.DataFrame]:
+        """从列式文件切出一只股票；源CSV在压缩之后有变化时返回 None"""
+        if data_type not in self._compacted:
+            return None
+        table, layout = self._compacted[data_type]
+        entry = layout.get(symbol)
+        if entry is None or entry['fingerprint'] != file_fingerprint(path):
+            return None
+
+        start, stop = entry['rows']
+        columns = [INDEX_COLUMN, *entry['columns']]
+        frame = table.slice(start, stop - start).select(columns).to_pandas()
+        for column, dtype in zip(columns, [entry['index_dtype'], *entry['dtypes']]):
+            frame[column] = _restore_dtype(frame[column], dtype)
+        frame = frame.set_index(INDEX_COLUMN)
+        frame.index.name = entry['index_name']
+        return frame
+
+    def compact(self, data_types: Optional[List[str]] = None) -> List[Path]:
+        """把每个数据类型的全部CSV合并为一个列式文件，返回写出的文件"""
+        if pa is None:
+            raise ImportError("pyarrow is required to compact financial data")
+        written = []
+        for data_type in data_types or list(self._index):
+            files = self._index.get(data_type)
+            if not files:
+                continue
+
+            frames = {}
+            for symbol, path in files.items():
+                try:
+                    frames[symbol] = pd.read_csv(path, index_col=0)
+                except Exception as e:
+                    logger.warning(f"Failed to load {data_type} for {symbol}: {e}")
+
+            # 统一列结构：同名列的类型在所有股票间合并
+            column_dtypes: Dict[str, List[str]] = {INDEX_COLUMN: []}
+            for frame in frames.values():
+                column_dtypes[INDEX_COLUMN].append(str(frame.index.dtype))
+                for column, dtype in frame.dtypes.items():
+                    column_dtypes.setdefault(str(column), []).append(str(dtype))
+            schema = pa.schema([(column, _arrow_type(dtypes)) for column, dtypes in column_dtypes.items()])
+
+            tables = []
+            layout = {}
+            offset = 0
+            for symbol, frame in frames.items():
+                frame = frame.copy()
+                frame.columns = [str(column) for column in frame.columns]
+                index_name = frame.index.name
+                arrays = []
+                for field in schema:
+                    if field.name == INDEX_COLUMN:
+                        values = pd.Series(frame.index)
+                    elif field.name in frame.columns:
+                        values = frame[field.name]
+                    else:
+                        values = pd.Series([None] * len(frame), dtype=object)
+                    arrays.append(_to_arrow(values, field.type))
+                tables.append(pa.Table.from_arrays(arrays, schema=schema))
+                layout[symbol] = {
+                    'rows': [offset, offset + len(frame)],
+                    'columns': list(frame.columns),
+                    'dtypes': [str(dtype) for dtype in frame.dtypes],
+                    'index_name': index_name,
+                    'index_dtype': str(frame.index.dtype),
+                    'fingerprint': file_fingerprint(files[symbol]),
+                }
+                offset += len(frame)
+
+            table = pa.concat_tables(tables) if tables else schema.empty_table()
+            table = table.replace_schema_metadata({METADATA_KEY: json.dumps(layout).encode('utf-8')})
+            path = self._compact_path(data_type)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.tmp")
+            # 不压缩，后续运行可以直接内存映射
+            feather.write_feather(table, str(tmp_path), compression='uncompressed')
+            tmp_path.replace(path)
+            self._open_compacted(data_type)
+            written.append(path)
+            logger.info(f"✅ 压缩 {data_type} 数据: {len(layout)} 只股票 -> {path}")
+        return written
+
+    def stats(self) -> dict:
+        return {
+            'data_types': {data_type: len(files) for data_type, files in self._index.items()},
+            'compacted': sorted(self._compacted),
+            'cached_frames': len(self._frames),
+            'loads': self.loads,
+        }
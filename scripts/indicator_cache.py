@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单只股票指标结果的磁盘缓存
+
+- 缓存键由股票代码、行情 .bin 文件的大小/修改时间、财务数据文件版本、指标配置哈希共同决定，
+  任何输入变化都会得到新的键，旧条目自然失效
+- 每个条目保存为一个 Parquet 文件
+- 总大小超过预算时按最近使用时间 (LRU) 淘汰，命中时刷新文件修改时间
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import pandas as pd
+from loguru import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    logger.warning("pyarrow not installed, indicator cache will not be available")
+    pa = None
+
+
+def file_fingerprint(path: Path) -> list:
+    """文件指纹：文件名、大小、修改时间（纳秒）；文件不存在时只记录文件名"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return [path.name]
+    return [path.name, stat.st_size, stat.st_mtime_ns]
+
+
+class IndicatorCache:
+    """内容寻址的指标结果缓存（线程安全）"""
+
+    SUFFIX = '.parquet'
+
+    def __init__(self, cache_dir: Union[str, Path], max_size_mb: float = 2048):
+        if pa is None:
+            raise ImportError("pyarrow is required for the indicator cache")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # LRU索引：条目路径 -> 文件大小，按最近使用时间从旧到新排列
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    def _load_index(self):
+        """启动时扫描一次缓存目录，按文件修改时间重建LRU顺序"""
+        entries = []
+        for path in self.cache_dir.glob(f"*/*{self.SUFFIX}"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            self._entries[path] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def make_key(symbol: str, input_files: Iterable[Path], config_hash: str) -> str:
+        """由股票代码、输入文件指纹和指标配置哈希生成缓存键"""
+        payload = {
+            'symbol': symbol,
+            'inputs': [file_fingerprint(Path(p)) for p in sorted(input_files, key=str)],
+            'config': config_hash,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{self.SUFFIX}"
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """读取缓存条目，未命中返回 None"""
+        path = self._entry_path(key)
+        try:
+            frame = pq.read_table(str(path)).to_pandas()
+            os.utime(path)  # 刷新最近使用时间
+        except (OSError, pa.ArrowException):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if path in self._entries:
+                self._entries.move_to_end(path)
+            else:
+                # 其他进程写入的条目
+                self._entries[path] = path.stat().st_size
+                self._total_bytes += self._entries[path]
+        return frame
+
+    def put(self, key: str, frame: pd.DataFrame):
+        """写入缓存条目（先写临时文件再原子替换），随后按预算淘汰"""
+        if frame is None or frame.empty:
+            return
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), str(tmp_path))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入指标缓存失败 {key[:12]}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(path, 0)
+            self._entries[path] = path.stat().st_size
+            self._total_bytes += self._entries[path]
+            self._evict()
+
+    def _evict(self):
+        """总大小超过预算时，从最久未使用的条目开始删除（调用方持有锁）"""
+        while self._total_bytes > self.max_size_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                path.unlink()
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def enforce_budget(self):
+        """重新扫描缓存目录并按预算淘汰（多个进程同时写入后由主进程调用）"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            self._load_index()
+            self._evict()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size_mb': self._total_bytes / 1024 / 1024,
+        }
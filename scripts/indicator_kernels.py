@@ -0,0 +1,501 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+指标计算的向量化滚动窗口内核
+
+所有内核沿 axis 0（时间轴）计算，既接受单只股票的一维数组，
+也接受 (日期 × 股票) 的二维面板。窗口不完整的行返回 NaN，
+由调用方决定预热期的填充值。
+
+rolling_mean/rolling_std/rolling_quantile/rolling_rank 例外：与 pandas 的
+rolling(window, min_periods=1) 一致，跳过缺失值（NaN，±inf 同样视为缺失）
+并对窗口不完整的行按已有数据计算。
+
+这些是纯 NumPy 的参考实现；kernel_backends 中的其他后端须与其结果一致。
+"""
+
+from typing import Dict, Iterable, Iterator, NamedTuple, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _as_2d(x: np.ndarray) -> np.ndarray:
+    """将一维数组视为单列二维数组（不复制）"""
+    x = np.asarray(x, dtype=np.float64)
+    return x.reshape(len(x), -1)
+
+
+def _restore_shape(values: np.ndarray, like: np.ndarray) -> np.ndarray:
+    return values.reshape(np.shape(like))
+
+
+def _centered(block: np.ndarray) -> np.ndarray:
+    """逐窗口的离差（最后一维为窗口）；先减去窗口末值，取值全部相同的窗口离差恰好为 0"""
+    shifted = block - block[..., -1:]
+    return shifted - shifted.mean(axis=-1, keepdims=True)
+
+
+# min_periods=1 类内核按行分块处理 (行 × 股票 × 窗口) 视图，限制临时数组的大小
+WINDOW_BLOCK_VALUES = 1 << 22
+
+
+def _padded_missing(x2d: np.ndarray, window: int) -> np.ndarray:
+    """前端补齐 window-1 行 NaN，非有限值一律记为 NaN（缺失）"""
+    padded = np.full((window - 1 + x2d.shape[0], x2d.shape[1]), np.nan)
+    padded[window - 1:] = np.where(np.isfinite(x2d), x2d, np.nan)
+    return padded
+
+
+def _partial_windows(x2d: np.ndarray, window: int) -> Iterator[Tuple[slice, np.ndarray]]:
+    """
+    按行分块给出以每行结尾、长度为 window 的窗口 (行, 股票, 窗口)
+
+    前端以 NaN 补齐，窗口不完整的行只包含已有数据。
+    """
+    n, m = x2d.shape
+    padded = _padded_missing(x2d, window)
+    view = sliding_window_view(padded, window, axis=0)
+    rows = max(WINDOW_BLOCK_VALUES // max(m * window, 1), 1)
+    for start in range(0, n, rows):
+        yield slice(start, start + rows), view[start:start + rows]
+
+
+def _block_window_sums(x: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    以 window 为块长做分块前缀和，返回每个完整窗口 [i-window+1, i] 的两段部分和
+
+    长度为 window 的窗口最多跨越两个块：head 为窗口落在起点所在块内的部分，
+    tail 为落在终点所在块内的部分（窗口恰好对齐一个块时为 0）。
+    块内累加使前缀和的量级只与窗口长度有关，避免长序列上的相消误差。
+    返回数组的第 0 行对应以第 window-1 行结尾的窗口。
+    """
+    n = x.shape[0]
+    n_blocks = -(-n // window)
+    padded = np.zeros((n_blocks * window,) + x.shape[1:], dtype=np.float64)
+    padded[:n] = x
+    blocks = padded.reshape((n_blocks, window) + x.shape[1:])
+    inclusive = np.cumsum(blocks, axis=1)
+    exclusive = np.zeros_like(inclusive)
+    exclusive[:, 1:] = inclusive[:, :-1]
+    totals = inclusive[:, -1]
+    inclusive = inclusive.reshape(padded.shape)
+    exclusive = exclusive.reshape(padded.shape)
+
+    end = np.arange(window - 1, n)
+    start = end - window + 1
+    head = totals[start // window] - exclusive[start]
+    tail = np.where(_expand((start % window) == 0, x.ndim), 0.0, inclusive[end])
+    return head, tail
+
+
+def _expand(mask: np.ndarray, ndim: int) -> np.ndarray:
+    """为按行的一维掩码补齐尾部维度以便广播"""
+    return mask.reshape(mask.shape + (1,) * (ndim - 1))
+
+
+def _block_centers(x: np.ndarray, finite: np.ndarray, window: int) -> np.ndarray:
+    """每个长度为 window 的块内有限值的均值（无有限值时为 0），按行展开回原长度"""
+    n = x.shape[0]
+    n_blocks = -(-n // window)
+    values = np.zeros((n_blocks * window,) + x.shape[1:])
+    counts = np.zeros_like(values)
+    values[:n] = np.where(finite, x, 0.0)
+    counts[:n] = finite
+    shape = (n_blocks, window) + x.shape[1:]
+    with np.errstate(all='ignore'):
+        centers = values.reshape(shape).sum(axis=1) / counts.reshape(shape).sum(axis=1)
+    centers = np.where(np.isfinite(centers), centers, 0.0)
+    return np.repeat(centers, window, axis=0)[:n]
+
+
+def rolling_ols(y: np.ndarray, windows: Iterable[int]) -> Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    对 y 关于窗口内位置 x = 0..d-1 做滚动一元线性回归
+
+    由 y、x·y、y² 的分块前缀和一次性得到所有窗口的闭式解，
+    返回 {d: (斜率, R², 窗口最后一点的残差)}。
+    每个块先减去块内均值，跨块窗口再统一平移到起点块的均值，使各项累加量级只与窗口相关。
+    包含非有限值的窗口结果为 0（与 np.polyfit 失败时的处理一致）；
+    窗口方差相对其二阶矩过小时，回退到逐窗口两遍法精确计算。
+    """
+    y2d = _as_2d(y)
+    n = y2d.shape[0]
+    finite = np.isfinite(y2d)
+    bad_values = (~finite).astype(np.float64)
+
+    results = {}
+    for d in windows:
+        slope = np.full(y2d.shape, np.nan)
+        rsqr = np.full(y2d.shape, np.nan)
+        resid = np.full(y2d.shape, np.nan)
+        if d < 2 or d > n:
+            results[d] = tuple(_restore_shape(v, y) for v in (slope, rsqr, resid))
+            continue
+
+        centers = _block_centers(y2d, finite, d)
+        z = np.where(finite, y2d - centers, 0.0)
+        # 块内位置 τ = t mod d
+        local_position = (np.arange(n, dtype=np.float64) % d).reshape(n, 1)
+        head_z, tail_z = _block_window_sums(z, d)
+        head_tz, tail_tz = _block_window_sums(local_position * z, d)
+        head_zz, tail_zz = _block_window_sums(z * z, d)
+        head_bad, tail_bad = _block_window_sums(bad_values, d)
+        bad = (head_bad + tail_bad) > 0
+
+        # 窗口 [a, i]：起点块内 x = τ - τ_a，终点块内 x = τ + d - τ_a，终点块长度为 τ_a；
+        # 终点块的数据相对起点块均值的偏移为 δ
+        start_position = local_position[:n - d + 1]
+        tail_length = start_position
+        delta = centers[d - 1:] - centers[:n - d + 1]
+        sum_y = head_z + tail_z + tail_length * delta
+        # 各项的量级（不小于 sum_yy 中任一项），用于判断相消误差
+        magnitude_yy = head_zz + tail_zz + tail_length * delta * delta
+        sum_yy = magnitude_yy + 2 * delta * tail_z
+        sum_xy = (
+            head_tz - start_position * head_z
+            + tail_tz + (d - start_position) * tail_z
+            + delta * (tail_length * (tail_length - 1) / 2 + tail_length * (d - start_position))
+        )
+
+        x_mean = (d - 1) / 2.0
+        sxx = d * (d * d - 1) / 12.0
+        y_mean = sum_y / d
+        sxy = sum_xy - x_mean * sum_y
+        syy = sum_yy - sum_y * y_mean
+        # 窗口末点相对起点块均值的取值
+        last = z[d - 1:] + delta
+
+        with np.errstate(all='ignore'):
+            slope_d = sxy / sxx
+            rsqr_d = np.where(syy > 0, sxy * sxy / (sxx * syy), 0.0)
+            resid_d = last - y_mean - slope_d * (d - 1 - x_mean)
+
+        unstable = (syy <= 1e-6 * magnitude_yy) & ~bad
+        if unstable.any():
+            rows, cols = np.nonzero(unstable)
+            block = sliding_window_view(y2d, d, axis=0)[rows, cols]
+            x = np.arange(d, dtype=np.float64) - x_mean
+            deviation = _centered(block)
+            exact_sxy = deviation @ x
+            exact_syy = np.einsum('ij,ij->i', deviation, deviation)
+            exact_slope = exact_sxy / sxx
+            slope_d[rows, cols] = exact_slope
+            with np.errstate(all='ignore'):
+                rsqr_d[rows, cols] = np.where(exact_syy > 0, exact_sxy * exact_sxy / (sxx * exact_syy), 0.0)
+            resid_d[rows, cols] = deviation[:, -1] - exact_slope * x[-1]
+
+        slope[d - 1:] = np.where(bad, 0.0, slope_d)
+        rsqr[d - 1:] = np.where(bad, 0.0, np.minimum(rsqr_d, 1.0))
+        resid[d - 1:] = np.where(bad, 0.0, resid_d)
+        results[d] = tuple(_restore_shape(v, y) for v in (slope, rsqr, resid))
+
+    return results
+
+
+def rolling_extrema(x: np.ndarray, windows: Iterable[int], kind: str = 'max') -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    滚动最大/最小值及其位置
+
+    在前端补齐后的序列上只建立一次宽度为 max(windows) 的 sliding_window_view，
+    各窗口取其末尾 d 列做归约，不复制数据。返回 {d: (极值, 位置)}：
+    极值按 min_periods=1 计算并跳过 NaN（与 pandas rolling 一致）；
+    位置为首个极值距窗口末端的天数 (d - 1 - argmax)，窗口不完整的行为 NaN。
+    """
+    if kind not in ('max', 'min'):
+        raise ValueError(f"kind must be 'max' or 'min', got {kind!r}")
+    reduce_values = np.fmax.reduce if kind == 'max' else np.fmin.reduce
+    locate = np.argmax if kind == 'max' else np.argmin
+
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[0]
+    windows = list(windows)
+    width = max(windows)
+    padded = np.concatenate([np.full((width - 1,) + x.shape[1:], np.nan), x], axis=0)
+    view = sliding_window_view(padded, width, axis=0)
+
+    results = {}
+    for d in windows:
+        window_view = view[..., width - d:]
+        with np.errstate(all='ignore'):
+            extreme = reduce_values(window_view, axis=-1)
+        position = np.full(x.shape, np.nan)
+        if d <= n:
+            position[d - 1:] = d - 1 - locate(window_view[d - 1:], axis=-1)
+        results[d] = (extreme, position)
+    return results
+
+
+class _WindowMoments(NamedTuple):
+    """完整窗口的一阶/二阶矩，第 0 行对应以第 window-1 行结尾的窗口"""
+    bad: np.ndarray  # 窗口内含非有限值
+    mean_x: np.ndarray
+    mean_y: np.ndarray
+    sxx: np.ndarray  # 离差平方和
+    syy: np.ndarray
+    sxy: np.ndarray  # 离差积和
+    mxx: np.ndarray  # 相对平移中心的二阶矩各项的量级，用于判断相消误差
+    myy: np.ndarray
+
+
+def _centered_window_moments(x: np.ndarray, y: np.ndarray, window: int) -> _WindowMoments:
+    """
+    计算每个完整窗口的均值、离差平方和与离差积和
+
+    与 rolling_ols 相同，采用分块前缀和并按块均值平移，跨块窗口统一到起点块的均值。
+    """
+    n = x.shape[0]
+    finite_x = np.isfinite(x)
+    finite_y = np.isfinite(y)
+    bad_values = (~(finite_x & finite_y)).astype(np.float64)
+    center_x = _block_centers(x, finite_x, window)
+    center_y = _block_centers(y, finite_y, window)
+    zx = np.where(finite_x, x - center_x, 0.0)
+    zy = np.where(finite_y, y - center_y, 0.0)
+
+    head_x, tail_x = _block_window_sums(zx, window)
+    head_y, tail_y = _block_window_sums(zy, window)
+    head_xx, tail_xx = _block_window_sums(zx * zx, window)
+    head_yy, tail_yy = _block_window_sums(zy * zy, window)
+    head_xy, tail_xy = _block_window_sums(zx * zy, window)
+    head_bad, tail_bad = _block_window_sums(bad_values, window)
+
+    tail_length = _expand((np.arange(n - window + 1) % window).astype(np.float64), x.ndim)
+    delta_x = center_x[window - 1:] - center_x[:n - window + 1]
+    delta_y = center_y[window - 1:] - center_y[:n - window + 1]
+
+    sum_x = head_x + tail_x + tail_length * delta_x
+    sum_y = head_y + tail_y + tail_length * delta_y
+    magnitude_xx = head_xx + tail_xx + tail_length * delta_x * delta_x
+    magnitude_yy = head_yy + tail_yy + tail_length * delta_y * delta_y
+    mxx = magnitude_xx + 2 * delta_x * tail_x
+    myy = magnitude_yy + 2 * delta_y * tail_y
+    mxy = head_xy + tail_xy + delta_y * tail_x + delta_x * tail_y + tail_length * delta_x * delta_y
+
+    return _WindowMoments(
+        bad=(head_bad + tail_bad) > 0,
+        mean_x=center_x[:n - window + 1] + sum_x / window,
+        mean_y=center_y[:n - window + 1] + sum_y / window,
+        sxx=mxx - sum_x * sum_x / window,
+        syy=myy - sum_y * sum_y / window,
+        sxy=mxy - sum_x * sum_y / window,
+        mxx=magnitude_xx,
+        myy=magnitude_yy,
+    )
+
+
+def rolling_sum(x: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    """
+    滚动求和，返回 {d: 窗口和}
+
+    含非有限值的窗口结果为 NaN（与对切片调用 np.sum 一致）；窗口不完整的行为 NaN。
+    对0/1指示序列结果是精确的计数。
+    """
+    x2d = _as_2d(x)
+    n = x2d.shape[0]
+    finite = np.isfinite(x2d)
+    values = np.where(finite, x2d, 0.0)
+    bad_values = (~finite).astype(np.float64)
+
+    results = {}
+    for d in windows:
+        total = np.full(x2d.shape, np.nan)
+        if 1 <= d <= n:
+            head, tail = _block_window_sums(values, d)
+            head_bad, tail_bad = _block_window_sums(bad_values, d)
+            total[d - 1:] = np.where((head_bad + tail_bad) > 0, np.nan, head + tail)
+        results[d] = _restore_shape(total, x)
+    return results
+
+
+def rolling_mean_std(x: np.ndarray, windows: Iterable[int], ddof: int = 0) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    滚动均值与标准差，返回 {d: (均值, 标准差)}
+
+    含非有限值的窗口结果为 NaN；方差相对二阶矩过小的窗口回退到两遍法精确计算。
+    """
+    x2d = _as_2d(x)
+    n = x2d.shape[0]
+
+    results = {}
+    for d in windows:
+        mean = np.full(x2d.shape, np.nan)
+        std = np.full(x2d.shape, np.nan)
+        if 1 <= d <= n and d > ddof:
+            moments = _centered_window_moments(x2d, x2d, d)
+            sxx = moments.sxx
+            unstable = (sxx <= 1e-6 * moments.mxx) & ~moments.bad
+            if unstable.any():
+                rows, cols = np.nonzero(unstable)
+                block = sliding_window_view(x2d, d, axis=0)[rows, cols]
+                deviation = _centered(block)
+                sxx[rows, cols] = np.einsum('ij,ij->i', deviation, deviation)
+            with np.errstate(all='ignore'):
+                std_d = np.sqrt(np.maximum(sxx, 0.0) / (d - ddof))
+            mean[d - 1:] = np.where(moments.bad, np.nan, moments.mean_x)
+            std[d - 1:] = np.where(moments.bad, np.nan, std_d)
+        results[d] = (_restore_shape(mean, x), _restore_shape(std, x))
+    return results
+
+
+def rolling_corr(x: np.ndarray, y: np.ndarray, windows: Iterable[int], min_std: float = 1e-8) -> Dict[int, np.ndarray]:
+    """
+    滚动皮尔逊相关系数
+
+    由一阶、二阶累计矩一次得到所有窗口的协方差与方差，返回 {d: 相关系数}。
+    与逐窗口 np.corrcoef 的约定一致：任一序列总体标准差不超过 min_std、
+    或窗口内含非有限值时结果为 0；窗口不完整的行为 NaN。
+    方差接近阈值或相对二阶矩过小的窗口回退到两遍法精确计算。
+    """
+    x2d = _as_2d(x)
+    y2d = _as_2d(y)
+    n = x2d.shape[0]
+
+    results = {}
+    for d in windows:
+        corr = np.full(x2d.shape, np.nan)
+        if d < 2 or d > n:
+            results[d] = _restore_shape(corr, x)
+            continue
+
+        moments = _centered_window_moments(x2d, y2d, d)
+        bad, sxx, syy, sxy = moments.bad, moments.sxx, moments.syy, moments.sxy
+        mxx, myy = moments.mxx, moments.myy
+        threshold = d * min_std * min_std
+        unstable = (
+            (sxx <= 1e-6 * mxx) | (syy <= 1e-6 * myy)
+            | (np.abs(sxx - threshold) <= 1e-6 * threshold) | (np.abs(syy - threshold) <= 1e-6 * threshold)
+        ) & ~bad
+        if unstable.any():
+            rows, cols = np.nonzero(unstable)
+            block_x = sliding_window_view(x2d, d, axis=0)[rows, cols]
+            block_y = sliding_window_view(y2d, d, axis=0)[rows, cols]
+            deviation_x = _centered(block_x)
+            deviation_y = _centered(block_y)
+            sxx[rows, cols] = np.einsum('ij,ij->i', deviation_x, deviation_x)
+            syy[rows, cols] = np.einsum('ij,ij->i', deviation_y, deviation_y)
+            sxy[rows, cols] = np.einsum('ij,ij->i', deviation_x, deviation_y)
+
+        valid = ~bad & (sxx > threshold) & (syy > threshold)
+        with np.errstate(all='ignore'):
+            corr_d = np.clip(sxy / np.sqrt(sxx * syy), -1.0, 1.0)
+        corr[d - 1:] = np.where(valid, corr_d, 0.0)
+        results[d] = _restore_shape(corr, x)
+    return results
+
+
+def _window_stats(block: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """跳过缺失值 (NaN) 的窗口统计：(有效数据个数, 均值, 离差平方和, 取值是否全部相同)"""
+    valid = ~np.isnan(block)
+    count = valid.sum(axis=-1)
+    with np.errstate(all='ignore'):
+        low = np.where(valid, block, np.inf).min(axis=-1)
+        high = np.where(valid, block, -np.inf).max(axis=-1)
+        total = np.where(valid, block, 0.0).sum(axis=-1)
+        mean = total / count
+        deviation = np.where(valid, block - mean[..., None], 0.0)
+        sxx = np.einsum('...i,...i->...', deviation, deviation)
+    # 取值全部相同的窗口：均值取该值、离差为 0（与 pandas 一致，不受累加舍入影响）
+    constant = (count > 0) & (low == high)
+    mean = np.where(constant, low, mean)
+    sxx = np.where(constant, 0.0, sxx)
+    return count, mean, sxx, constant
+
+
+def _partial_window_moments(x2d: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    min_periods=1、跳过 NaN 的窗口矩：(有效数据个数, 均值, 离差平方和)，每行对应以该行结尾的窗口
+
+    与 _centered_window_moments 相同的分块前缀和（前端以 NaN 补齐 window-1 行），
+    缺失值不计入个数与各项和；离差平方和相对二阶矩过小的窗口回退到逐窗口两遍法精确计算。
+    """
+    n = x2d.shape[0]
+    padded = _padded_missing(x2d, window)
+    valid = ~np.isnan(padded)
+    centers = _block_centers(padded, valid, window)
+    z = np.where(valid, padded - centers, 0.0)
+    head_z, tail_z = _block_window_sums(z, window)
+    head_zz, tail_zz = _block_window_sums(z * z, window)
+    head_count, tail_count = _block_window_sums(valid.astype(np.float64), window)
+
+    # 终点块中的数据相对起点块均值的偏移为 δ，只计有效数据
+    delta = centers[window - 1:] - centers[:n]
+    count = head_count + tail_count
+    total = head_z + tail_z + tail_count * delta
+    magnitude = head_zz + tail_zz + tail_count * delta * delta
+    with np.errstate(all='ignore'):
+        mean = centers[:n] + total / count
+        sxx = magnitude + 2 * delta * tail_z - total * total / count
+
+    unstable = (sxx <= 1e-6 * magnitude) & (count > 0)
+    if unstable.any():
+        rows, cols = np.nonzero(unstable)
+        block = sliding_window_view(padded, window, axis=0)[rows, cols]
+        _, mean[rows, cols], sxx[rows, cols], _ = _window_stats(block)
+    mean = np.where(count > 0, mean, np.nan)
+    return count, mean, sxx
+
+
+def rolling_mean(x: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    """滚动均值（min_periods=1，跳过缺失值），窗口内没有数据时为 NaN"""
+    x2d = _as_2d(x)
+    return {d: _restore_shape(_partial_window_moments(x2d, d)[1], x) for d in windows}
+
+
+def rolling_std(x: np.ndarray, windows: Iterable[int], ddof: int = 1) -> Dict[int, np.ndarray]:
+    """滚动标准差（min_periods=1，跳过缺失值），有效数据不超过 ddof 个时为 NaN"""
+    x2d = _as_2d(x)
+    results = {}
+    for d in windows:
+        count, _, sxx = _partial_window_moments(x2d, d)
+        with np.errstate(all='ignore'):
+            std = np.where(count > ddof, np.sqrt(np.maximum(sxx, 0.0) / (count - ddof)), np.nan)
+        results[d] = _restore_shape(std, x)
+    return results
+
+
+def rolling_quantile(x: np.ndarray, windows: Iterable[int], quantile: float) -> Dict[int, np.ndarray]:
+    """
+    滚动分位数（min_periods=1，跳过缺失值），线性插值
+
+    位置 q·(n-1) 恰为整数时直接取该值，否则在相邻两个有序值之间插值（与 pandas 的计算式相同）。
+    """
+    x2d = _as_2d(x)
+    results = {}
+    for d in windows:
+        values = np.full(x2d.shape, np.nan)
+        for rows, block in _partial_windows(x2d, d):
+            ordered = np.sort(block, axis=-1)  # NaN 排在末尾
+            count = (~np.isnan(block)).sum(axis=-1)
+            position = quantile * (count - 1)
+            lower = np.floor(np.maximum(position, 0)).astype(np.intp)
+            upper = np.minimum(lower + 1, np.maximum(count - 1, 0))
+            low = np.take_along_axis(ordered, lower[..., None], axis=-1)[..., 0]
+            high = np.take_along_axis(ordered, upper[..., None], axis=-1)[..., 0]
+            fraction = position - lower
+            with np.errstate(all='ignore'):
+                interpolated = np.where(fraction == 0, low, low + (high - low) * fraction)
+            values[rows] = np.where(count > 0, interpolated, np.nan)
+        results[d] = _restore_shape(values, x)
+    return results
+
+
+def rolling_rank(x: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    """
+    末值在滚动窗口中的百分位排名（min_periods=1，跳过缺失值）
+
+    相同取值取平均排名，再除以有效数据个数（与 pandas rank(pct=True) 一致）；末值缺失时为 NaN。
+    """
+    x2d = _as_2d(x)
+    results = {}
+    for d in windows:
+        rank = np.full(x2d.shape, np.nan)
+        for rows, block in _partial_windows(x2d, d):
+            last = block[..., -1:]
+            count = (~np.isnan(block)).sum(axis=-1)
+            less = (block < last).sum(axis=-1)
+            equal = (block == last).sum(axis=-1)
+            with np.errstate(all='ignore'):
+                rank[rows] = np.where(np.isnan(last[..., 0]), np.nan, (less + (equal + 1) / 2) / count)
+        results[d] = _restore_shape(rank, x)
+    return results
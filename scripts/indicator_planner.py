@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标选择与依赖规划
+
+--indicators 接受逗号分隔的选择项，每一项可以是：
+- 指标族名称（alpha158/alpha360/technical/candlestick/financial/volatility），选择整族
+- 列名，如 RSI_14、ALPHA158_CORR20
+- 通配符，如 ALPHA158_CORR*、CDL*DOJI*
+
+匹配不区分大小写。IndicatorPlan 记录每个指标族需要输出的列，指标族内部再通过
+resolve 把列映射到计算分组及其共享中间结果，只计算真正需要的部分。
+"""
+
+import fnmatch
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Union
+
+FAMILIES = ('alpha158', 'alpha360', 'technical', 'candlestick', 'financial', 'volatility')
+
+
+class IndicatorPlan:
+    """每个指标族需要输出的列：族不在计划中表示跳过，取值为 None 表示整族输出"""
+
+    def __init__(self, selected: Optional[Mapping[str, Optional[Iterable[str]]]] = None):
+        if selected is None:
+            self._selected = {family: None for family in FAMILIES}
+        else:
+            self._selected = {
+                family: None if columns is None else frozenset(columns)
+                for family, columns in selected.items()
+            }
+
+    @classmethod
+    def all(cls) -> 'IndicatorPlan':
+        return cls()
+
+    @classmethod
+    def from_patterns(cls, patterns: Union[str, Sequence[str], None],
+                      catalog: Mapping[str, Sequence[str]]) -> 'IndicatorPlan':
+        """
+        按选择项生成计划；patterns 为空时选择全部指标
+
+        catalog 为 指标族 -> 该族全部输出列；无法匹配任何指标的选择项抛出 ValueError
+        """
+        if isinstance(patterns, str):
+            patterns = patterns.split(',')
+        patterns = [pattern.strip() for pattern in (patterns or []) if pattern and pattern.strip()]
+        if not patterns:
+            return cls.all()
+
+        selected: Dict[str, Optional[Set[str]]] = {}
+        for pattern in patterns:
+            family = pattern.lower()
+            if family in catalog:
+                selected[family] = None
+                continue
+
+            regex = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
+            matched = False
+            for name, columns in catalog.items():
+                hits = [column for column in columns if regex.match(column)]
+                if not hits:
+                    continue
+                matched = True
+                if name in selected and selected[name] is None:
+                    continue
+                selected.setdefault(name, set()).update(hits)
+            if not matched:
+                raise ValueError(f"Unknown indicator or family: {pattern}")
+
+        # 按 FAMILIES 顺序保存，保证签名稳定
+        return cls({family: selected[family] for family in FAMILIES if family in selected})
+
+    @property
+    def is_full(self) -> bool:
+        return all(self._selected.get(family, False) is None for family in FAMILIES)
+
+    def includes(self, family: str) -> bool:
+        return family in self._selected
+
+    def columns(self, family: str) -> Optional[frozenset]:
+        """该族需要输出的列；None 表示整族"""
+        return self._selected.get(family, frozenset())
+
+    def wants(self, family: str, column: str) -> bool:
+        if family not in self._selected:
+            return False
+        columns = self._selected[family]
+        return columns is None or column in columns
+
+    def wants_any(self, family: str, columns: Iterable[str]) -> bool:
+        return any(self.wants(family, column) for column in columns)
+
+    def resolve(self, family: str, groups: Mapping[str, Sequence[str]],
+                dependencies: Optional[Mapping[str, Sequence[str]]] = None) -> Set[str]:
+        """
+        把需要的列解析为需要计算的分组及其依赖的中间结果
+
+        groups 为 分组名 -> 该分组输出的列，dependencies 为 分组名 -> 依赖的中间结果名
+        """
+        needed = {group for group, columns in groups.items() if self.wants_any(family, columns)}
+        for group in list(needed):
+            needed.update((dependencies or {}).get(group, ()))
+        return needed
+
+    def select(self, family: str, columns: Iterable[str]) -> List[str]:
+        """按原有顺序筛选出计划中的列"""
+        return [column for column in columns if self.wants(family, column)]
+
+    def signature(self) -> Optional[Dict[str, Optional[List[str]]]]:
+        """用于缓存键的稳定表示；全部指标时为 None"""
+        if self.is_full:
+            return None
+        return {
+            family: None if columns is None else sorted(columns)
+            for family, columns in self._selected.items()
+        }
+
+    def describe(self) -> str:
+        if self.is_full:
+            return '全部指标'
+        parts = []
+        for family, columns in self._selected.items():
+            parts.append(f"{family}(全部)" if columns is None else f"{family}({len(columns)})")
+        return ', '.join(parts)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标计算的计时与性能剖析
+
+IndicatorProfiler 记录每只股票每个阶段的耗时：
+- 阶段包括 read（读取行情）、各指标族（alpha158/alpha360/...）、queue（在执行器队列中的等待时间）、
+  stock（单只股票总耗时），以及整次运行的 merge（合并结果）和 save（写出文件）
+- 每条记录包含墙钟时间、当前线程的CPU时间和阶段内的内存峰值增量（tracemalloc）；
+  阶段可以嵌套（如 stock 内的 read 与各指标族），外层阶段的峰值包含内层阶段的峰值；
+  多只股票并行计算时各线程共享同一个内存峰值计数，峰值为近似值
+- 报告以 JSON（明细 + 按阶段汇总）或 CSV（明细）写在输出文件旁边
+- 可选对抽样的股票运行 cProfile，每只股票一个 .pstats 文件，
+  可用 python -m pstats 或 snakeviz 查看
+"""
+
+import cProfile
+import csv
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+from loguru import logger
+
+REPORT_FORMATS = ('json', 'csv')
+RUN_SYMBOL = '*'
+RECORD_FIELDS = ('symbol', 'stage', 'wall_s', 'cpu_s', 'peak_mb')
+
+
+def sample_symbols(symbols: Sequence[str], n: int) -> List[str]:
+    """在股票列表中等间隔抽取 n 只（结果可复现）"""
+    if n <= 0 or not symbols:
+        return []
+    if n >= len(symbols):
+        return list(symbols)
+    positions = np.linspace(0, len(symbols) - 1, n).round().astype(int)
+    return [symbols[position] for position in dict.fromkeys(positions.tolist())]
+
+
+class IndicatorProfiler:
+    """线程安全的分阶段计时器；未启用时 measure 为空操作"""
+
+    def __init__(self, enabled: bool = False, trace_memory: bool = True,
+                 profile_dir: Union[str, Path, None] = None, profile_symbols: Iterable[str] = ()):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.profile_symbols = set(profile_symbols)
+        self._records: List[dict] = []
+        self._lock = threading.Lock()
+        # cProfile 同一时间只剖析一只股票
+        self._profile_lock = threading.Lock()
+        # 尚未结束的阶段（所有线程）：tracemalloc 只有一个峰值计数，重置前先并入这些阶段各自的峰值
+        self._open_measures: List[dict] = []
+        self._started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def _enter_memory(self) -> dict:
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            for frame in self._open_measures:
+                frame['peak'] = max(frame['peak'], peak)
+            tracemalloc.reset_peak()
+            frame = {'base': current, 'peak': current}
+            self._open_measures.append(frame)
+        return frame
+
+    def _exit_memory(self, frame: dict) -> float:
+        """阶段内的峰值增量（MB）：max(自身峰值, 内层阶段峰值) - 进入时的内存"""
+        with self._lock:
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            self._open_measures.remove(frame)
+        return max(peak - frame['base'], 0) / 1024 / 1024
+
+    @contextmanager
+    def _measure(self, stage: str, symbol: str):
+        frame = self._enter_memory() if self.trace_memory else None
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            record = {
+                'symbol': symbol,
+                'stage': stage,
+                'wall_s': time.perf_counter() - wall,
+                'cpu_s': time.thread_time() - cpu,
+                'peak_mb': None,
+            }
+            if frame is not None:
+                record['peak_mb'] = self._exit_memory(frame)
+            with self._lock:
+                self._records.append(record)
+
+    def measure(self, stage: str, symbol: Optional[str] = None):
+        """记录一个阶段；symbol 为空表示整次运行级别的阶段（merge/save）"""
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(stage, symbol or RUN_SYMBOL)
+
+    def record_wait(self, symbol: str, submitted_at: Optional[float]):
+        """记录任务从提交到开始执行的等待时间（submitted_at 为提交时的 time.time()）"""
+        if not self.enabled or submitted_at is None:
+            return
+        with self._lock:
+            self._records.append({
+                'symbol': symbol, 'stage': 'queue', 'wall_s': max(time.time() - submitted_at, 0.0),
+                'cpu_s': 0.0, 'peak_mb': None,
+            })
+
+    def pop_records(self, symbol: str) -> List[dict]:
+        """取出某只股票的记录（工作进程把记录随结果传回主进程）"""
+        with self._lock:
+            records = [record for record in self._records if record['symbol'] == symbol]
+            self._records = [record for record in self._records if record['symbol'] != symbol]
+        return records
+
+    def extend(self, records: Optional[Iterable[dict]]):
+        if self.enabled and records:
+            with self._lock:
+                self._records.extend(records)
+
+    @property
+    def records(self) -> List[dict]:
+        with self._lock:
+            return list(self._records)
+
+    def profile(self, symbol: str):
+        """抽样股票在 cProfile 下计算，结束后写出 <profile_dir>/<symbol>.pstats"""
+        if symbol not in self.profile_symbols or self.profile_dir is None:
+            return nullcontext()
+        return self._profile(symbol)
+
+    def is_profiled(self, symbol: str) -> bool:
+        return symbol in self.profile_symbols and self.profile_dir is not None
+
+    @contextmanager
+    def _profile(self, symbol: str):
+        with self._profile_lock:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                path = self.profile_dir / f"{symbol}.pstats"
+                profiler.dump_stats(str(path))
+                logger.info(f"🔬 {symbol}: 性能剖析结果已写入 {path}")
+
+    def summary(self) -> Dict[str, dict]:
+        """按阶段汇总：次数、墙钟/CPU 总计与分位数、最大内存峰值"""
+        stages: Dict[str, List[dict]] = {}
+        for record in self.records:
+            stages.setdefault(record['stage'], []).append(record)
+        summary = {}
+        for stage, records in stages.items():
+            wall = np.array([record['wall_s'] for record in records])
+            cpu = np.array([record['cpu_s'] for record in records])
+            peaks = [record['peak_mb'] for record in records if record['peak_mb'] is not None]
+            summary[stage] = {
+                'count': len(records),
+                'wall_total_s': float(wall.sum()),
+                'wall_mean_s': float(wall.mean()),
+                'wall_p50_s': float(np.percentile(wall, 50)),
+                'wall_p95_s': float(np.percentile(wall, 95)),
+                'cpu_total_s': float(cpu.sum()),
+                'peak_mb_max': max(peaks) if peaks else None,
+            }
+        return summary
+
+    def write_report(self, path: Union[str, Path], report_format: str = 'json') -> Path:
+        """写出计时报告：json 包含明细与汇总，csv 只包含明细"""
+        if report_format not in REPORT_FORMATS:
+            raise ValueError(f"Unsupported report format: {report_format}, expected one of {REPORT_FORMATS}")
+        path = Path(path).with_suffix(f'.{report_format}')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if report_format == 'json':
+            payload = {'summary': self.summary(), 'records': self.records}
+            path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding='utf-8')
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS)
+                writer.writeheader()
+                writer.writerows(self.records)
+        return path
+
+    def log_summary(self):
+        for stage, stats in sorted(self.summary().items(), key=lambda item: -item[1]['wall_total_s']):
+            peak = f", 内存峰值 {stats['peak_mb_max']:.1f}MB" if stats['peak_mb_max'] is not None else ''
+            logger.info(f"⏱️ {stage:<12} {stats['count']:>5} 次, 墙钟 {stats['wall_total_s']:.2f}s "
+                        f"(p50 {stats['wall_p50_s'] * 1000:.1f}ms, p95 {stats['wall_p95_s'] * 1000:.1f}ms), "
+                        f"CPU {stats['cpu_total_s']:.2f}s{peak}")
+
+    def close(self):
+        """停止本计时器启动的内存跟踪，之后的记录不再包含内存峰值"""
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+        self.trace_memory = False
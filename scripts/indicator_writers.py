@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+指标结果写出工具
+
+StreamingCSVWriter 按块写出指标结果：
+- 第一行为字段名，第二行为中文标签（与 save_results 的格式一致）
+- 空值写为空字符串（兼容SAS）
+- 每次 write 可以是完整结果，也可以是单只股票刚算完的结果，无需等待全部合并
+- append=True 时沿用已有文件的表头，在末尾追加新行（增量更新）
+
+write_columnar_results 以 Parquet/Feather 列式格式写出：
+- 无损时将 float64 压缩为 float32、整数压缩为 int8/int16/int32
+- 可按股票代码或年份分区（hive 目录格式，如 Symbol=AAPL/part-0.parquet）
+- 中文标签以 JSON 形式保存在 schema 元数据 field_labels 中
+"""
+
+import csv
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    logger.warning("pyarrow not installed, parquet/feather output will not be available")
+    pa = None
+
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
+PARTITION_CHOICES = ('none', 'symbol', 'year')
+FIELD_LABELS_METADATA_KEY = b'field_labels'
+
+
+class StreamingCSVWriter:
+    """分块写出带中文标签行的CSV文件"""
+
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+    LINE_TERMINATOR = '\r\n'  # 与 csv.writer 默认换行保持一致
+
+    def __init__(self, path: Union[str, Path], columns: Optional[List[str]] = None, labels: Optional[List[str]] = None,
+                 chunk_rows: int = 50000, encoding: str = 'utf-8-sig', append: bool = False):
+        self.path = Path(path)
+        self.columns = list(columns) if columns is not None else []
+        self.labels = list(labels) if labels is not None else list(self.columns)
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.encoding = encoding
+        self.append = append and self.path.exists()
+        self.rows_written = 0
+        self._file = None
+        self._dropped_columns = set()
+
+    def open(self) -> 'StreamingCSVWriter':
+        """创建文件并写入两行表头；追加模式下读取已有表头"""
+        if self.append:
+            with open(self.path, 'r', encoding=self.encoding, newline='') as f:
+                reader = csv.reader(f)
+                self.columns = next(reader)
+                self.labels = next(reader, self.columns)
+            self._file = open(self.path, 'a', encoding='utf-8', newline='')
+            return self
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'w', encoding=self.encoding, newline='')
+        writer = csv.writer(self._file, lineterminator=self.LINE_TERMINATOR)
+        writer.writerow(self.columns)
+        writer.writerow(self.labels)
+        return self
+
+    def write(self, df: pd.DataFrame) -> int:
+        """按表头列顺序分块写出数据行，返回写出的行数"""
+        if self._file is None:
+            raise RuntimeError("StreamingCSVWriter is not open")
+        if df is None or df.empty:
+            return 0
+
+        extra_columns = set(df.columns) - set(self.columns) - self._dropped_columns
+        if extra_columns:
+            logger.warning(f"表头中不存在的列将被忽略: {sorted(extra_columns)[:5]}{'...' if len(extra_columns) > 5 else ''}")
+            self._dropped_columns.update(extra_columns)
+        if list(df.columns) != self.columns:
+            df = df.reindex(columns=self.columns)
+
+        for start in range(0, len(df), self.chunk_rows):
+            df.iloc[start:start + self.chunk_rows].to_csv(
+                self._file,
+                header=False,
+                index=False,
+                na_rep='',
+                date_format=self.DATE_FORMAT,
+                lineterminator=self.LINE_TERMINATOR,
+            )
+        self.rows_written += len(df)
+        return len(df)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'StreamingCSVWriter':
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    在不损失精度的前提下压缩数值列的dtype
+
+    - float64 列只有在转换为 float32 后数值完全一致（含NaN位置）时才压缩
+    - 整数列压缩为能容纳其取值范围的最窄类型（int8/int16/int32）
+    """
+    compacted = {}
+    for column in df.columns:
+        values = df[column].values
+        kind = values.dtype.kind
+        if kind == 'f' and values.dtype.itemsize > 4:
+            narrowed = values.astype(np.float32)
+            if np.array_equal(narrowed.astype(values.dtype), values, equal_nan=True):
+                compacted[column] = narrowed
+        elif kind in 'iu' and len(values):
+            low, high = values.min(), values.max()
+            for dtype in (np.int8, np.int16, np.int32):
+                info = np.iinfo(dtype)
+                if info.min <= low and high <= info.max:
+                    if np.dtype(dtype).itemsize < values.dtype.itemsize:
+                        compacted[column] = values.astype(dtype)
+                    break
+    if not compacted:
+        return df
+    return df.assign(**compacted)
+
+
+def resolve_output_path(path: Union[str, Path], output_format: str, partition_by: Optional[str] = None) -> Path:
+    """按输出格式修正后缀；分区输出时返回目录路径"""
+    path = Path(path)
+    if output_format == 'csv':
+        return path
+    if partition_by and partition_by != 'none':
+        return path.with_suffix('')
+    return path.with_suffix(f'.{output_format}')
+
+
+def write_columnar_results(df: pd.DataFrame, path: Union[str, Path], output_format: str = 'parquet',
+                           labels: Optional[Dict[str, str]] = None, partition_by: Optional[str] = None) -> Path:
+    """
+    以 Parquet/Feather 格式写出指标结果，返回实际写出的文件或目录
+
+    下游可以只读取需要的列，例如 pd.read_parquet(path, columns=['Date', 'Symbol', 'ALPHA158_ROC5'])。
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required for parquet/feather output")
+    if output_format not in ('parquet', 'feather'):
+        raise ValueError(f"Unsupported columnar format: {output_format}")
+    if partition_by not in (None, *PARTITION_CHOICES):
+        raise ValueError(f"Unsupported partition: {partition_by}")
+
+    output_path = resolve_output_path(path, output_format, partition_by)
+    frame = compact_dtypes(df.reset_index(drop=True))
+
+    partition_columns = []
+    if partition_by == 'symbol':
+        partition_columns = ['Symbol']
+    elif partition_by == 'year':
+        frame = frame.assign(year=pd.to_datetime(frame['Date']).dt.year.astype(np.int16))
+        partition_columns = ['year']
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[FIELD_LABELS_METADATA_KEY] = json.dumps(labels or {}, ensure_ascii=False).encode('utf-8')
+    table = table.replace_schema_metadata(metadata)
+
+    if partition_columns:
+        # 与覆盖单个文件一致：先清除上一次的分区目录，避免残留旧分区
+        if output_path.is_dir():
+            shutil.rmtree(output_path)
+        ds.write_dataset(
+            table,
+            str(output_path),
+            format=output_format,
+            partitioning=partition_columns,
+            partitioning_flavor='hive',
+        )
+    else:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_format == 'parquet':
+            pq.write_table(table, str(output_path))
+        else:
+            feather.write_feather(table, str(output_path))
+
+    return output_path
+
+
+def read_field_labels(path: Union[str, Path], output_format: str = 'parquet') -> Dict[str, str]:
+    """读取列式输出 schema 元数据中保存的中文标签"""
+    if pa is None:
+        raise ImportError("pyarrow is required for parquet/feather output")
+    dataset = ds.dataset(str(path), format=output_format, partitioning='hive')
+    raw = (dataset.schema.metadata or {}).get(FIELD_LABELS_METADATA_KEY, b'{}')
+    return json.loads(raw.decode('utf-8'))
+
+
+def read_columnar_results(path: Union[str, Path], output_format: str = 'parquet',
+                          columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """读取列式输出（单文件或分区目录），分区列（year）不包含在结果中"""
+    if pa is None:
+        raise ImportError("pyarrow is required for parquet/feather output")
+    dataset = ds.dataset(str(path), format=output_format, partitioning='hive')
+    frame = dataset.to_table(columns=columns).to_pandas()
+    if 'Symbol' in frame.columns and isinstance(frame['Symbol'].dtype, pd.CategoricalDtype):
+        frame['Symbol'] = frame['Symbol'].astype(str)
+    partition_names = dataset.partitioning.schema.names if dataset.partitioning is not None else []
+    if columns is None and 'year' in frame.columns and 'year' in partition_names:
+        frame = frame.drop(columns='year')
+    return frame
+
+
+def read_watermarks(path: Union[str, Path], output_format: str = 'csv',
+                    anchor_columns: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    读取上一次输出中每只股票最新的一行（水位线）
+
+    返回以 Symbol 为索引的 DataFrame，包含 Date 以及 anchor_columns 中存在的列，
+    只读取这些列，不加载其余指标数据。
+    """
+    path = Path(path)
+    if output_format == 'csv':
+        header = pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns
+        columns = ['Date', 'Symbol', *[c for c in anchor_columns if c in header]]
+        frame = pd.read_csv(path, usecols=columns, skiprows=[1], encoding='utf-8-sig', dtype={'Symbol': str})
+    else:
+        schema_names = ds.dataset(str(path), format=output_format, partitioning='hive').schema.names
+        columns = ['Date', 'Symbol', *[c for c in anchor_columns if c in schema_names]]
+        frame = read_columnar_results(path, output_format, columns=columns)
+    frame['Date'] = pd.to_datetime(frame['Date'])
+    latest = frame.sort_values('Date').groupby('Symbol').tail(1)
+    return latest.set_index('Symbol')[[c for c in columns if c != 'Symbol']]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+滚动窗口内核的可选后端
+
+指标计算通过 KernelBackend 调用滚动窗口内核（KERNEL_NAMES），实现由后端提供：
+- numpy: indicator_kernels 中的纯 NumPy 参考实现
+- numba: numba_kernels 中由 numba 编译的逐窗口循环
+- auto: 已安装 numba 时使用 numba，否则使用 numpy
+
+默认使用 numpy 参考实现，numba 需要显式指定（安装 numba 不会改变默认的输出）；
+指定 numba 但未安装（或无法导入）时回退到 numpy 并给出警告。
+各后端的结果在浮点舍入范围内一致（见 tests/test_kernel_backends.py）。
+"""
+
+from types import ModuleType
+
+from loguru import logger
+
+import indicator_kernels
+
+try:
+    import numba_kernels
+except ImportError:
+    numba_kernels = None
+
+KERNEL_BACKENDS = ('auto', 'numpy', 'numba')
+KERNEL_NAMES = (
+    'rolling_mean', 'rolling_std', 'rolling_quantile', 'rolling_rank', 'rolling_sum',
+    'rolling_mean_std', 'rolling_ols', 'rolling_extrema', 'rolling_corr',
+)
+
+
+class KernelBackend:
+    """一组滚动窗口内核；各内核的签名与语义见 indicator_kernels"""
+
+    def __init__(self, name: str, module: ModuleType):
+        missing = [kernel for kernel in KERNEL_NAMES if not hasattr(module, kernel)]
+        if missing:
+            raise ValueError(f"Kernel backend {name} is missing kernels: {missing}")
+        self.name = name
+        for kernel in KERNEL_NAMES:
+            setattr(self, kernel, getattr(module, kernel))
+
+    def __repr__(self) -> str:
+        return f"KernelBackend({self.name!r})"
+
+
+def available_backends() -> list:
+    """当前环境可用的后端（不含 auto）"""
+    return ['numpy'] + (['numba'] if numba_kernels is not None else [])
+
+
+def get_kernel_backend(name: str = 'numpy') -> KernelBackend:
+    """按名称返回后端并记录实际使用的后端；numba 不可用时回退到 numpy"""
+    if name not in KERNEL_BACKENDS:
+        raise ValueError(f"Unsupported kernel backend: {name}, expected one of {KERNEL_BACKENDS}")
+    if name in ('auto', 'numba') and numba_kernels is not None:
+        backend = KernelBackend('numba', numba_kernels)
+    else:
+        if name == 'numba':
+            logger.warning("⚠️ 未安装 numba，滚动窗口内核回退到 NumPy 实现")
+        backend = KernelBackend('numpy', indicator_kernels)
+    logger.info(f"滚动窗口内核: {backend.name} (指定: {name})")
+    return backend
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批处理的内存预算
+
+MemoryBudget 按内存上限决定每个批次包含多少只股票：
+- 每只股票的内存按 历史长度 × 指标计划的输出列数 估算
+- 每个批次运行时在后台采样进程（含工作进程）的 RSS，批次结束后用实测的峰值增长校准估算系数
+- 下一批次的大小 = (上限 × 安全系数 - 当前RSS) 能容纳的股票数，至少一只
+- 批次出现 MemoryError 时调大估算系数，后续批次随之变小
+
+RSS 优先通过 psutil 读取（包含进程池的工作进程），未安装时读取 /proc/self/statm（仅当前进程）。
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from loguru import logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 计算期间的中间结果按 float64 计；输出列收窄、各指标族的临时数组与拼接副本由校准系数吸收
+BYTES_PER_VALUE = 8
+# 未校准时的保守系数：各指标族的临时结果、单只股票的拼接副本、批次合并的副本
+INITIAL_SCALE = 4.0
+MIN_SCALE = 0.5
+DEFAULT_SAFETY = 0.8
+SAMPLE_INTERVAL_S = 0.05
+
+
+def current_rss_bytes(include_children: bool = True) -> Optional[int]:
+    """当前进程（及其工作进程）的常驻内存；无法读取时返回 None"""
+    if psutil is not None:
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        if include_children:
+            for child in process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    continue
+        return rss
+    try:
+        pages = int(Path('/proc/self/statm').read_text().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def history_length(features_dir: Union[str, Path], symbol: str) -> int:
+    """由 close.day.bin 的文件大小得到交易日数量（不读取文件内容）"""
+    path = Path(features_dir) / symbol.lower() / 'close.day.bin'
+    try:
+        return max(path.stat().st_size // 4 - 1, 0)
+    except OSError:
+        return 0
+
+
+class RSSMonitor:
+    """在后台线程中按固定间隔采样 RSS，记录 with 块内的峰值"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_S):
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self) -> 'RSSMonitor':
+        self.baseline = current_rss_bytes()
+        self.peak = self.baseline
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='rss-monitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+    @property
+    def growth(self) -> Optional[int]:
+        if self.baseline is None or self.peak is None:
+            return None
+        return max(self.peak - self.baseline, 0)
+
+
+class MemoryBudget:
+    """按内存上限规划批次大小，并用每个批次的实测内存校准估算"""
+
+    def __init__(self, limit_mb: float, n_columns: int, safety: float = DEFAULT_SAFETY,
+                 max_batch_size: Optional[int] = None):
+        if limit_mb <= 0:
+            raise ValueError(f"memory limit must be positive, got {limit_mb}")
+        self.limit_bytes = int(limit_mb * 1024 * 1024)
+        self.safety = safety
+        self.max_batch_size = max_batch_size
+        self.bytes_per_row = max(n_columns, 1) * BYTES_PER_VALUE
+        self.scale = INITIAL_SCALE
+        self.calibrated = False
+        self.penalized = False
+
+    def estimate(self, n_days: int) -> int:
+        """一只股票的估算内存（字节）"""
+        return int(n_days * self.bytes_per_row * self.scale)
+
+    def available(self) -> int:
+        """预算中还能用于下一批次的内存（字节）"""
+        rss = current_rss_bytes() or 0
+        return max(int(self.limit_bytes * self.safety) - rss, 0)
+
+    def take_batch(self, stocks: Sequence[str], lengths: Dict[str, int]) -> Tuple[List[str], List[str]]:
+        """从 stocks 开头取出预算能容纳的一批股票，返回 (本批次, 剩余股票)；至少取一只"""
+        available = self.available()
+        used = 0
+        size = 0
+        for symbol in stocks:
+            if self.max_batch_size and size >= self.max_batch_size:
+                break
+            cost = self.estimate(lengths.get(symbol, 0))
+            if size and used + cost > available:
+                break
+            used += cost
+            size += 1
+        size = max(size, 1)
+        if used > available:
+            logger.warning(f"⚠️ 单只股票 {stocks[0]} 的估算内存 {used / 1024 / 1024:.0f}MB 超出剩余预算 "
+                           f"{available / 1024 / 1024:.0f}MB，仍单独计算")
+        return list(stocks[:size]), list(stocks[size:])
+
+    def observe(self, n_rows: int, growth: Optional[int]):
+        """
+        用批次的实测峰值增长校准估算系数（调大立即生效，调小取与旧值的平均）
+
+        MemoryError 之后的第一次校准不调小系数，避免一个较小的子批次抵消加倍
+        """
+        if growth is None or n_rows <= 0:
+            return
+        measured = max(growth / (n_rows * self.bytes_per_row), MIN_SCALE)
+        previous = self.scale
+        if self.penalized:
+            self.scale = max(measured, self.scale)
+            self.penalized = False
+        elif not self.calibrated:
+            self.scale = measured
+        elif measured > self.scale:
+            self.scale = measured
+        else:
+            self.scale = (self.scale + measured) / 2
+        self.calibrated = True
+        logger.debug(f"内存估算系数: {previous:.2f} -> {self.scale:.2f} (实测 {measured:.2f})")
+
+    def penalize(self):
+        """批次出现 MemoryError 后，后续批次的估算加倍"""
+        self.scale *= 2
+        self.calibrated = True
+        self.penalized = True
+        logger.warning(f"⚠️ 内存不足，后续批次的估算系数调整为 {self.scale:.2f}")
+
+    def describe(self) -> str:
+        cap = f", 每批最多 {self.max_batch_size} 只" if self.max_batch_size else ''
+        return f"内存上限 {self.limit_bytes / 1024 / 1024:.0f}MB (安全系数 {self.safety:.0%}){cap}"
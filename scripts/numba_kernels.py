@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+滚动窗口内核的 numba 实现
+
+与 indicator_kernels 中的参考实现签名、语义相同（结果在浮点舍入范围内一致）：
+- 每个窗口直接循环计算（以窗口末值平移后两遍法求离差），数据按股票连续存放，内层循环顺序访问内存
+- 分位数维护窗口内的有序数组，每前进一行只删除移出的值、插入移入的值
+- 编译结果缓存在 __pycache__ 中，之后的进程（包括进程池的工作进程）不再重新编译
+
+需要安装 numba；未安装时 kernel_backends 回退到 NumPy 参考实现。
+"""
+
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+from numba import njit
+
+
+def _as_columns(x: np.ndarray) -> np.ndarray:
+    """(时间, 股票) -> 按股票连续存放的 (股票, 时间)"""
+    x = np.asarray(x, dtype=np.float64)
+    return np.ascontiguousarray(x.reshape(len(x), -1).T)
+
+
+def _restore_shape(values: np.ndarray, like: np.ndarray) -> np.ndarray:
+    return values.T.reshape(np.shape(like))
+
+
+@njit(cache=True)
+def _window_is_finite(x, start, end):
+    for t in range(start, end):
+        if not np.isfinite(x[t]):
+            return False
+    return True
+
+
+@njit(cache=True)
+def _partial_moments(x, window):
+    """min_periods=1、跳过缺失值（非有限值）的窗口：(有效数据个数, 均值, 离差平方和)；取值全部相同时离差为 0"""
+    m, n = x.shape
+    count = np.zeros((m, n))
+    mean = np.full((m, n), np.nan)
+    sxx = np.full((m, n), np.nan)
+    for j in range(m):
+        row = x[j]
+        for i in range(n):
+            start = max(i - window + 1, 0)
+            k = 0
+            total = 0.0
+            low = np.inf
+            high = -np.inf
+            for t in range(start, i + 1):
+                v = row[t]
+                if np.isfinite(v):
+                    k += 1
+                    total += v
+                    low = min(low, v)
+                    high = max(high, v)
+            count[j, i] = k
+            if k == 0:
+                continue
+            if low == high:
+                mean[j, i] = low
+                sxx[j, i] = 0.0
+                continue
+            mu = total / k
+            ss = 0.0
+            for t in range(start, i + 1):
+                v = row[t]
+                if np.isfinite(v):
+                    ss += (v - mu) * (v - mu)
+            mean[j, i] = mu
+            sxx[j, i] = ss
+    return count, mean, sxx
+
+
+@njit(cache=True)
+def _sorted_insert(ordered, size, value):
+    position = np.searchsorted(ordered[:size], value)
+    for t in range(size, position, -1):
+        ordered[t] = ordered[t - 1]
+    ordered[position] = value
+
+
+@njit(cache=True)
+def _sorted_remove(ordered, size, value):
+    position = np.searchsorted(ordered[:size], value)
+    for t in range(position, size - 1):
+        ordered[t] = ordered[t + 1]
+
+
+@njit(cache=True)
+def _partial_quantile(x, window, quantile):
+    m, n = x.shape
+    out = np.full((m, n), np.nan)
+    ordered = np.empty(window)
+    for j in range(m):
+        row = x[j]
+        size = 0
+        for i in range(n):
+            if i >= window and np.isfinite(row[i - window]):
+                _sorted_remove(ordered, size, row[i - window])
+                size -= 1
+            if np.isfinite(row[i]):
+                _sorted_insert(ordered, size, row[i])
+                size += 1
+            if size == 0:
+                continue
+            position = quantile * (size - 1)
+            lower = int(np.floor(max(position, 0.0)))
+            upper = min(lower + 1, size - 1)
+            fraction = position - lower
+            if fraction == 0:
+                out[j, i] = ordered[lower]
+            else:
+                out[j, i] = ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+    return out
+
+
+@njit(cache=True)
+def _partial_rank(x, window):
+    m, n = x.shape
+    out = np.full((m, n), np.nan)
+    for j in range(m):
+        row = x[j]
+        for i in range(n):
+            last = row[i]
+            if not np.isfinite(last):
+                continue
+            k = 0
+            less = 0
+            equal = 0
+            for t in range(max(i - window + 1, 0), i + 1):
+                v = row[t]
+                if np.isfinite(v):
+                    k += 1
+                    if v < last:
+                        less += 1
+                    elif v == last:
+                        equal += 1
+            out[j, i] = (less + (equal + 1) / 2) / k
+    return out
+
+
+@njit(cache=True)
+def _strict_sum(x, window):
+    m, n = x.shape
+    out = np.full((m, n), np.nan)
+    for j in range(m):
+        row = x[j]
+        for i in range(window - 1, n):
+            start = i - window + 1
+            if not _window_is_finite(row, start, i + 1):
+                continue
+            total = 0.0
+            for t in range(start, i + 1):
+                total += row[t]
+            out[j, i] = total
+    return out
+
+
+@njit(cache=True)
+def _strict_mean_std(x, window, ddof):
+    """完整窗口的均值与标准差，含非有限值的窗口为 NaN"""
+    m, n = x.shape
+    mean = np.full((m, n), np.nan)
+    std = np.full((m, n), np.nan)
+    for j in range(m):
+        row = x[j]
+        for i in range(window - 1, n):
+            start = i - window + 1
+            if not _window_is_finite(row, start, i + 1):
+                continue
+            shift = row[i]
+            total = 0.0
+            for t in range(start, i + 1):
+                total += row[t] - shift
+            mu = total / window
+            ss = 0.0
+            for t in range(start, i + 1):
+                deviation = row[t] - shift - mu
+                ss += deviation * deviation
+            mean[j, i] = shift + mu
+            std[j, i] = np.sqrt(max(ss, 0.0) / (window - ddof))
+    return mean, std
+
+
+@njit(cache=True)
+def _ols(y, window):
+    m, n = y.shape
+    slope = np.full((m, n), np.nan)
+    rsqr = np.full((m, n), np.nan)
+    resid = np.full((m, n), np.nan)
+    x_mean = (window - 1) / 2.0
+    sxx = window * (window * window - 1) / 12.0
+    for j in range(m):
+        row = y[j]
+        for i in range(window - 1, n):
+            start = i - window + 1
+            if not _window_is_finite(row, start, i + 1):
+                slope[j, i] = 0.0
+                rsqr[j, i] = 0.0
+                resid[j, i] = 0.0
+                continue
+            shift = row[i]
+            total = 0.0
+            for t in range(start, i + 1):
+                total += row[t] - shift
+            mu = total / window
+            sxy = 0.0
+            syy = 0.0
+            for t in range(start, i + 1):
+                deviation = row[t] - shift - mu
+                sxy += deviation * (t - start - x_mean)
+                syy += deviation * deviation
+            b = sxy / sxx
+            slope[j, i] = b
+            rsqr[j, i] = min(sxy * sxy / (sxx * syy), 1.0) if syy > 0 else 0.0
+            # 窗口末点平移后为 0
+            resid[j, i] = -mu - b * (window - 1 - x_mean)
+    return slope, rsqr, resid
+
+
+@njit(cache=True)
+def _extrema(x, window, find_max):
+    """跳过 NaN 的滚动极值（min_periods=1）及首个极值的位置（完整窗口；含 NaN 时为首个 NaN，与 np.argmax 一致）"""
+    m, n = x.shape
+    extreme = np.full((m, n), np.nan)
+    position = np.full((m, n), np.nan)
+    for j in range(m):
+        row = x[j]
+        for i in range(n):
+            start = i - window + 1
+            best = np.nan
+            located = -1
+            nan_at = -1
+            for t in range(max(start, 0), i + 1):
+                v = row[t]
+                if np.isnan(v):
+                    if nan_at < 0:
+                        nan_at = t
+                    continue
+                if np.isnan(best) or (v > best if find_max else v < best):
+                    best = v
+                    located = t
+            extreme[j, i] = best
+            if start >= 0:
+                position[j, i] = i - (nan_at if nan_at >= 0 else located)
+    return extreme, position
+
+
+@njit(cache=True)
+def _corr(x, y, window, min_std):
+    m, n = x.shape
+    out = np.full((m, n), np.nan)
+    threshold = window * min_std * min_std
+    for j in range(m):
+        row_x = x[j]
+        row_y = y[j]
+        for i in range(window - 1, n):
+            start = i - window + 1
+            if not (_window_is_finite(row_x, start, i + 1) and _window_is_finite(row_y, start, i + 1)):
+                out[j, i] = 0.0
+                continue
+            shift_x = row_x[i]
+            shift_y = row_y[i]
+            total_x = 0.0
+            total_y = 0.0
+            for t in range(start, i + 1):
+                total_x += row_x[t] - shift_x
+                total_y += row_y[t] - shift_y
+            mean_x = total_x / window
+            mean_y = total_y / window
+            sxx = 0.0
+            syy = 0.0
+            sxy = 0.0
+            for t in range(start, i + 1):
+                dx = row_x[t] - shift_x - mean_x
+                dy = row_y[t] - shift_y - mean_y
+                sxx += dx * dx
+                syy += dy * dy
+                sxy += dx * dy
+            if sxx > threshold and syy > threshold:
+                out[j, i] = min(max(sxy / np.sqrt(sxx * syy), -1.0), 1.0)
+            else:
+                out[j, i] = 0.0
+    return out
+
+
+def _missing(columns: np.ndarray) -> np.ndarray:
+    return np.full(columns.shape, np.nan)
+
+
+def rolling_mean(x: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    columns = _as_columns(x)
+    return {d: _restore_shape(_partial_moments(columns, d)[1], x) for d in windows}
+
+
+def rolling_std(x: np.ndarray, windows: Iterable[int], ddof: int = 1) -> Dict[int, np.ndarray]:
+    columns = _as_columns(x)
+    results = {}
+    for d in windows:
+        count, _, sxx = _partial_moments(columns, d)
+        with np.errstate(all='ignore'):
+            std = np.where(count > ddof, np.sqrt(np.maximum(sxx, 0.0) / (count - ddof)), np.nan)
+        results[d] = _restore_shape(std, x)
+    return results
+
+
+def rolling_quantile(x: np.ndarray, windows: Iterable[int], quantile: float) -> Dict[int, np.ndarray]:
+    columns = _as_columns(x)
+    return {d: _restore_shape(_partial_quantile(columns, d, float(quantile)), x) for d in windows}
+
+
+def rolling_rank(x: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    columns = _as_columns(x)
+    return {d: _restore_shape(_partial_rank(columns, d), x) for d in windows}
+
+
+def rolling_sum(x: np.ndarray, windows: Iterable[int]) -> Dict[int, np.ndarray]:
+    columns = _as_columns(x)
+    n = columns.shape[1]
+    return {
+        d: _restore_shape(_strict_sum(columns, d) if 1 <= d <= n else _missing(columns), x)
+        for d in windows
+    }
+
+
+def rolling_mean_std(x: np.ndarray, windows: Iterable[int], ddof: int = 0) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    columns = _as_columns(x)
+    n = columns.shape[1]
+    results = {}
+    for d in windows:
+        if 1 <= d <= n and d > ddof:
+            mean, std = _strict_mean_std(columns, d, ddof)
+        else:
+            mean, std = _missing(columns), _missing(columns)
+        results[d] = (_restore_shape(mean, x), _restore_shape(std, x))
+    return results
+
+
+def rolling_ols(y: np.ndarray, windows: Iterable[int]) -> Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    columns = _as_columns(y)
+    n = columns.shape[1]
+    results = {}
+    for d in windows:
+        values = _ols(columns, d) if 2 <= d <= n else tuple(_missing(columns) for _ in range(3))
+        results[d] = tuple(_restore_shape(v, y) for v in values)
+    return results
+
+
+def rolling_extrema(x: np.ndarray, windows: Iterable[int], kind: str = 'max') -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    if kind not in ('max', 'min'):
+        raise ValueError(f"kind must be 'max' or 'min', got {kind!r}")
+    columns = _as_columns(x)
+    results = {}
+    for d in windows:
+        extreme, position = _extrema(columns, d, kind == 'max')
+        results[d] = (_restore_shape(extreme, x), _restore_shape(position, x))
+    return results
+
+
+def rolling_corr(x: np.ndarray, y: np.ndarray, windows: Iterable[int], min_std: float = 1e-8) -> Dict[int, np.ndarray]:
+    columns_x = _as_columns(x)
+    columns_y = _as_columns(y)
+    n = columns_x.shape[1]
+    return {
+        d: _restore_shape(_corr(columns_x, columns_y, d, float(min_std)) if 2 <= d <= n else _missing(columns_x), x)
+        for d in windows
+    }
@@ -2,25 +2,166 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import pandas as pd
 import numpy as np
 import talib
-import struct
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 from loguru import logger
 import warnings
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import threading
 import time
-from functools import partial
+import hashlib
+import json
+from functools import cached_property, partial
 import multiprocessing
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 添加当前目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dtype_policy import FLOAT_DTYPES, DtypePolicy, densify
+from financial_store import FinancialDataStore
+from indicator_cache import IndicatorCache
+from indicator_planner import FAMILIES, IndicatorPlan
+from indicator_profiler import REPORT_FORMATS, IndicatorProfiler, sample_symbols
+from indicator_writers import (
+    OUTPUT_FORMATS, PARTITION_CHOICES, StreamingCSVWriter, read_columnar_results, read_watermarks,
+    resolve_output_path, write_columnar_results
+)
+from kernel_backends import KERNEL_BACKENDS, get_kernel_backend
+from memory_budget import history_length
+from result_assembler import ResultAssembler, drop_duplicate_keys
+from run_manifest import MANIFEST_SUFFIX, RunCheckpoint
+from sharding import (
+    SHARD_STRATEGIES, merge_shards_main, shard_output_path, shard_stocks, validate_shard, write_shard_sidecar
+)
 
 warnings.filterwarnings('ignore', category=RuntimeWarning)
 warnings.filterwarnings('ignore', category=FutureWarning)
 
 
+class PreparedBars:
+    """
+    单只股票清洗后的行情数据，在各指标族之间共享
+    每只股票只做一次 inf→NaN、前向填充（成交量填0）和类型转换，并按需缓存派生序列
+    """
+    
+    # matrix32 的列顺序（Alpha360 的特征顺序）
+    MATRIX_COLUMNS = ('close', 'open', 'high', 'low', 'vwap', 'volume')
+    
+    def __init__(self, data: pd.DataFrame):
+        self.frame = data
+        self.index = data.index
+        self.open = self._clean(data['Open'])
+        self.high = self._clean(data['High'])
+        self.low = self._clean(data['Low'])
+        self.close = self._clean(data['Close'])
+        self.volume = self._clean(data['Volume'], fill_value=0)
+    
+    @classmethod
+    def from_data(cls, data) -> 'PreparedBars':
+        """已经准备好的数据直接返回，否则由原始DataFrame构建"""
+        return data if isinstance(data, cls) else cls(data)
+    
+    @staticmethod
+    def _clean(series: pd.Series, fill_value: Optional[float] = None) -> np.ndarray:
+        values = series.astype(float).replace([np.inf, -np.inf], np.nan)
+        values = values.ffill() if fill_value is None else values.fillna(fill_value)
+        return np.ascontiguousarray(values.to_numpy(dtype=np.float64))
+    
+    def __len__(self) -> int:
+        return len(self.close)
+    
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+    
+    @cached_property
+    def vwap(self) -> np.ndarray:
+        """日内VWAP（日线数据下即收盘价，成交量为0时取0）"""
+        with np.errstate(all='ignore'):
+            return np.where(np.abs(self.volume) > 1e-12, self.close * self.volume / self.volume, 0.0)
+    
+    @cached_property
+    def close_ratio(self) -> np.ndarray:
+        """close[t] / close[t-1]，首行为NaN"""
+        ratio = np.full_like(self.close, np.nan)
+        with np.errstate(all='ignore'):
+            ratio[1:] = self.close[1:] / self.close[:-1]
+        return ratio
+    
+    @cached_property
+    def log_volume(self) -> np.ndarray:
+        """log(volume + 1)"""
+        return np.log(self.volume + 1)
+    
+    @cached_property
+    def matrix32(self) -> np.ndarray:
+        """按 MATRIX_COLUMNS 在最后一维堆叠的 float32 连续矩阵 (n_days × 6)"""
+        return np.stack([getattr(self, name) for name in self.MATRIX_COLUMNS], axis=-1).astype(np.float32)
+    
+    @cached_property
+    def age(self) -> np.ndarray:
+        """每一行距离序列起点的行数（逐行循环类指标的预热判断）"""
+        return np.arange(len(self))
+    
+    def roll(self, values: np.ndarray, shift: int) -> np.ndarray:
+        """沿时间轴循环平移 shift 行（np.roll 语义）"""
+        return np.roll(values, shift)
+
+
+class PanelBars(PreparedBars):
+    """
+    (日期 × 股票) 面板上的清洗后行情，接口与 PreparedBars 相同，数组均为二维
+    
+    每只股票只在自己的上市区间 [start, end) 内前向填充（成交量填0），区间外保持NaN，
+    age/roll 也按各自的区间计算，使面板上的结果与逐只股票计算一致
+    """
+    
+    def __init__(self, index: pd.DatetimeIndex, fields: Dict[str, np.ndarray], start: np.ndarray, end: np.ndarray):
+        self.frame = None
+        self.index = index
+        self.start = np.asarray(start)
+        self.end = np.asarray(end)
+        rows = np.arange(len(index))[:, None]
+        self.listed = (rows >= self.start) & (rows < self.end)
+        self.open = self._clean_panel(fields['Open'])
+        self.high = self._clean_panel(fields['High'])
+        self.low = self._clean_panel(fields['Low'])
+        self.close = self._clean_panel(fields['Close'])
+        self.volume = self._clean_panel(fields['Volume'], fill_value=0)
+    
+    def _clean_panel(self, values: np.ndarray, fill_value: Optional[float] = None) -> np.ndarray:
+        values = np.where(np.isinf(values), np.nan, values.astype(np.float64))
+        if fill_value is None:
+            values = pd.DataFrame(values).ffill().to_numpy()
+        else:
+            values = np.where(np.isnan(values), fill_value, values)
+        return np.where(self.listed, values, np.nan)
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    @cached_property
+    def vwap(self) -> np.ndarray:
+        """上市区间外为NaN（而不是成交量为0时的0）"""
+        return np.where(self.listed, PreparedBars.vwap.func(self), np.nan)
+    
+    @cached_property
+    def age(self) -> np.ndarray:
+        return np.arange(len(self))[:, None] - self.start[None, :]
+    
+    def roll(self, values: np.ndarray, shift: int) -> np.ndarray:
+        """每只股票在自己的上市区间内循环平移（与逐只股票的 np.roll 一致）"""
+        length = np.maximum(self.end - self.start, 1)
+        source = self.start + (self.age - shift) % length
+        return np.take_along_axis(values, source, axis=0)
+
+
 class QlibIndicatorsEnhancedCalculator:
     """
     增强版Qlib指标计算器
@@ -393,6 +534,15 @@ class QlibIndicatorsEnhancedCalculator:
         'SemiDeviation_60': '60日半变差',
     }
     
+    # Alpha360: 每个特征回看的期数及特征顺序
+    ALPHA360_LAGS = 60
+    ALPHA360_FEATURES = ['CLOSE', 'OPEN', 'HIGH', 'LOW', 'VWAP', 'VOLUME']
+    
+    @classmethod
+    def _alpha360_columns(cls) -> List[str]:
+        """Alpha360列名，按特征分组、每组滞后期从大到小"""
+        return [f'ALPHA360_{feature}{lag}' for feature in cls.ALPHA360_FEATURES for lag in range(cls.ALPHA360_LAGS - 1, -1, -1)]
+    
     # 为Alpha360指标生成标签
     @classmethod
     def _generate_alpha360_labels(cls):
@@ -435,15 +585,237 @@ class QlibIndicatorsEnhancedCalculator:
         
         return labels
     
+    # Alpha158: 滚动窗口、KBAR/价格类列与滚动算子（列名为 ALPHA158_{算子}{窗口}）
+    ALPHA158_WINDOWS = [5, 10, 20, 30, 60]
+    ALPHA158_KBAR = ['KMID', 'KLEN', 'KMID2', 'KUP', 'KUP2', 'KLOW', 'KLOW2', 'KSFT', 'KSFT2']
+    ALPHA158_PRICE = ['OPEN', 'HIGH', 'LOW', 'VWAP']
+    ALPHA158_ROLLING = [
+        'ROC', 'MA', 'STD', 'BETA', 'RSQR', 'MAX', 'MIN', 'QTLU', 'QTLD', 'RANK', 'RSV', 'RESI',
+        'IMAX', 'IMIN', 'IMXD', 'CORR', 'CORD', 'CNTP', 'CNTN', 'CNTD', 'SUMP', 'SUMN', 'SUMD',
+        'VMA', 'VSTD', 'WVMA', 'VSUMP', 'VSUMN', 'VSUMD'
+    ]
+    # 滚动算子依赖的共享中间结果（只在有算子需要时计算）
+    ALPHA158_DEPENDENCIES = {
+        'BETA': ('ols',), 'RSQR': ('ols',), 'RESI': ('ols',),
+        'MAX': ('high_extrema',), 'IMAX': ('high_extrema',),
+        'MIN': ('low_extrema',), 'IMIN': ('low_extrema',),
+        'RSV': ('high_extrema', 'low_extrema'), 'IMXD': ('high_extrema', 'low_extrema'),
+        'CNTP': ('change_counts',), 'CNTN': ('change_counts',), 'CNTD': ('change_counts',),
+        'SUMP': ('price_sums',), 'SUMN': ('price_sums',), 'SUMD': ('price_sums',),
+        'VSUMP': ('volume_sums',), 'VSUMN': ('volume_sums',), 'VSUMD': ('volume_sums',),
+    }
+    
+    @classmethod
+    def _alpha158_groups(cls) -> Dict[str, List[str]]:
+        """Alpha158计算分组 -> 输出列"""
+        groups = {
+            'KBAR': [f'ALPHA158_{name}' for name in cls.ALPHA158_KBAR],
+            'PRICE': [f'ALPHA158_{feature}0' for feature in cls.ALPHA158_PRICE],
+            'VOLUME': ['ALPHA158_VOLUME0'],
+        }
+        for operator in cls.ALPHA158_ROLLING:
+            groups[operator] = [f'ALPHA158_{operator}{d}' for d in cls.ALPHA158_WINDOWS]
+        return groups
+    
+    # 技术指标表：(输出列, talib函数, 输入序列, 参数)，输出列为 None 表示丢弃该输出
+    TECHNICAL_INDICATORS = [
+        # 1. Moving Averages (移动平均线类) - 12个
+        (('SMA_5',), 'SMA', ('close',), {'timeperiod': 5}),
+        (('SMA_10',), 'SMA', ('close',), {'timeperiod': 10}),
+        (('SMA_20',), 'SMA', ('close',), {'timeperiod': 20}),
+        (('SMA_50',), 'SMA', ('close',), {'timeperiod': 50}),
+        (('EMA_5',), 'EMA', ('close',), {'timeperiod': 5}),
+        (('EMA_10',), 'EMA', ('close',), {'timeperiod': 10}),
+        (('EMA_20',), 'EMA', ('close',), {'timeperiod': 20}),
+        (('EMA_50',), 'EMA', ('close',), {'timeperiod': 50}),
+        (('DEMA_20',), 'DEMA', ('close',), {'timeperiod': 20}),
+        (('TEMA_20',), 'TEMA', ('close',), {'timeperiod': 20}),
+        (('KAMA_30',), 'KAMA', ('close',), {'timeperiod': 30}),
+        (('WMA_20',), 'WMA', ('close',), {'timeperiod': 20}),
+        # 2. MACD Family - 3个
+        (('MACD', 'MACD_Signal', 'MACD_Histogram'), 'MACD', ('close',), {'fastperiod': 12, 'slowperiod': 26, 'signalperiod': 9}),
+        (('MACDEXT', None, None), 'MACDEXT', ('close',), {'fastperiod': 12, 'slowperiod': 26, 'signalperiod': 9}),
+        (('MACDFIX', None, None), 'MACDFIX', ('close',), {'signalperiod': 9}),
+        # 3. Momentum Oscillators (动量振荡器) - 6个
+        (('RSI_14',), 'RSI', ('close',), {'timeperiod': 14}),
+        (('CCI_14',), 'CCI', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('CMO_14',), 'CMO', ('close',), {'timeperiod': 14}),
+        (('MFI_14',), 'MFI', ('high', 'low', 'close', 'volume'), {'timeperiod': 14}),
+        (('WILLR_14',), 'WILLR', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('ULTOSC',), 'ULTOSC', ('high', 'low', 'close'), {'timeperiod1': 7, 'timeperiod2': 14, 'timeperiod3': 28}),
+        # 4. Trend Indicators (趋势指标) - 13个
+        (('ADX_14',), 'ADX', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('ADXR_14',), 'ADXR', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('APO',), 'APO', ('close',), {'fastperiod': 12, 'slowperiod': 26}),
+        (('AROON_DOWN', 'AROON_UP'), 'AROON', ('high', 'low'), {'timeperiod': 14}),
+        (('AROONOSC_14',), 'AROONOSC', ('high', 'low'), {'timeperiod': 14}),
+        (('BOP',), 'BOP', ('open', 'high', 'low', 'close'), {}),
+        (('DX_14',), 'DX', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('MINUS_DI_14',), 'MINUS_DI', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('MINUS_DM_14',), 'MINUS_DM', ('high', 'low'), {'timeperiod': 14}),
+        (('PLUS_DI_14',), 'PLUS_DI', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('PLUS_DM_14',), 'PLUS_DM', ('high', 'low'), {'timeperiod': 14}),
+        (('PPO',), 'PPO', ('close',), {'fastperiod': 12, 'slowperiod': 26}),
+        (('TRIX_30',), 'TRIX', ('close',), {'timeperiod': 30}),
+        # 5. Momentum Indicators (动量指标) - 5个
+        (('MOM_10',), 'MOM', ('close',), {'timeperiod': 10}),
+        (('ROC_10',), 'ROC', ('close',), {'timeperiod': 10}),
+        (('ROCP_10',), 'ROCP', ('close',), {'timeperiod': 10}),
+        (('ROCR_10',), 'ROCR', ('close',), {'timeperiod': 10}),
+        (('ROCR100_10',), 'ROCR100', ('close',), {'timeperiod': 10}),
+        # 6. Bollinger Bands - 3个
+        (('BB_Upper', 'BB_Middle', 'BB_Lower'), 'BBANDS', ('close',), {'timeperiod': 20, 'nbdevup': 2, 'nbdevdn': 2}),
+        # 7. Stochastic (随机指标) - 6个
+        (('STOCH_K', 'STOCH_D'), 'STOCH', ('high', 'low', 'close'), {'fastk_period': 14, 'slowk_period': 3, 'slowd_period': 3}),
+        (('STOCHF_K', 'STOCHF_D'), 'STOCHF', ('high', 'low', 'close'), {'fastk_period': 14, 'fastd_period': 3}),
+        (('STOCHRSI_K', 'STOCHRSI_D'), 'STOCHRSI', ('close',), {'timeperiod': 14, 'fastk_period': 5, 'fastd_period': 3}),
+        # 8. Volatility Indicators (波动率指标) - 3个
+        (('ATR_14',), 'ATR', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('NATR_14',), 'NATR', ('high', 'low', 'close'), {'timeperiod': 14}),
+        (('TRANGE',), 'TRANGE', ('high', 'low', 'close'), {}),
+        # 9. Volume Indicators (成交量指标) - 3个
+        (('OBV',), 'OBV', ('close', 'volume'), {}),
+        (('AD',), 'AD', ('high', 'low', 'close', 'volume'), {}),
+        (('ADOSC',), 'ADOSC', ('high', 'low', 'close', 'volume'), {'fastperiod': 3, 'slowperiod': 10}),
+        # 10. Hilbert Transform (希尔伯特变换) - 7个
+        (('HT_DCPERIOD',), 'HT_DCPERIOD', ('close',), {}),
+        (('HT_DCPHASE',), 'HT_DCPHASE', ('close',), {}),
+        (('HT_INPHASE', 'HT_QUADRATURE'), 'HT_PHASOR', ('close',), {}),
+        (('HT_SINE', 'HT_LEADSINE'), 'HT_SINE', ('close',), {}),
+        (('HT_TRENDMODE',), 'HT_TRENDMODE', ('close',), {}),
+        (('HT_TRENDLINE',), 'HT_TRENDLINE', ('close',), {}),
+        # 11. Math Transform (数学变换) - 8个
+        (('AVGPRICE',), 'AVGPRICE', ('open', 'high', 'low', 'close'), {}),
+        (('MEDPRICE',), 'MEDPRICE', ('high', 'low'), {}),
+        (('TYPPRICE',), 'TYPPRICE', ('high', 'low', 'close'), {}),
+        (('WCLPRICE',), 'WCLPRICE', ('high', 'low', 'close'), {}),
+        (('MIDPOINT',), 'MIDPOINT', ('close',), {'timeperiod': 14}),
+        (('MIDPRICE',), 'MIDPRICE', ('high', 'low'), {'timeperiod': 14}),
+        (('MAMA', 'FAMA'), 'MAMA', ('close',), {}),
+        # 12. Statistical Functions (统计函数) - 7个
+        (('LINEARREG',), 'LINEARREG', ('close',), {'timeperiod': 14}),
+        (('LINEARREG_ANGLE',), 'LINEARREG_ANGLE', ('close',), {'timeperiod': 14}),
+        (('LINEARREG_INTERCEPT',), 'LINEARREG_INTERCEPT', ('close',), {'timeperiod': 14}),
+        (('LINEARREG_SLOPE',), 'LINEARREG_SLOPE', ('close',), {'timeperiod': 14}),
+        (('STDDEV',), 'STDDEV', ('close',), {'timeperiod': 30}),
+        (('TSF',), 'TSF', ('close',), {'timeperiod': 14}),
+        (('VAR',), 'VAR', ('close',), {'timeperiod': 30}),
+        # 13. Min/Max Functions - 2个
+        (('MAXINDEX',), 'MAXINDEX', ('close',), {'timeperiod': 30}),
+        (('MININDEX',), 'MININDEX', ('close',), {'timeperiod': 30}),
+    ]
+    
+    # 所有61个蜡烛图形态
+    CANDLESTICK_PATTERNS = [
+        'CDL2CROWS', 'CDL3BLACKCROWS', 'CDL3INSIDE', 'CDL3LINESTRIKE', 'CDL3OUTSIDE',
+        'CDL3STARSINSOUTH', 'CDL3WHITESOLDIERS', 'CDLABANDONEDBABY', 'CDLADVANCEBLOCK',
+        'CDLBELTHOLD', 'CDLBREAKAWAY', 'CDLCLOSINGMARUBOZU', 'CDLCONCEALBABYSWALL',
+        'CDLCOUNTERATTACK', 'CDLDARKCLOUDCOVER', 'CDLDOJI', 'CDLDOJISTAR', 'CDLDRAGONFLYDOJI',
+        'CDLENGULFING', 'CDLEVENINGDOJISTAR', 'CDLEVENINGSTAR', 'CDLGAPSIDESIDEWHITE',
+        'CDLGRAVESTONEDOJI', 'CDLHAMMER', 'CDLHANGINGMAN', 'CDLHARAMI', 'CDLHARAMICROSS',
+        'CDLHIGHWAVE', 'CDLHIKKAKE', 'CDLHIKKAKEMOD', 'CDLHOMINGPIGEON', 'CDLIDENTICAL3CROWS',
+        'CDLINNECK', 'CDLINVERTEDHAMMER', 'CDLKICKING', 'CDLKICKINGBYLENGTH', 'CDLLADDERBOTTOM',
+        'CDLLONGLEGGEDDOJI', 'CDLLONGLINE', 'CDLMARUBOZU', 'CDLMATCHINGLOW', 'CDLMATHOLD',
+        'CDLMORNINGDOJISTAR', 'CDLMORNINGSTAR', 'CDLONNECK', 'CDLPIERCING', 'CDLRICKSHAWMAN',
+        'CDLRISEFALL3METHODS', 'CDLSEPARATINGLINES', 'CDLSHOOTINGSTAR', 'CDLSHORTLINE',
+        'CDLSPINNINGTOP', 'CDLSTALLEDPATTERN', 'CDLSTICKSANDWICH', 'CDLTAKURI', 'CDLTASUKIGAP',
+        'CDLTHRUSTING', 'CDLTRISTAR', 'CDLUNIQUE3RIVER', 'CDLUPSIDEGAP2CROWS', 'CDLXSIDEGAP3METHODS'
+    ]
+    
+    FINANCIAL_COLUMNS = [
+        'PriceToBookRatio', 'MarketCap', 'PERatio', 'PriceToSalesRatio',
+        'ROE', 'ROA', 'ProfitMargins', 'CurrentRatio', 'QuickRatio', 
+        'DebtToEquity', 'TobinsQ', 'DailyTurnover', 
+        'turnover_c1d', 'turnover_c5d', 'turnover_c10d', 'turnover_c20d', 'turnover_c30d',
+        'turnover_m5d', 'turnover_m10d', 'turnover_m20d', 'turnover_m30d'
+    ]
+    
+    VOLATILITY_COLUMNS = [
+        'RealizedVolatility_20', 'NegativeSemiDeviation_20', 'ContinuousVolatility_20',
+        'PositiveSemiDeviation_20', 'Volatility_10', 'Volatility_30', 'Volatility_60'
+    ]
+    
+    # 指标计算结果之外始终保留的基础列
+    BASE_COLUMNS = ('Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume')
+    
+    @classmethod
+    def indicator_catalog(cls) -> Dict[str, List[str]]:
+        """指标族 -> 该族全部输出列（--indicators 的匹配范围）"""
+        return {
+            'alpha158': [column for columns in cls._alpha158_groups().values() for column in columns],
+            'alpha360': cls._alpha360_columns(),
+            'technical': [name for outputs, _, _, _ in cls.TECHNICAL_INDICATORS for name in outputs if name],
+            'candlestick': list(cls.CANDLESTICK_PATTERNS),
+            'financial': list(cls.FINANCIAL_COLUMNS),
+            'volatility': list(cls.VOLATILITY_COLUMNS),
+        }
+    
+    def output_columns(self) -> List[str]:
+        """指标计划输出的全部列：基础列 + 各指标族选中的列（按指标族顺序）"""
+        catalog = self.indicator_catalog()
+        return list(self.BASE_COLUMNS) + [
+            column for family in FAMILIES for column in self.plan.select(family, catalog[family])
+        ]
+    
+    EXECUTORS = ('thread', 'process')
+    # stock: 逐只股票计算；panel: Alpha158/Alpha360 在 (日期 × 股票) 面板上一次性计算
+    ENGINES = ('stock', 'panel')
+    
+    # 增量更新的预热窗口：最长回看窗口 (Alpha158/Alpha360/波动率为60日)
+    # 加上talib中EMA类递推指标 (EMA_50/TRIX_30/KAMA/ADX等) 收敛所需的稳定期
+    MAX_LOOKBACK_DAYS = 60
+    TALIB_STABILIZATION_DAYS = 250
+    INCREMENTAL_WARMUP_DAYS = MAX_LOOKBACK_DAYS + TALIB_STABILIZATION_DAYS
+    # 依赖全部历史的累积/位置类指标：增量计算时与上一次输出在水位线处的取值对齐
+    ANCHORED_COLUMNS = ('OBV', 'AD', 'MAXINDEX', 'MININDEX')
+    
     def __init__(self, data_dir: str = r"D:\stk_data\trd\us_data", financial_data_dir: str = None, 
-                 max_workers: int = None, enable_parallel: bool = True):
+                 max_workers: int = None, enable_parallel: bool = True, executor: str = 'thread',
+                 warmup_days: int = None, cache_dir: str = None, cache_max_size_mb: float = 2048,
+                 indicators: Union[str, List[str], None] = None, engine: str = 'stock',
+                 panel_chunk_size: int = 128, financial_cache_size: int = 256,
+                 price_dtype: str = 'float32', ratio_dtype: str = 'float32', sparse_patterns: bool = False,
+                 timing_report: Optional[str] = None, profile_sample: int = 0,
+                 checkpoint: bool = False, resume: bool = False,
+                 num_shards: int = 1, shard_index: int = 0, shard_strategy: str = 'balanced',
+                 kernel_backend: str = 'numpy'):
         self.data_dir = Path(data_dir)
         self.features_dir = self.data_dir / "features"
         self.output_dir = self.data_dir
         
-        # 多线程配置
+        if executor not in self.EXECUTORS:
+            raise ValueError(f"Unsupported executor: {executor}, expected one of {self.EXECUTORS}")
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unsupported engine: {engine}, expected one of {self.ENGINES}")
+        if engine == 'panel' and executor == 'process' and enable_parallel:
+            # 面板上算好的 Alpha158/Alpha360 留在主进程中，其余指标族逐只股票在线程池中计算
+            logger.warning("⚠️ 面板引擎的逐只股票指标族在线程池中计算，--executor process 只在增量模式下生效")
+        if timing_report is not None and timing_report not in REPORT_FORMATS:
+            raise ValueError(f"Unsupported timing report format: {timing_report}, expected one of {REPORT_FORMATS}")
+        validate_shard(num_shards, shard_index, shard_strategy)
+        if kernel_backend not in KERNEL_BACKENDS:
+            raise ValueError(f"Unsupported kernel backend: {kernel_backend}, expected one of {KERNEL_BACKENDS}")
+        self.engine = engine
+        self.panel_chunk_size = panel_chunk_size
+        
+        # 指标计划：只计算 --indicators 选中的列及其依赖（默认全部）
+        self.indicators = indicators
+        self.plan = IndicatorPlan.from_patterns(indicators, self.indicator_catalog())
+        
+        # 输出列类型策略：形态/标志列为整数，比率类指标按配置为 float32/float64
+        self.dtype_policy = DtypePolicy(price_dtype, ratio_dtype, sparse_patterns)
+        
+        # 滚动窗口内核的实现（numpy 参考实现 / numba 编译实现，未安装 numba 时回退到 numpy）
+        self.kernels = get_kernel_backend(kernel_backend)
+        
+        # 多线程/多进程配置（进程池默认与CPU核心数相同）
         self.enable_parallel = enable_parallel
-        self.max_workers = max_workers or min(32, (multiprocessing.cpu_count() or 1) + 4)
+        self.executor = executor
+        self.warmup_days = self.INCREMENTAL_WARMUP_DAYS if warmup_days is None else warmup_days
+        if executor == 'process':
+            self.max_workers = max_workers or (multiprocessing.cpu_count() or 1)
+        else:
+            self.max_workers = max_workers or min(32, (multiprocessing.cpu_count() or 1) + 4)
         
         # 财务数据目录
         if financial_data_dir:
@@ -454,7 +826,11 @@ class QlibIndicatorsEnhancedCalculator:
         
         logger.info(f"数据目录: {self.data_dir}")
         logger.info(f"财务数据目录: {self.financial_data_dir}")
-        logger.info(f"多线程配置: {'启用' if self.enable_parallel else '禁用'} (最大线程数: {self.max_workers})")
+        logger.info(f"多线程配置: {'启用' if self.enable_parallel else '禁用'} (执行器: {self.executor}, 最大并发数: {self.max_workers})")
+        logger.info(f"指标计划: {self.plan.describe()}")
+        logger.info(f"输出类型: {self.dtype_policy.describe()}")
+        if self.engine == 'panel':
+            logger.info(f"计算引擎: 面板 (每组 {self.panel_chunk_size} 只股票)")
         
         if not self.data_dir.exists():
             logger.error(f"Data directory does not exist: {self.data_dir}")
@@ -463,116 +839,162 @@ class QlibIndicatorsEnhancedCalculator:
         if not self.features_dir.exists():
             logger.warning(f"Features directory does not exist: {self.features_dir}")
         
-        # 初始化财务数据缓存
-        self.financial_cache = {}
-        self._load_financial_data()
+        # 财务数据：启动时只建立股票索引，首次访问时才读取（LRU缓存）
+        self.financial_store = FinancialDataStore(self.financial_data_dir, financial_cache_size)
+        
+        # 单只股票指标结果的磁盘缓存（可选）
+        self.cache = IndicatorCache(cache_dir, cache_max_size_mb) if cache_dir else None
+        if self.cache is not None:
+            logger.info(f"指标缓存目录: {self.cache.cache_dir} (上限: {cache_max_size_mb}MB)")
+        
+        # 分阶段计时（--timing-report）与抽样股票的 cProfile 剖析（--profile）
+        self.timing_report = timing_report
+        self.profile_sample = profile_sample
+        self.profiler = IndicatorProfiler(
+            enabled=timing_report is not None,
+            profile_dir=self.output_dir / "profiles" if profile_sample else None
+        )
+        
+        # 逐只股票的检查点（--checkpoint），--resume 时跳过已完成的股票；在 run 中按输出文件名创建
+        self.checkpoint_enabled = checkpoint or resume
+        self.resume = resume
+        self.checkpoint = None
+        
+        # 多台机器分片计算（--num-shards/--shard-index）：只计算本分片的股票，输出文件名带分片标记
+        self.num_shards = num_shards
+        self.shard_index = shard_index
+        self.shard_strategy = shard_strategy
+        self.shard_universe: List[str] = []
+        self.shard_stocks: List[str] = []
+        if self.num_shards > 1:
+            logger.info(f"分片: {self.shard_index + 1}/{self.num_shards} (划分方式: {self.shard_strategy})")
         
         # 线程本地存储，确保线程安全
         self._local = threading.local()
         
         # 线程锁，保护共享资源
         self._lock = threading.Lock()
+        
+        # 交易日历缓存（首次读取时加载）
+        self._calendar = None
     
-    def _load_financial_data(self):
-        """加载财务数据到内存缓存"""
-        try:
-            if self.financial_data_dir is None:
-                logger.warning("未指定财务数据目录，将使用估算值")
-                return
-                
-            logger.info(f"正在加载财务数据从: {self.financial_data_dir}")
-            
-            # 加载各种财务数据
-            data_types = ['info', 'financials', 'balance_sheet', 'cashflow', 'dividends', 'financial_ratios']
-            
-            for data_type in data_types:
-                data_path = self.financial_data_dir / data_type
-                if data_path.exists():
-                    self.financial_cache[data_type] = {}
-                    
-                    # 读取CSV文件
-                    csv_files = list(data_path.glob("*.csv"))
-                    if csv_files:
-                        for csv_file in csv_files:
-                            symbol = csv_file.stem.upper()
-                            try:
-                                df = pd.read_csv(csv_file, index_col=0)
-                                self.financial_cache[data_type][symbol] = df
-                            except Exception as e:
-                                logger.warning(f"Failed to load {data_type} for {symbol}: {e}")
-                        
-                        logger.info(f"✅ 加载 {data_type} 数据: {len(self.financial_cache[data_type])} 只股票")
+    @cached_property
+    def _indicator_config_hash(self) -> str:
+        """指标配置哈希：指标计算源码与影响结果的参数，任一变化都会使缓存失效"""
+        digest = hashlib.sha256()
+        scripts_dir = Path(__file__).parent
+        for source in ('qlib_indicators.py', 'indicator_kernels.py', 'numba_kernels.py', 'dtype_policy.py'):
+            digest.update((scripts_dir / source).read_bytes())
+        config = {
+            'alpha360': [self.ALPHA360_LAGS, self.ALPHA360_FEATURES],
+            'financial_data_dir': str(self.financial_data_dir),
+            'indicators': self.plan.signature(),
+            'dtypes': self.dtype_policy.signature(),
+            'kernels': self.kernels.name,
+        }
+        digest.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def stock_fingerprint(self, symbol: str) -> str:
+        """单只股票的输入指纹：行情 .bin 文件、财务数据文件与指标配置（指标缓存键与运行清单共用）"""
+        symbol_dir = self.features_dir / symbol.lower()
+        input_files = [symbol_dir / f"{feature}.day.bin" for feature in ('open', 'high', 'low', 'close', 'volume')]
+        input_files.append(self.data_dir / "calendars" / "day.txt")
+        input_files.extend(self.financial_store.files(symbol))
+        return IndicatorCache.make_key(symbol, input_files, self._indicator_config_hash)
+    
+    def _log_cache_stats(self):
+        if self.cache is not None:
+            stats = self.cache.stats()
+            logger.info(f"🗄️ 指标缓存: 命中 {stats['hits']} / 未命中 {stats['misses']} "
+                        f"(命中率 {stats['hit_rate']:.1%}), 淘汰 {stats['evictions']}, 占用 {stats['size_mb']:.1f}MB")
+    
+    def _get_calendar(self) -> Optional[pd.DatetimeIndex]:
+        """读取并缓存交易日历 (calendars/day.txt)"""
+        if self._calendar is None:
+            with self._lock:
+                if self._calendar is None:
+                    calendar_file = self.data_dir / "calendars" / "day.txt"
+                    if calendar_file.exists():
+                        with open(calendar_file, 'r') as f:
+                            calendar_dates = [line.strip() for line in f if line.strip()]
+                        self._calendar = pd.DatetimeIndex(pd.to_datetime(calendar_dates))
                     else:
-                        logger.warning(f"📁 {data_type} 目录为空")
-                else:
-                    logger.warning(f"📁 财务数据目录不存在: {data_path}")
-                    
-        except Exception as e:
-            logger.error(f"加载财务数据失败: {e}")
-            self.financial_cache = {}
+                        self._calendar = pd.DatetimeIndex([])
+        return self._calendar if len(self._calendar) > 0 else None
+    
+    @staticmethod
+    def _read_bin_field(bin_file: Path, start_position: Optional[int] = None) -> Tuple[int, np.ndarray]:
+        """
+        一次性读取单个Qlib二进制字段文件
+        文件格式与 DumpDataBase._data_to_bin 一致: 第一个float32为日历起始位置，其后为逐日数据
+        指定 start_position 时直接跳到该日历位置读取尾部数据
+        """
+        if start_position is None:
+            raw = np.fromfile(bin_file, dtype='<f4')
+            if raw.size == 0:
+                return 0, np.empty(0, dtype=np.float32)
+            return int(raw[0]), raw[1:].astype(np.float32, copy=False)
+        
+        header = np.fromfile(bin_file, dtype='<f4', count=1)
+        if header.size == 0:
+            return 0, np.empty(0, dtype=np.float32)
+        start_index = int(header[0])
+        skip = max(0, start_position - start_index)
+        values = np.fromfile(bin_file, dtype='<f4', offset=4 * (1 + skip))
+        return start_index + skip, values.astype(np.float32, copy=False)
     
-    def read_qlib_binary_data(self, symbol: str) -> Optional[pd.DataFrame]:
-        """读取Qlib二进制数据"""
+    def read_qlib_binary_data(self, symbol: str, start_position: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """读取Qlib二进制数据（按日历位置对齐，返回float32列）；start_position 为读取起点的日历位置"""
         symbol_dir = self.features_dir / symbol.lower()
         
         if not symbol_dir.exists():
             return None
         
         features = ['open', 'high', 'low', 'close', 'volume']
-        data_dict = {}
+        fields = {}
         
         try:
             for feature in features:
                 bin_file = symbol_dir / f"{feature}.day.bin"
                 if bin_file.exists():
-                    with open(bin_file, 'rb') as f:
-                        values = []
-                        while True:
-                            data = f.read(4)
-                            if not data:
-                                break
-                            value = struct.unpack('<f', data)[0]
-                            if not np.isnan(value) and not np.isinf(value):
-                                values.append(value)
-                            else:
-                                values.append(0.0)
-                        data_dict[feature.title()] = values
-            
-            if not data_dict:
+                    start_index, values = self._read_bin_field(bin_file, start_position)
+                    if values.size > 0:
+                        fields[feature.title()] = (start_index, values)
+            
+            if not fields:
                 return None
             
-            # Ensure all arrays have the same length
-            lengths = [len(v) for v in data_dict.values()]
-            if len(set(lengths)) > 1:
-                min_length = min(lengths)
-                for key in data_dict:
-                    data_dict[key] = data_dict[key][:min_length]
-            
-            df = pd.DataFrame(data_dict)
-            
-            # Read actual calendar dates from qlib
-            calendar_file = self.data_dir / "calendars" / "day.txt"
-            if calendar_file.exists():
-                with open(calendar_file, 'r') as f:
-                    calendar_dates = [line.strip() for line in f.readlines()]
-                calendar_dates = [pd.to_datetime(date) for date in calendar_dates if date.strip()]
-                
-                # The data in qlib is typically aligned with the calendar in reverse order
-                if len(df) <= len(calendar_dates):
-                    dates = calendar_dates[-len(df):]
-                else:
-                    # If data is longer than calendar, extend backwards
-                    latest_date = calendar_dates[-1] if calendar_dates else pd.to_datetime('2025-06-27')
-                    all_dates = pd.bdate_range(end=latest_date, periods=len(df), freq='B')
-                    dates = all_dates.tolist()
+            # 各字段可能起止位置不同，统一对齐到日历区间 [start, end)
+            start = min(start_index for start_index, _ in fields.values())
+            end = max(start_index + len(values) for start_index, values in fields.values())
+            
+            calendar = self._get_calendar()
+            if calendar is not None and end > len(calendar):
+                logger.warning(f"{symbol}: 二进制数据超出日历范围 ({end} > {len(calendar)})，已截断")
+                end = len(calendar)
+            if end <= start:
+                return None
+            
+            data_dict = {}
+            for name, (start_index, values) in fields.items():
+                column = np.full(end - start, np.nan, dtype=np.float32)
+                offset = start_index - start
+                length = min(len(values), end - start_index)
+                if length > 0:
+                    column[offset:offset + length] = values[:length]
+                # Qlib使用NaN表示缺失值，inf同样视为缺失
+                column[np.isinf(column)] = np.nan
+                data_dict[name] = column
+            
+            if calendar is not None:
+                dates = calendar[start:end]
             else:
                 # Fallback: generate business days ending at a reasonable date
                 end_date = pd.to_datetime('2025-06-27')
-                dates = pd.bdate_range(end=end_date, periods=len(df), freq='B')
+                dates = pd.bdate_range(end=end_date, periods=end - start, freq='B')
             
-            df.index = pd.DatetimeIndex(dates)
-            
-            return df
+            return pd.DataFrame(data_dict, index=pd.DatetimeIndex(dates))
             
         except Exception as e:
             logger.warning(f"Failed to read binary data {symbol}: {e}")
@@ -594,29 +1016,30 @@ class QlibIndicatorsEnhancedCalculator:
                     stocks.append(symbol)
         
         logger.info(f"Found {len(stocks)} stocks data")
+        if self.financial_store.symbols('info'):
+            missing = self.financial_store.missing_symbols(stocks)
+            if missing:
+                logger.info(f"其中 {len(missing)} 只股票没有财务数据，财务指标将使用估算值")
         return sorted(stocks)
     
+    def select_stocks(self, max_stocks: Optional[int] = None) -> List[str]:
+        """可用股票（按 max_stocks 截取）中属于本分片的部分；balanced 划分按各股票的历史长度估算工作量"""
+        stocks = self.get_available_stocks()
+        if max_stocks:
+            stocks = stocks[:max_stocks]
+        self.shard_universe = stocks
+        if self.num_shards > 1:
+            weights = None
+            if self.shard_strategy == 'balanced':
+                weights = {symbol: history_length(self.features_dir, symbol) for symbol in stocks}
+            stocks = shard_stocks(stocks, self.num_shards, self.shard_index, self.shard_strategy, weights)
+            logger.info(f"🧩 分片 {self.shard_index + 1}/{self.num_shards}: {len(stocks)}/{len(self.shard_universe)} 只股票")
+        self.shard_stocks = stocks
+        return stocks
+    
     def get_financial_data(self, symbol: str, data_type: str) -> Optional[pd.DataFrame]:
-        """获取财务数据"""
-        try:
-            # 尝试多种符号格式
-            symbol_variants = [
-                symbol,                        # 原始符号
-                symbol.replace('_', '.'),      # 下划线转点号 (0002_HK -> 0002.HK)
-                symbol.replace('.', '_'),      # 点号转下划线 (0002.HK -> 0002_HK)
-                symbol.upper(),                # 大写
-                symbol.replace('_HK', '.HK'),  # 特定转换
-                symbol.replace('.HK', '_HK')   # 特定转换
-            ]
-            
-            if data_type in self.financial_cache:
-                for variant in symbol_variants:
-                    if variant in self.financial_cache[data_type]:
-                        return self.financial_cache[data_type][variant]
-            return None
-        except Exception as e:
-            logger.warning(f"Failed to get financial data for {symbol}, {data_type}: {e}")
-            return None
+        """获取财务数据（股票代码按规范化键查找，0002.HK / 0002_HK / 0002_hk 等写法等价）"""
+        return self.financial_store.get(data_type, symbol)
     
     def _safe_divide(self, a, b, fill_value=0.0):
         """安全除法操作，避免除零错误"""
@@ -642,123 +1065,29 @@ class QlibIndicatorsEnhancedCalculator:
         if hasattr(self._local, 'calculated_indicators'):
             self._local.calculated_indicators.clear()
     
-    def calculate_all_technical_indicators(self, data: pd.DataFrame) -> pd.DataFrame:
+    def calculate_all_technical_indicators(self, data: Union[pd.DataFrame, PreparedBars]) -> pd.DataFrame:
         """计算所有技术指标（共约60个）"""
-        if data.empty or len(data) < 50:
+        bars = PreparedBars.from_data(data)
+        if bars.empty or len(bars) < 50:
             logger.warning("Insufficient data for calculating technical indicators")
             return pd.DataFrame()
         
         try:
             indicators = {}
             
-            # Clean data and convert to numpy arrays for talib
-            close = data['Close'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            high = data['High'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            low = data['Low'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            open_price = data['Open'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            volume = data['Volume'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(0).values
-            
-            # 1. Moving Averages (移动平均线类) - 12个
-            self._add_indicator(indicators, 'SMA_5', talib.SMA(close, timeperiod=5))
-            self._add_indicator(indicators, 'SMA_10', talib.SMA(close, timeperiod=10))
-            self._add_indicator(indicators, 'SMA_20', talib.SMA(close, timeperiod=20))
-            self._add_indicator(indicators, 'SMA_50', talib.SMA(close, timeperiod=50))
-            
-            self._add_indicator(indicators, 'EMA_5', talib.EMA(close, timeperiod=5))
-            self._add_indicator(indicators, 'EMA_10', talib.EMA(close, timeperiod=10))
-            self._add_indicator(indicators, 'EMA_20', talib.EMA(close, timeperiod=20))
-            self._add_indicator(indicators, 'EMA_50', talib.EMA(close, timeperiod=50))
-            
-            self._add_indicator(indicators, 'DEMA_20', talib.DEMA(close, timeperiod=20))
-            self._add_indicator(indicators, 'TEMA_20', talib.TEMA(close, timeperiod=20))
-            self._add_indicator(indicators, 'KAMA_30', talib.KAMA(close, timeperiod=30))
-            self._add_indicator(indicators, 'WMA_20', talib.WMA(close, timeperiod=20))
-            
-            # 2. MACD Family - 3个
-            indicators['MACD'], indicators['MACD_Signal'], indicators['MACD_Histogram'] = talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
-            indicators['MACDEXT'], _, _ = talib.MACDEXT(close, fastperiod=12, slowperiod=26, signalperiod=9)
-            indicators['MACDFIX'], _, _ = talib.MACDFIX(close, signalperiod=9)
-            
-            # 3. Momentum Oscillators (动量振荡器) - 6个
-            indicators['RSI_14'] = talib.RSI(close, timeperiod=14)
-            indicators['CCI_14'] = talib.CCI(high, low, close, timeperiod=14)
-            indicators['CMO_14'] = talib.CMO(close, timeperiod=14)
-            indicators['MFI_14'] = talib.MFI(high, low, close, volume, timeperiod=14)
-            indicators['WILLR_14'] = talib.WILLR(high, low, close, timeperiod=14)
-            indicators['ULTOSC'] = talib.ULTOSC(high, low, close, timeperiod1=7, timeperiod2=14, timeperiod3=28)
-            
-            # 4. Trend Indicators (趋势指标) - 13个
-            indicators['ADX_14'] = talib.ADX(high, low, close, timeperiod=14)
-            indicators['ADXR_14'] = talib.ADXR(high, low, close, timeperiod=14)
-            indicators['APO'] = talib.APO(close, fastperiod=12, slowperiod=26)
-            indicators['AROON_DOWN'], indicators['AROON_UP'] = talib.AROON(high, low, timeperiod=14)
-            indicators['AROONOSC_14'] = talib.AROONOSC(high, low, timeperiod=14)
-            indicators['BOP'] = talib.BOP(open_price, high, low, close)
-            indicators['DX_14'] = talib.DX(high, low, close, timeperiod=14)
-            indicators['MINUS_DI_14'] = talib.MINUS_DI(high, low, close, timeperiod=14)
-            indicators['MINUS_DM_14'] = talib.MINUS_DM(high, low, timeperiod=14)
-            indicators['PLUS_DI_14'] = talib.PLUS_DI(high, low, close, timeperiod=14)
-            indicators['PLUS_DM_14'] = talib.PLUS_DM(high, low, timeperiod=14)
-            indicators['PPO'] = talib.PPO(close, fastperiod=12, slowperiod=26)
-            indicators['TRIX_30'] = talib.TRIX(close, timeperiod=30)
-            
-            # 5. Momentum Indicators (动量指标) - 5个
-            indicators['MOM_10'] = talib.MOM(close, timeperiod=10)
-            indicators['ROC_10'] = talib.ROC(close, timeperiod=10)
-            indicators['ROCP_10'] = talib.ROCP(close, timeperiod=10)
-            indicators['ROCR_10'] = talib.ROCR(close, timeperiod=10)
-            indicators['ROCR100_10'] = talib.ROCR100(close, timeperiod=10)
-            
-            # 6. Bollinger Bands - 3个
-            indicators['BB_Upper'], indicators['BB_Middle'], indicators['BB_Lower'] = talib.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2)
-            
-            # 7. Stochastic (随机指标) - 6个
-            indicators['STOCH_K'], indicators['STOCH_D'] = talib.STOCH(high, low, close, fastk_period=14, slowk_period=3, slowd_period=3)
-            indicators['STOCHF_K'], indicators['STOCHF_D'] = talib.STOCHF(high, low, close, fastk_period=14, fastd_period=3)
-            indicators['STOCHRSI_K'], indicators['STOCHRSI_D'] = talib.STOCHRSI(close, timeperiod=14, fastk_period=5, fastd_period=3)
-            
-            # 8. Volatility Indicators (波动率指标) - 3个
-            indicators['ATR_14'] = talib.ATR(high, low, close, timeperiod=14)
-            indicators['NATR_14'] = talib.NATR(high, low, close, timeperiod=14)
-            indicators['TRANGE'] = talib.TRANGE(high, low, close)
-            
-            # 9. Volume Indicators (成交量指标) - 3个
-            indicators['OBV'] = talib.OBV(close, volume)
-            indicators['AD'] = talib.AD(high, low, close, volume)
-            indicators['ADOSC'] = talib.ADOSC(high, low, close, volume, fastperiod=3, slowperiod=10)
-            
-            # 10. Hilbert Transform (希尔伯特变换) - 7个
-            indicators['HT_DCPERIOD'] = talib.HT_DCPERIOD(close)
-            indicators['HT_DCPHASE'] = talib.HT_DCPHASE(close)
-            indicators['HT_INPHASE'], indicators['HT_QUADRATURE'] = talib.HT_PHASOR(close)
-            indicators['HT_SINE'], indicators['HT_LEADSINE'] = talib.HT_SINE(close)
-            indicators['HT_TRENDMODE'] = talib.HT_TRENDMODE(close)
-            indicators['HT_TRENDLINE'] = talib.HT_TRENDLINE(close)
-            
-            # 11. Math Transform (数学变换) - 8个
-            indicators['AVGPRICE'] = talib.AVGPRICE(open_price, high, low, close)
-            indicators['MEDPRICE'] = talib.MEDPRICE(high, low)
-            indicators['TYPPRICE'] = talib.TYPPRICE(high, low, close)
-            indicators['WCLPRICE'] = talib.WCLPRICE(high, low, close)
-            indicators['MIDPOINT'] = talib.MIDPOINT(close, timeperiod=14)
-            indicators['MIDPRICE'] = talib.MIDPRICE(high, low, timeperiod=14)
-            indicators['MAMA'], indicators['FAMA'] = talib.MAMA(close)
-            
-            # 12. Statistical Functions (统计函数) - 7个
-            indicators['LINEARREG'] = talib.LINEARREG(close, timeperiod=14)
-            indicators['LINEARREG_ANGLE'] = talib.LINEARREG_ANGLE(close, timeperiod=14)
-            indicators['LINEARREG_INTERCEPT'] = talib.LINEARREG_INTERCEPT(close, timeperiod=14)
-            indicators['LINEARREG_SLOPE'] = talib.LINEARREG_SLOPE(close, timeperiod=14)
-            indicators['STDDEV'] = talib.STDDEV(close, timeperiod=30)
-            indicators['TSF'] = talib.TSF(close, timeperiod=14)
-            indicators['VAR'] = talib.VAR(close, timeperiod=30)
-            
-            # 13. Min/Max Functions - 2个
-            indicators['MAXINDEX'] = talib.MAXINDEX(close, timeperiod=30)
-            indicators['MININDEX'] = talib.MININDEX(close, timeperiod=30)
+            # 按指标表逐个调用talib，只计算计划中需要的指标（共享清洗后的连续float64数组）
+            for outputs, function, inputs, params in self.TECHNICAL_INDICATORS:
+                if not self.plan.wants_any('technical', [name for name in outputs if name]):
+                    continue
+                values = getattr(talib, function)(*(getattr(bars, field) for field in inputs), **params)
+                if len(outputs) == 1:
+                    values = (values,)
+                for name, column in zip(outputs, values):
+                    if name is not None and self.plan.wants('technical', name):
+                        self._add_indicator(indicators, name, column)
             
             # 转换为DataFrame
-            indicators_df = pd.DataFrame(indicators, index=data.index)
+            indicators_df = pd.DataFrame(indicators, index=bars.index)
             
             logger.info(f"计算了 {len(indicators)} 个技术指标")
             return indicators_df
@@ -767,32 +1096,44 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"计算技术指标失败: {e}")
             return pd.DataFrame()
     
-    def calculate_alpha158_indicators(self, data: pd.DataFrame) -> pd.DataFrame:
+    def calculate_alpha158_indicators(self, data: Union[pd.DataFrame, PreparedBars]) -> pd.DataFrame:
         """
         计算Alpha158指标体系 (158个指标)
         包括KBAR指标、价格指标、成交量指标、滚动技术指标
         """
-        if data.empty or len(data) < 60:
+        bars = PreparedBars.from_data(data)
+        if bars.empty or len(bars) < 60:
             logger.warning("数据不足以计算Alpha158指标")
             return pd.DataFrame()
         
         try:
-            indicators = {}
+            indicators = self._alpha158_arrays(bars)
             
-            # 清理数据
-            open_price = data['Open'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            high = data['High'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            low = data['Low'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            close = data['Close'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            volume = data['Volume'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(0).values
-            
-            # 计算VWAP
-            vwap = self._safe_divide(
-                np.convolve(close * volume, np.ones(1), 'same'),
-                np.convolve(volume, np.ones(1), 'same')
-            )
+            # 转换为DataFrame
+            indicators_df = pd.DataFrame(indicators, index=bars.index)
             
-            # 1. KBAR指标 (9个)
+            logger.info(f"计算了Alpha158指标体系: {len(indicators)} 个指标")
+            return indicators_df
+            
+        except Exception as e:
+            logger.error(f"计算Alpha158指标失败: {e}")
+            return pd.DataFrame()
+    
+    def _alpha158_arrays(self, bars: PreparedBars) -> Dict[str, np.ndarray]:
+        """
+        Alpha158各列的取值（列名 -> 数组）
+        所有运算沿时间轴进行，bars 为单只股票 (PreparedBars) 或面板 (PanelBars) 均可
+        """
+        indicators = {}
+        
+        # 共享的清洗后数组
+        open_price, high, low, close, volume = bars.open, bars.high, bars.low, bars.close, bars.volume
+        
+        # 计划中需要的计算分组及其依赖的共享中间结果
+        needed = self.plan.resolve('alpha158', self._alpha158_groups(), self.ALPHA158_DEPENDENCIES)
+        
+        # 1. KBAR指标 (9个)
+        if 'KBAR' in needed:
             self._add_indicator(indicators, 'ALPHA158_KMID', self._safe_divide(close - open_price, open_price))
             self._add_indicator(indicators, 'ALPHA158_KLEN', self._safe_divide(high - low, open_price))
             self._add_indicator(indicators, 'ALPHA158_KMID2', self._safe_divide(close - open_price, high - low + 1e-12))
@@ -802,423 +1143,310 @@ class QlibIndicatorsEnhancedCalculator:
             self._add_indicator(indicators, 'ALPHA158_KLOW2', self._safe_divide(np.minimum(open_price, close) - low, high - low + 1e-12))
             self._add_indicator(indicators, 'ALPHA158_KSFT', self._safe_divide(2 * close - high - low, open_price))
             self._add_indicator(indicators, 'ALPHA158_KSFT2', self._safe_divide(2 * close - high - low, high - low + 1e-12))
-            
-            # 2. 价格指标 (标准化到收盘价)
-            features = ['OPEN', 'HIGH', 'LOW', 'VWAP']
-            for feature in features:
-                if feature == 'OPEN':
-                    price_values = open_price
-                elif feature == 'HIGH':
-                    price_values = high
-                elif feature == 'LOW':
-                    price_values = low
-                elif feature == 'VWAP':
-                    price_values = vwap
-                
-                self._add_indicator(indicators, f'ALPHA158_{feature}0', self._safe_divide(price_values, close))
-            
-            # 3. 成交量指标
+        
+        # 2. 价格指标 (标准化到收盘价)
+        if 'PRICE' in needed:
+            price_features = {'OPEN': open_price, 'HIGH': high, 'LOW': low, 'VWAP': bars.vwap}
+            for feature in self.ALPHA158_PRICE:
+                self._add_indicator(indicators, f'ALPHA158_{feature}0', self._safe_divide(price_features[feature], close))
+        
+        # 3. 成交量指标
+        if 'VOLUME' in needed:
             self._add_indicator(indicators, 'ALPHA158_VOLUME0', self._safe_divide(volume, volume + 1e-12))
-            
-            # 4. 滚动技术指标
-            windows = [5, 10, 20, 30, 60]
-            
-            # ROC - Rate of Change
+        
+        # 4. 滚动技术指标（滚动窗口内核由 self.kernels 提供）
+        windows = self.ALPHA158_WINDOWS
+        kernels = self.kernels
+        # 逐行循环类指标在前 d 行保持为0
+        warmup = bars.age
+        
+        # ROC - Rate of Change
+        if 'ROC' in needed:
             for d in windows:
-                ref_close = np.roll(close, d)
+                ref_close = bars.roll(close, d)
                 self._add_indicator(indicators, f'ALPHA158_ROC{d}', self._safe_divide(ref_close, close))
-            
-            # MA - Simple Moving Average
+        
+        # MA - Simple Moving Average
+        if 'MA' in needed:
+            ma_results = kernels.rolling_mean(close, windows)
             for d in windows:
-                ma_values = pd.Series(close).rolling(window=d, min_periods=1).mean().values
-                self._add_indicator(indicators, f'ALPHA158_MA{d}', self._safe_divide(ma_values, close))
-            
-            # STD - Standard Deviation
+                self._add_indicator(indicators, f'ALPHA158_MA{d}', self._safe_divide(ma_results[d], close))
+        
+        # STD - Standard Deviation
+        if 'STD' in needed:
+            std_results = kernels.rolling_std(close, windows)
             for d in windows:
-                std_values = pd.Series(close).rolling(window=d, min_periods=1).std().fillna(0).values
+                std_values = np.where(np.isnan(std_results[d]), 0.0, std_results[d])
                 self._add_indicator(indicators, f'ALPHA158_STD{d}', self._safe_divide(std_values, close))
-            
-            # BETA - Slope
+        
+        # BETA/RSQR/RESI - 滚动线性回归（闭式解一次算出所有窗口）
+        if 'ols' in needed:
+            ols_results = kernels.rolling_ols(close, windows)
+        
+        # BETA - Slope
+        if 'BETA' in needed:
             for d in windows:
-                beta_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    x = np.arange(d)
-                    y = close[i-d+1:i+1]
-                    if len(y) > 1:
-                        try:
-                            slope = np.polyfit(x, y, 1)[0]
-                            beta_values[i] = slope
-                        except:
-                            beta_values[i] = 0
+                beta_values = np.where(warmup >= d, ols_results[d][0], 0.0)
                 self._add_indicator(indicators, f'ALPHA158_BETA{d}', self._safe_divide(beta_values, close))
-            
-            # RSQR - R-square
+        
+        # RSQR - R-square
+        if 'RSQR' in needed:
             for d in windows:
-                rsqr_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    x = np.arange(d)
-                    y = close[i-d+1:i+1]
-                    if len(y) > 1:
-                        try:
-                            correlation_matrix = np.corrcoef(x, y)
-                            rsqr_values[i] = correlation_matrix[0, 1] ** 2 if not np.isnan(correlation_matrix[0, 1]) else 0
-                        except:
-                            rsqr_values[i] = 0
+                rsqr_values = np.where(warmup >= d, ols_results[d][1], 0.0)
                 self._add_indicator(indicators, f'ALPHA158_RSQR{d}', rsqr_values)
-            
-            # MAX/MIN
-            for d in windows:
-                max_values = pd.Series(high).rolling(window=d, min_periods=1).max().values
-                min_values = pd.Series(low).rolling(window=d, min_periods=1).min().values
-                self._add_indicator(indicators, f'ALPHA158_MAX{d}', self._safe_divide(max_values, close))
-                self._add_indicator(indicators, f'ALPHA158_MIN{d}', self._safe_divide(min_values, close))
-            
-            # QTLU/QTLD - Quantiles
-            for d in windows:
-                qtlu_values = pd.Series(close).rolling(window=d, min_periods=1).quantile(0.8).values
-                qtld_values = pd.Series(close).rolling(window=d, min_periods=1).quantile(0.2).values
-                self._add_indicator(indicators, f'ALPHA158_QTLU{d}', self._safe_divide(qtlu_values, close))
-                self._add_indicator(indicators, f'ALPHA158_QTLD{d}', self._safe_divide(qtld_values, close))
-            
-            # RANK - Percentile rank
+        
+        # MAX/MIN - 滚动极值及其位置（IMAX/IMIN/IMXD/RSV共用）
+        if 'high_extrema' in needed:
+            high_extrema = kernels.rolling_extrema(high, windows, 'max')
+        if 'low_extrema' in needed:
+            low_extrema = kernels.rolling_extrema(low, windows, 'min')
+        for d in windows:
+            if 'MAX' in needed:
+                self._add_indicator(indicators, f'ALPHA158_MAX{d}', self._safe_divide(high_extrema[d][0], close))
+            if 'MIN' in needed:
+                self._add_indicator(indicators, f'ALPHA158_MIN{d}', self._safe_divide(low_extrema[d][0], close))
+        
+        # QTLU/QTLD - Quantiles
+        if 'QTLU' in needed:
+            qtlu_results = kernels.rolling_quantile(close, windows, 0.8)
+        if 'QTLD' in needed:
+            qtld_results = kernels.rolling_quantile(close, windows, 0.2)
+        for d in windows:
+            if 'QTLU' in needed:
+                self._add_indicator(indicators, f'ALPHA158_QTLU{d}', self._safe_divide(qtlu_results[d], close))
+            if 'QTLD' in needed:
+                self._add_indicator(indicators, f'ALPHA158_QTLD{d}', self._safe_divide(qtld_results[d], close))
+        
+        # RANK - Percentile rank
+        if 'RANK' in needed:
+            rank_results = kernels.rolling_rank(close, windows)
             for d in windows:
-                rank_values = pd.Series(close).rolling(window=d, min_periods=1).rank(pct=True).values
-                self._add_indicator(indicators, f'ALPHA158_RANK{d}', rank_values)
-            
-            # RSV - Relative Strength Value
+                self._add_indicator(indicators, f'ALPHA158_RANK{d}', rank_results[d])
+        
+        # RSV - Relative Strength Value
+        if 'RSV' in needed:
             for d in windows:
-                min_low = pd.Series(low).rolling(window=d, min_periods=1).min().values
-                max_high = pd.Series(high).rolling(window=d, min_periods=1).max().values
+                min_low = low_extrema[d][0]
+                max_high = high_extrema[d][0]
                 self._add_indicator(indicators, f'ALPHA158_RSV{d}', self._safe_divide(close - min_low, max_high - min_low + 1e-12))
-            
-            # RESI - Linear Regression Residual
+        
+        # RESI - Linear Regression Residual
+        if 'RESI' in needed:
             for d in windows:
-                resi_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    x = np.arange(d)
-                    y = close[i-d+1:i+1]
-                    if len(y) > 1:
-                        try:
-                            slope, intercept = np.polyfit(x, y, 1)
-                            predicted = slope * (d-1) + intercept
-                            resi_values[i] = y[-1] - predicted
-                        except:
-                            resi_values[i] = 0
+                resi_values = np.where(warmup >= d, ols_results[d][2], 0.0)
                 self._add_indicator(indicators, f'ALPHA158_RESI{d}', self._safe_divide(resi_values, close))
-            
-            # IMAX - Index of Maximum
+        
+        # IMAX - Index of Maximum
+        if 'IMAX' in needed:
             for d in windows:
-                imax_values = np.zeros_like(close)
-                for i in range(d, len(high)):
-                    window_high = high[i-d+1:i+1]
-                    if len(window_high) > 0:
-                        imax_values[i] = (len(window_high) - 1 - np.argmax(window_high)) / d
+                imax_values = np.where(warmup >= d, high_extrema[d][1] / d, 0.0)
                 self._add_indicator(indicators, f'ALPHA158_IMAX{d}', imax_values)
-            
-            # IMIN - Index of Minimum  
+        
+        # IMIN - Index of Minimum  
+        if 'IMIN' in needed:
             for d in windows:
-                imin_values = np.zeros_like(close)
-                for i in range(d, len(low)):
-                    window_low = low[i-d+1:i+1]
-                    if len(window_low) > 0:
-                        imin_values[i] = (len(window_low) - 1 - np.argmin(window_low)) / d
+                imin_values = np.where(warmup >= d, low_extrema[d][1] / d, 0.0)
                 self._add_indicator(indicators, f'ALPHA158_IMIN{d}', imin_values)
-            
-            # IMXD - Index Max - Index Min Difference
+        
+        # IMXD - Index Max - Index Min Difference
+        if 'IMXD' in needed:
             for d in windows:
-                imxd_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    window_high = high[i-d+1:i+1] 
-                    window_low = low[i-d+1:i+1]
-                    if len(window_high) > 0 and len(window_low) > 0:
-                        idx_max = len(window_high) - 1 - np.argmax(window_high)
-                        idx_min = len(window_low) - 1 - np.argmin(window_low)
-                        imxd_values[i] = (idx_max - idx_min) / d
+                imxd_values = np.where(warmup >= d, (high_extrema[d][1] - low_extrema[d][1]) / d, 0.0)
                 self._add_indicator(indicators, f'ALPHA158_IMXD{d}', imxd_values)
-            
-            # CORR - Correlation between close and log(volume)
+        
+        # CORR - Correlation between close and log(volume)
+        if 'CORR' in needed:
+            corr_results = kernels.rolling_corr(close, bars.log_volume, windows)
             for d in windows:
-                corr_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    window_close = close[i-d+1:i+1]
-                    window_volume = volume[i-d+1:i+1]
-                    if len(window_close) > 1:
-                        try:
-                            log_volume = np.log(window_volume + 1)
-                            if np.std(window_close) > 1e-8 and np.std(log_volume) > 1e-8:
-                                corr_values[i] = np.corrcoef(window_close, log_volume)[0, 1]
-                        except:
-                            corr_values[i] = 0
+                corr_values = np.where(warmup >= d, corr_results[d], 0.0)
                 self._add_indicator(indicators, f'ALPHA158_CORR{d}', corr_values)
-            
-            # CORD - Correlation between price change and volume change
+        
+        # CORD - Correlation between price change and volume change
+        # 第 j 个元素为第 j 日相对前一日的变化，窗口 d 对应最近 d-1 个变化
+        if 'CORD' in needed:
+            close_change = bars.close_ratio
+            volume_change = np.full_like(close, np.nan)
+            volume_change[1:] = np.log((volume[1:] / (volume[:-1] + 1e-12)) + 1)
+            cord_results = kernels.rolling_corr(close_change, volume_change, [d - 1 for d in windows])
             for d in windows:
-                cord_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    if i >= d:
-                        close_change = close[i-d+2:i+1] / close[i-d+1:i]
-                        volume_change = np.log((volume[i-d+2:i+1] / (volume[i-d+1:i] + 1e-12)) + 1)
-                        if len(close_change) > 1:
-                            try:
-                                if np.std(close_change) > 1e-8 and np.std(volume_change) > 1e-8:
-                                    cord_values[i] = np.corrcoef(close_change, volume_change)[0, 1]
-                            except:
-                                cord_values[i] = 0
+                cord_values = np.where(warmup >= d, cord_results[d - 1], 0.0)
                 self._add_indicator(indicators, f'ALPHA158_CORD{d}', cord_values)
-            
-            # CNTP - Count of Positive returns
+        
+        # 价格/成交量日变化及其正负部分，计数与求和类指标均由窗口和差分得到
+        # 第 j 个元素为第 j 日相对前一日的变化，窗口 d 对应最近 d-1 个变化
+        change_windows = [d - 1 for d in windows]
+        if 'change_counts' in needed:
+            up = np.zeros_like(close)
+            down = np.zeros_like(close)
+            up[1:] = close[1:] > close[:-1]
+            down[1:] = close[1:] < close[:-1]
+            up_count = kernels.rolling_sum(up, change_windows)
+            down_count = kernels.rolling_sum(down, change_windows)
+        if 'price_sums' in needed:
+            price_diff = np.full_like(close, np.nan)
+            price_diff[1:] = close[1:] - close[:-1]
+            price_gain = kernels.rolling_sum(np.maximum(price_diff, 0), change_windows)
+            price_loss = kernels.rolling_sum(np.maximum(-price_diff, 0), change_windows)
+            price_abs = kernels.rolling_sum(np.abs(price_diff), change_windows)
+        if 'volume_sums' in needed:
+            volume_diff = np.full_like(volume, np.nan)
+            volume_diff[1:] = volume[1:] - volume[:-1]
+            volume_gain = kernels.rolling_sum(np.maximum(volume_diff, 0), change_windows)
+            volume_loss = kernels.rolling_sum(np.maximum(-volume_diff, 0), change_windows)
+            volume_abs = kernels.rolling_sum(np.abs(volume_diff), change_windows)
+        
+        # CNTP - Count of Positive returns
+        if 'CNTP' in needed:
             for d in windows:
-                cntp_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    window_returns = close[i-d+2:i+1] > close[i-d+1:i]
-                    if len(window_returns) > 0:
-                        cntp_values[i] = np.mean(window_returns)
+                cntp_values = np.where(warmup >= d, up_count[d - 1] / (d - 1), 0.0)
                 self._add_indicator(indicators, f'ALPHA158_CNTP{d}', cntp_values)
-            
-            # CNTN - Count of Negative returns
+        
+        # CNTN - Count of Negative returns
+        if 'CNTN' in needed:
             for d in windows:
-                cntn_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    window_returns = close[i-d+2:i+1] < close[i-d+1:i]
-                    if len(window_returns) > 0:
-                        cntn_values[i] = np.mean(window_returns)
+                cntn_values = np.where(warmup >= d, down_count[d - 1] / (d - 1), 0.0)
                 self._add_indicator(indicators, f'ALPHA158_CNTN{d}', cntn_values)
-            
-            # CNTD - Count Difference (CNTP - CNTN)
+        
+        # CNTD - Count Difference (CNTP - CNTN)
+        if 'CNTD' in needed:
             for d in windows:
-                cntd_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    window_pos = close[i-d+2:i+1] > close[i-d+1:i]
-                    window_neg = close[i-d+2:i+1] < close[i-d+1:i]
-                    if len(window_pos) > 0:
-                        cntd_values[i] = np.mean(window_pos) - np.mean(window_neg)
+                cntd_values = np.where(warmup >= d, up_count[d - 1] / (d - 1) - down_count[d - 1] / (d - 1), 0.0)
                 self._add_indicator(indicators, f'ALPHA158_CNTD{d}', cntd_values)
-            
-            # SUMP - Sum of Positive returns ratio
+        
+        # SUMP - Sum of Positive returns ratio
+        if 'SUMP' in needed:
             for d in windows:
-                sump_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    changes = close[i-d+2:i+1] - close[i-d+1:i]
-                    if len(changes) > 0:
-                        positive_sum = np.sum(np.maximum(changes, 0))
-                        total_abs_sum = np.sum(np.abs(changes))
-                        sump_values[i] = self._safe_divide(positive_sum, total_abs_sum + 1e-12)
-                self._add_indicator(indicators, f'ALPHA158_SUMP{d}', sump_values)
-            
-            # SUMN - Sum of Negative returns ratio  
+                sump_values = self._safe_divide(price_gain[d - 1], price_abs[d - 1] + 1e-12)
+                self._add_indicator(indicators, f'ALPHA158_SUMP{d}', np.where(warmup >= d, sump_values, 0.0))
+        
+        # SUMN - Sum of Negative returns ratio  
+        if 'SUMN' in needed:
             for d in windows:
-                sumn_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    changes = close[i-d+2:i+1] - close[i-d+1:i]
-                    if len(changes) > 0:
-                        negative_sum = np.sum(np.maximum(-changes, 0))
-                        total_abs_sum = np.sum(np.abs(changes))
-                        sumn_values[i] = self._safe_divide(negative_sum, total_abs_sum + 1e-12)
-                self._add_indicator(indicators, f'ALPHA158_SUMN{d}', sumn_values)
-            
-            # SUMD - Sum Difference (SUMP - SUMN)
+                sumn_values = self._safe_divide(price_loss[d - 1], price_abs[d - 1] + 1e-12)
+                self._add_indicator(indicators, f'ALPHA158_SUMN{d}', np.where(warmup >= d, sumn_values, 0.0))
+        
+        # SUMD - Sum Difference (SUMP - SUMN)
+        if 'SUMD' in needed:
             for d in windows:
-                sumd_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    changes = close[i-d+2:i+1] - close[i-d+1:i]
-                    if len(changes) > 0:
-                        positive_sum = np.sum(np.maximum(changes, 0))
-                        negative_sum = np.sum(np.maximum(-changes, 0))
-                        total_abs_sum = np.sum(np.abs(changes))
-                        sumd_values[i] = self._safe_divide(positive_sum - negative_sum, total_abs_sum + 1e-12)
-                self._add_indicator(indicators, f'ALPHA158_SUMD{d}', sumd_values)
-            
-            # VMA - Volume Moving Average
+                sumd_values = self._safe_divide(price_gain[d - 1] - price_loss[d - 1], price_abs[d - 1] + 1e-12)
+                self._add_indicator(indicators, f'ALPHA158_SUMD{d}', np.where(warmup >= d, sumd_values, 0.0))
+        
+        # VMA - Volume Moving Average
+        if 'VMA' in needed:
+            vma_results = kernels.rolling_mean(volume, windows)
             for d in windows:
-                vma_values = pd.Series(volume).rolling(window=d, min_periods=1).mean().values
-                self._add_indicator(indicators, f'ALPHA158_VMA{d}', self._safe_divide(vma_values, volume + 1e-12))
-            
-            # VSTD - Volume Standard Deviation
+                self._add_indicator(indicators, f'ALPHA158_VMA{d}', self._safe_divide(vma_results[d], volume + 1e-12))
+        
+        # VSTD - Volume Standard Deviation
+        if 'VSTD' in needed:
+            vstd_results = kernels.rolling_std(volume, windows)
             for d in windows:
-                vstd_values = pd.Series(volume).rolling(window=d, min_periods=1).std().fillna(0).values
+                vstd_values = np.where(np.isnan(vstd_results[d]), 0.0, vstd_results[d])
                 self._add_indicator(indicators, f'ALPHA158_VSTD{d}', self._safe_divide(vstd_values, volume + 1e-12))
-            
-            # WVMA - Weighted Volume Moving Average (price change volatility weighted by volume)
+        
+        # WVMA - Weighted Volume Moving Average (price change volatility weighted by volume)
+        if 'WVMA' in needed:
+            weighted_changes = np.full_like(close, np.nan)
+            weighted_changes[1:] = np.abs(bars.close_ratio[1:] - 1) * volume[1:]
+            weighted_moments = kernels.rolling_mean_std(weighted_changes, change_windows)
             for d in windows:
-                wvma_values = np.zeros_like(close)
-                for i in range(d, len(close)):
-                    price_changes = np.abs(close[i-d+2:i+1] / close[i-d+1:i] - 1)
-                    weights = volume[i-d+2:i+1]
-                    if len(price_changes) > 0:
-                        weighted_changes = price_changes * weights
-                        mean_weighted = np.mean(weighted_changes)
-                        std_weighted = np.std(weighted_changes)
-                        wvma_values[i] = self._safe_divide(std_weighted, mean_weighted + 1e-12)
-                self._add_indicator(indicators, f'ALPHA158_WVMA{d}', wvma_values)
-            
-            # VSUMP - Volume Sum Positive ratio
+                mean_weighted, std_weighted = weighted_moments[d - 1]
+                wvma_values = self._safe_divide(std_weighted, mean_weighted + 1e-12)
+                self._add_indicator(indicators, f'ALPHA158_WVMA{d}', np.where(warmup >= d, wvma_values, 0.0))
+        
+        # VSUMP - Volume Sum Positive ratio
+        if 'VSUMP' in needed:
             for d in windows:
-                vsump_values = np.zeros_like(close)
-                for i in range(d, len(volume)):
-                    vol_changes = volume[i-d+2:i+1] - volume[i-d+1:i] 
-                    if len(vol_changes) > 0:
-                        positive_sum = np.sum(np.maximum(vol_changes, 0))
-                        total_abs_sum = np.sum(np.abs(vol_changes))
-                        vsump_values[i] = self._safe_divide(positive_sum, total_abs_sum + 1e-12)
-                self._add_indicator(indicators, f'ALPHA158_VSUMP{d}', vsump_values)
-            
-            # VSUMN - Volume Sum Negative ratio
+                vsump_values = self._safe_divide(volume_gain[d - 1], volume_abs[d - 1] + 1e-12)
+                self._add_indicator(indicators, f'ALPHA158_VSUMP{d}', np.where(warmup >= d, vsump_values, 0.0))
+        
+        # VSUMN - Volume Sum Negative ratio
+        if 'VSUMN' in needed:
             for d in windows:
-                vsumn_values = np.zeros_like(close)
-                for i in range(d, len(volume)):
-                    vol_changes = volume[i-d+2:i+1] - volume[i-d+1:i]
-                    if len(vol_changes) > 0:
-                        negative_sum = np.sum(np.maximum(-vol_changes, 0))
-                        total_abs_sum = np.sum(np.abs(vol_changes))
-                        vsumn_values[i] = self._safe_divide(negative_sum, total_abs_sum + 1e-12)
-                self._add_indicator(indicators, f'ALPHA158_VSUMN{d}', vsumn_values)
-            
-            # VSUMD - Volume Sum Difference (VSUMP - VSUMN)
+                vsumn_values = self._safe_divide(volume_loss[d - 1], volume_abs[d - 1] + 1e-12)
+                self._add_indicator(indicators, f'ALPHA158_VSUMN{d}', np.where(warmup >= d, vsumn_values, 0.0))
+        
+        # VSUMD - Volume Sum Difference (VSUMP - VSUMN)
+        if 'VSUMD' in needed:
             for d in windows:
-                vsumd_values = np.zeros_like(close)
-                for i in range(d, len(volume)):
-                    vol_changes = volume[i-d+2:i+1] - volume[i-d+1:i]
-                    if len(vol_changes) > 0:
-                        positive_sum = np.sum(np.maximum(vol_changes, 0))
-                        negative_sum = np.sum(np.maximum(-vol_changes, 0))
-                        total_abs_sum = np.sum(np.abs(vol_changes))
-                        vsumd_values[i] = self._safe_divide(positive_sum - negative_sum, total_abs_sum + 1e-12)
-                self._add_indicator(indicators, f'ALPHA158_VSUMD{d}', vsumd_values)
-            
-            # 转换为DataFrame
-            indicators_df = pd.DataFrame(indicators, index=data.index)
-            
-            logger.info(f"计算了Alpha158指标体系: {len(indicators)} 个指标")
-            return indicators_df
-            
-        except Exception as e:
-            logger.error(f"计算Alpha158指标失败: {e}")
-            return pd.DataFrame()
+                vsumd_values = self._safe_divide(volume_gain[d - 1] - volume_loss[d - 1], volume_abs[d - 1] + 1e-12)
+                self._add_indicator(indicators, f'ALPHA158_VSUMD{d}', np.where(warmup >= d, vsumd_values, 0.0))
+        
+        # 只保留计划中的列（同一分组内未选中的窗口）
+        if self.plan.columns('alpha158') is not None:
+            indicators = {name: indicators[name] for name in self.plan.select('alpha158', indicators)}
+        
+        return indicators
     
-    def calculate_alpha360_indicators(self, data: pd.DataFrame) -> pd.DataFrame:
+    def calculate_alpha360_indicators(self, data: Union[pd.DataFrame, PreparedBars]) -> pd.DataFrame:
         """
         计算Alpha360指标体系 (360个指标)
         包括过去60天的标准化价格和成交量数据
         """
-        if data.empty or len(data) < 60:
+        bars = PreparedBars.from_data(data)
+        if bars.empty or len(bars) < 60:
             logger.warning("数据不足以计算Alpha360指标")
             return pd.DataFrame()
         
         try:
-            indicators = {}
+            block = self._alpha360_block(bars)
+            n_days = len(bars)
             
-            # 清理数据
-            open_price = data['Open'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            high = data['High'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            low = data['Low'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            close = data['Close'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            volume = data['Volume'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(0).values
-            
-            # 计算VWAP
-            vwap = self._safe_divide(
-                np.convolve(close * volume, np.ones(1), 'same'),
-                np.convolve(volume, np.ones(1), 'same')
+            indicators_df = pd.DataFrame(
+                block.reshape(n_days, -1), index=bars.index, columns=self._alpha360_columns(), copy=False
             )
+            if self.plan.columns('alpha360') is not None:
+                indicators_df = indicators_df[self.plan.select('alpha360', indicators_df.columns)]
             
-            # Alpha360: 过去60天的价格和成交量数据，除以当前收盘价标准化
-            # 1. CLOSE 指标 (60个)
-            for i in range(59, -1, -1):
-                if i == 0:
-                    self._add_indicator(indicators, f'ALPHA360_CLOSE{i}', self._safe_divide(close, close))
-                else:
-                    ref_close = np.roll(close, i)
-                    self._add_indicator(indicators, f'ALPHA360_CLOSE{i}', self._safe_divide(ref_close, close))
-            
-            # 2. OPEN 指标 (60个)
-            for i in range(59, -1, -1):
-                if i == 0:
-                    self._add_indicator(indicators, f'ALPHA360_OPEN{i}', self._safe_divide(open_price, close))
-                else:
-                    ref_open = np.roll(open_price, i)
-                    self._add_indicator(indicators, f'ALPHA360_OPEN{i}', self._safe_divide(ref_open, close))
-            
-            # 3. HIGH 指标 (60个)
-            for i in range(59, -1, -1):
-                if i == 0:
-                    self._add_indicator(indicators, f'ALPHA360_HIGH{i}', self._safe_divide(high, close))
-                else:
-                    ref_high = np.roll(high, i)
-                    self._add_indicator(indicators, f'ALPHA360_HIGH{i}', self._safe_divide(ref_high, close))
-            
-            # 4. LOW 指标 (60个)
-            for i in range(59, -1, -1):
-                if i == 0:
-                    self._add_indicator(indicators, f'ALPHA360_LOW{i}', self._safe_divide(low, close))
-                else:
-                    ref_low = np.roll(low, i)
-                    self._add_indicator(indicators, f'ALPHA360_LOW{i}', self._safe_divide(ref_low, close))
-            
-            # 5. VWAP 指标 (60个)
-            for i in range(59, -1, -1):
-                if i == 0:
-                    self._add_indicator(indicators, f'ALPHA360_VWAP{i}', self._safe_divide(vwap, close))
-                else:
-                    ref_vwap = np.roll(vwap, i)
-                    self._add_indicator(indicators, f'ALPHA360_VWAP{i}', self._safe_divide(ref_vwap, close))
-            
-            # 6. VOLUME 指标 (60个)
-            for i in range(59, -1, -1):
-                if i == 0:
-                    self._add_indicator(indicators, f'ALPHA360_VOLUME{i}', self._safe_divide(volume, volume + 1e-12))
-                else:
-                    ref_volume = np.roll(volume, i)
-                    self._add_indicator(indicators, f'ALPHA360_VOLUME{i}', self._safe_divide(ref_volume, volume + 1e-12))
-            
-            # 转换为DataFrame
-            indicators_df = pd.DataFrame(indicators, index=data.index)
-            
-            logger.info(f"计算了Alpha360指标体系: {len(indicators)} 个指标")
+            logger.info(f"计算了Alpha360指标体系: {indicators_df.shape[1]} 个指标")
             return indicators_df
             
         except Exception as e:
             logger.error(f"计算Alpha360指标失败: {e}")
             return pd.DataFrame()
     
-    def calculate_candlestick_patterns(self, data: pd.DataFrame) -> pd.DataFrame:
+    def _alpha360_block(self, bars: PreparedBars) -> np.ndarray:
+        """
+        Alpha360取值块，形状为 bars.matrix32.shape + (60,)，最后两维展开后与 _alpha360_columns 顺序一致
+        单只股票为 (n_days × 6 × 60)，面板为 (n_days × n_stocks × 6 × 60)
+        """
+        # Alpha360: 过去60天的价格和成交量数据，除以当前收盘价标准化
+        # 在堆叠的 (n_days × 6) 矩阵上取 sliding_window_view，得到 (n_days × 6 × 60) 的视图，
+        # window[i, f, k] 为第 f 个特征在第 i 行之前 59-k 期的取值，列顺序与 ALPHA360_{特征}{59..0} 一致
+        lags = self.ALPHA360_LAGS
+        stacked = bars.matrix32
+        padded = np.concatenate([np.full((lags - 1,) + stacked.shape[1:], np.nan, dtype=np.float32), stacked])
+        window = sliding_window_view(padded, lags, axis=0)
+        
+        # 价格除以当前收盘价，成交量除以当前成交量，一次广播完成（分母接近0时取0）
+        divisor = np.empty(stacked.shape, dtype=np.float64)
+        divisor[..., :-1] = bars.close[..., None]
+        divisor[..., -1] = bars.volume + 1e-12
+        valid = np.abs(divisor) > 1e-12
+        block = np.zeros(stacked.shape + (lags,), dtype=np.float32)
+        np.divide(window, divisor.astype(np.float32)[..., None], out=block, where=valid[..., None])
+        return block
+    
+    def calculate_candlestick_patterns(self, data: Union[pd.DataFrame, PreparedBars]) -> pd.DataFrame:
         """计算蜡烛图形态指标（共61个）"""
-        if data.empty or len(data) < 10:
+        bars = PreparedBars.from_data(data)
+        if bars.empty or len(bars) < 10:
             logger.warning("Insufficient data for calculating candlestick patterns")
             return pd.DataFrame()
         
         try:
             patterns = {}
             
-            # Clean data
-            open_price = data['Open'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            high = data['High'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            low = data['Low'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            close = data['Close'].astype(float).replace([np.inf, -np.inf], np.nan).fillna(method='ffill').values
-            
-            # 所有61个蜡烛图形态
-            candle_patterns = [
-                'CDL2CROWS', 'CDL3BLACKCROWS', 'CDL3INSIDE', 'CDL3LINESTRIKE', 'CDL3OUTSIDE',
-                'CDL3STARSINSOUTH', 'CDL3WHITESOLDIERS', 'CDLABANDONEDBABY', 'CDLADVANCEBLOCK',
-                'CDLBELTHOLD', 'CDLBREAKAWAY', 'CDLCLOSINGMARUBOZU', 'CDLCONCEALBABYSWALL',
-                'CDLCOUNTERATTACK', 'CDLDARKCLOUDCOVER', 'CDLDOJI', 'CDLDOJISTAR', 'CDLDRAGONFLYDOJI',
-                'CDLENGULFING', 'CDLEVENINGDOJISTAR', 'CDLEVENINGSTAR', 'CDLGAPSIDESIDEWHITE',
-                'CDLGRAVESTONEDOJI', 'CDLHAMMER', 'CDLHANGINGMAN', 'CDLHARAMI', 'CDLHARAMICROSS',
-                'CDLHIGHWAVE', 'CDLHIKKAKE', 'CDLHIKKAKEMOD', 'CDLHOMINGPIGEON', 'CDLIDENTICAL3CROWS',
-                'CDLINNECK', 'CDLINVERTEDHAMMER', 'CDLKICKING', 'CDLKICKINGBYLENGTH', 'CDLLADDERBOTTOM',
-                'CDLLONGLEGGEDDOJI', 'CDLLONGLINE', 'CDLMARUBOZU', 'CDLMATCHINGLOW', 'CDLMATHOLD',
-                'CDLMORNINGDOJISTAR', 'CDLMORNINGSTAR', 'CDLONNECK', 'CDLPIERCING', 'CDLRICKSHAWMAN',
-                'CDLRISEFALL3METHODS', 'CDLSEPARATINGLINES', 'CDLSHOOTINGSTAR', 'CDLSHORTLINE',
-                'CDLSPINNINGTOP', 'CDLSTALLEDPATTERN', 'CDLSTICKSANDWICH', 'CDLTAKURI', 'CDLTASUKIGAP',
-                'CDLTHRUSTING', 'CDLTRISTAR', 'CDLUNIQUE3RIVER', 'CDLUPSIDEGAP2CROWS', 'CDLXSIDEGAP3METHODS'
-            ]
-            
-            for pattern in candle_patterns:
+            open_price, high, low, close = bars.open, bars.high, bars.low, bars.close
+            
+            for pattern in self.plan.select('candlestick', self.CANDLESTICK_PATTERNS):
                 try:
                     patterns[pattern] = getattr(talib, pattern)(open_price, high, low, close)
                 except Exception as e:
                     logger.warning(f"Failed to calculate {pattern}: {e}")
-                    patterns[pattern] = np.zeros(len(data))
+                    patterns[pattern] = np.zeros(len(bars))
             
-            patterns_df = pd.DataFrame(patterns, index=data.index)
+            patterns_df = pd.DataFrame(patterns, index=bars.index)
             
             logger.info(f"计算了 {len(patterns)} 个蜡烛图形态指标")
             return patterns_df
@@ -1227,23 +1455,20 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"计算蜡烛图形态失败: {e}")
             return pd.DataFrame()
     
-    def calculate_financial_indicators(self, data: pd.DataFrame, symbol: str) -> pd.DataFrame:
+    def calculate_financial_indicators(self, data: Union[pd.DataFrame, PreparedBars], symbol: str) -> pd.DataFrame:
         """计算财务指标和换手率（约15个）- 使用估算值替代缺失数据"""
+        # 财务指标基于原始行情列计算
+        data = PreparedBars.from_data(data).frame
         try:
             result_data = data.copy()
             
-            # 预先初始化所有财务指标列
-            financial_columns = [
-                'PriceToBookRatio', 'MarketCap', 'PERatio', 'PriceToSalesRatio',
-                'ROE', 'ROA', 'ProfitMargins', 'CurrentRatio', 'QuickRatio', 
-                'DebtToEquity', 'TobinsQ', 'DailyTurnover', 
-                'turnover_c1d', 'turnover_c5d', 'turnover_c10d', 'turnover_c20d', 'turnover_c30d',
-                'turnover_m5d', 'turnover_m10d', 'turnover_m20d', 'turnover_m30d'
-            ]
             
-            # 获取基本信息数据
-            info_data = self.get_financial_data(symbol, 'info')
-            balance_sheet_data = self.get_financial_data(symbol, 'balance_sheet')
+            # 获取基本信息数据（没有财务数据的股票不再逐类查找）
+            info_data = None
+            balance_sheet_data = None
+            if self.financial_store.has(symbol):
+                info_data = self.get_financial_data(symbol, 'info')
+                balance_sheet_data = self.get_financial_data(symbol, 'balance_sheet')
             
             # 如果有真实财务数据，使用真实数据
             if info_data is not None and not info_data.empty:
@@ -1261,7 +1486,7 @@ class QlibIndicatorsEnhancedCalculator:
         except Exception as e:
             logger.error(f"计算财务指标失败: {e}")
             # 即使失败也要确保列存在
-            for col in financial_columns:
+            for col in self.FINANCIAL_COLUMNS:
                 if col not in data.columns:
                     data[col] = np.nan
             return data
@@ -1545,8 +1770,10 @@ class QlibIndicatorsEnhancedCalculator:
     
 
     
-    def calculate_volatility_indicators(self, data: pd.DataFrame) -> pd.DataFrame:
+    def calculate_volatility_indicators(self, data: Union[pd.DataFrame, PreparedBars]) -> pd.DataFrame:
         """计算波动率指标（约8个）"""
+        # 波动率指标基于原始收盘价计算
+        data = PreparedBars.from_data(data).frame
         try:
             volatility_data = {}
             
@@ -1581,25 +1808,135 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"计算波动率指标失败: {e}")
             return pd.DataFrame()
     
-    def calculate_all_indicators_for_stock(self, symbol: str) -> Optional[pd.DataFrame]:
-        """为单只股票计算所有指标（支持并行计算）"""
+    def _incremental_start_position(self, watermark: pd.Timestamp) -> Optional[int]:
+        """
+        增量计算的读取起点：水位线之后第一个交易日往前推预热窗口
+        返回 -1 表示日历中没有水位线之后的新交易日
+        """
+        calendar = self._get_calendar()
+        if calendar is None:
+            return None
+        first_new = int(calendar.searchsorted(watermark, side='right'))
+        if first_new >= len(calendar):
+            return -1
+        return max(0, first_new - self.warmup_days)
+    
+    @staticmethod
+    def _align_anchored_columns(result: pd.DataFrame, watermark: pd.Timestamp, anchors: Dict[str, float]):
+        """累积类指标在预热窗口上只差一个常数，按水位线处上一次输出的取值平移"""
+        at_watermark = np.flatnonzero((result['Date'] == watermark).values)
+        if len(at_watermark) == 0:
+            return
+        row = at_watermark[0]
+        for column, previous_value in anchors.items():
+            if column in result.columns and pd.notna(previous_value) and pd.notna(result[column].iat[row]):
+                result[column] = result[column] + (previous_value - result[column].iat[row])
+    
+    def calculate_all_indicators_for_stock(self, symbol: str, watermark: Optional[pd.Timestamp] = None,
+                                           anchors: Optional[Dict[str, float]] = None) -> Optional[pd.DataFrame]:
+        """
+        为单只股票计算所有指标（支持并行计算）
+        
+        指定水位线 watermark 时为增量模式：只读取尾部预热窗口，返回水位线之后的新行；
+        anchors 为上一次输出在水位线处的累积类指标取值，用于对齐 ANCHORED_COLUMNS
+        """
+        # 全量计算时优先读取缓存，输入未变化的股票直接复用上次结果
+        cache_key = None
+        if self.cache is not None and watermark is None:
+            cache_key = self.stock_fingerprint(symbol)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"🗄️ {symbol}: 命中指标缓存")
+                return cached
+        
+        return self._compute_indicators_for_stock(symbol, watermark, anchors, cache_key)
+    
+    def _compute_indicators_for_stock(self, symbol: str, watermark: Optional[pd.Timestamp] = None,
+                                      anchors: Optional[Dict[str, float]] = None,
+                                      cache_key: Optional[str] = None,
+                                      submitted_at: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """
+        计算单只股票的指标（不读缓存）；给定 cache_key 时把结果写入缓存
+        submitted_at 为任务提交到执行器的时间，用于记录排队等待时间
+        """
+        self.profiler.record_wait(symbol, submitted_at)
+        with self.profiler.measure('stock', symbol), self.profiler.profile(symbol):
+            return self._compute_stock(symbol, watermark, anchors, cache_key)
+    
+    def _compute_stock(self, symbol: str, watermark: Optional[pd.Timestamp], anchors: Optional[Dict[str, float]],
+                       cache_key: Optional[str]) -> Optional[pd.DataFrame]:
         try:
+            start_position = None
+            if watermark is not None:
+                start_position = self._incremental_start_position(watermark)
+                if start_position == -1:
+                    logger.info(f"{symbol}: 没有新的交易日，跳过")
+                    return pd.DataFrame()
+            
             # 读取历史价格数据
-            price_data = self.read_qlib_binary_data(symbol)
+            with self.profiler.measure('read', symbol):
+                price_data = self.read_qlib_binary_data(symbol, start_position)
             if price_data is None or price_data.empty:
                 logger.warning(f"No price data found for {symbol}")
                 return None
             
-            # 使用并行计算或顺序计算
-            if self.enable_parallel:
-                return self._calculate_indicators_parallel(symbol, price_data)
+            if watermark is not None and price_data.index[-1] <= watermark:
+                logger.info(f"{symbol}: 没有新的交易日，跳过")
+                return pd.DataFrame()
+            
+            # 使用并行计算或顺序计算（cProfile 只能剖析当前线程，抽样剖析的股票顺序计算）
+            if self.enable_parallel and not self.profiler.is_profiled(symbol):
+                result = self._calculate_indicators_parallel(symbol, price_data)
             else:
-                return self._calculate_indicators_sequential(symbol, price_data)
+                result = self._calculate_indicators_sequential(symbol, price_data)
+            result = self.dtype_policy.apply(result)
+            
+            if watermark is not None and result is not None:
+                if anchors:
+                    self._align_anchored_columns(result, watermark, anchors)
+                result = result[result['Date'] > watermark].reset_index(drop=True)
+            
+            if cache_key is not None and result is not None:
+                self.cache.put(cache_key, result)
+            return result
                 
+        except MemoryError:
+            # 内存不足不是单只股票的数据问题，交给调用方处理（如批处理拆分批次重试）
+            raise
         except Exception as e:
             logger.error(f"❌ {symbol}: 计算指标失败 - {e}")
             return None
     
+    def _planned_family_tasks(self, bars: PreparedBars, symbol: str,
+                              precomputed: Optional[Dict[str, pd.DataFrame]] = None) -> List[Tuple[str, partial]]:
+        """
+        按指标计划生成各指标族的计算任务，未选中的指标族不计算
+        precomputed 中已有结果的指标族（如面板引擎算好的Alpha158/Alpha360）直接使用该结果
+        """
+        precomputed = precomputed or {}
+        family_tasks = [
+            ('alpha158', 'Alpha158', partial(self.calculate_alpha158_indicators, bars)),
+            ('alpha360', 'Alpha360', partial(self.calculate_alpha360_indicators, bars)),
+            ('technical', 'Technical', partial(self.calculate_all_technical_indicators, bars)),
+            ('candlestick', 'Candlestick', partial(self.calculate_candlestick_patterns, bars)),
+            ('financial', 'Financial', partial(self.calculate_financial_indicators, bars, symbol)),
+            ('volatility', 'Volatility', partial(self.calculate_volatility_indicators, bars))
+        ]
+        return [
+            (task_name, partial(self._run_planned_family, family, symbol,
+                                partial(precomputed.get, family) if family in precomputed else task_func))
+            for family, task_name, task_func in family_tasks if self.plan.includes(family)
+        ]
+    
+    def _run_planned_family(self, family: str, symbol: str, task_func) -> pd.DataFrame:
+        """计算一个指标族，只保留计划中的列和行情基础列"""
+        with self.profiler.measure(family, symbol):
+            result = task_func()
+        if result is None or result.empty or self.plan.columns(family) is None:
+            return result
+        keep = [col for col in result.columns if col in self.BASE_COLUMNS or self.plan.wants(family, col)]
+        return result[keep]
+    
     def _calculate_indicators_parallel(self, symbol: str, price_data: pd.DataFrame) -> Optional[pd.DataFrame]:
         """
         并行计算单只股票的所有指标类型
@@ -1617,15 +1954,11 @@ class QlibIndicatorsEnhancedCalculator:
             # 保存原始日期信息
             original_dates = price_data.index
             
-            # 定义各类指标计算任务
-            indicator_tasks = [
-                ('Alpha158', partial(self.calculate_alpha158_indicators, price_data)),
-                ('Alpha360', partial(self.calculate_alpha360_indicators, price_data)),
-                ('Technical', partial(self.calculate_all_technical_indicators, price_data)),
-                ('Candlestick', partial(self.calculate_candlestick_patterns, price_data)),
-                ('Financial', partial(self.calculate_financial_indicators, price_data, symbol)),
-                ('Volatility', partial(self.calculate_volatility_indicators, price_data))
-            ]
+            # 每只股票只清洗一次行情数据，各指标族共享
+            bars = PreparedBars(price_data)
+            
+            # 定义各类指标计算任务（只包含指标计划选中的指标族）
+            indicator_tasks = self._planned_family_tasks(bars, symbol)
             
             # 使用线程池并行计算
             results = {}
@@ -1649,6 +1982,8 @@ class QlibIndicatorsEnhancedCalculator:
                         else:
                             failed_tasks.append(task_name)
                             logger.warning(f"⚠️ {symbol} - {task_name}: 计算结果为空")
+                    except MemoryError:
+                        raise
                     except Exception as e:
                         failed_tasks.append(task_name)
                         logger.error(f"❌ {symbol} - {task_name}: 计算失败 - {e}")
@@ -1659,7 +1994,8 @@ class QlibIndicatorsEnhancedCalculator:
             # 合并所有指标
             try:
                 all_indicators = [price_data]
-                all_indicators.extend(results.values())
+                # 按任务顺序合并，列顺序与各指标族完成的先后无关
+                all_indicators.extend(results[name] for name, _ in indicator_tasks if name in results)
                 
                 if all_indicators:
                     # 确保所有DataFrame都有一致的索引，但保留日期信息
@@ -1747,13 +2083,17 @@ class QlibIndicatorsEnhancedCalculator:
                 logger.error(f"❌ {symbol}: 所有指标计算都失败了")
                 return None
                 
+        except MemoryError:
+            raise
         except Exception as e:
             logger.error(f"❌ {symbol}: 并行计算失败 - {e}")
             return self._calculate_indicators_sequential(symbol, price_data)
     
-    def _calculate_indicators_sequential(self, symbol: str, price_data: pd.DataFrame) -> Optional[pd.DataFrame]:
+    def _calculate_indicators_sequential(self, symbol: str, price_data: pd.DataFrame,
+                                         precomputed: Optional[Dict[str, pd.DataFrame]] = None) -> Optional[pd.DataFrame]:
         """
         顺序计算单只股票的所有指标（备用方法）
+        precomputed 为已经算好的指标族结果（指标族名 -> DataFrame），不再重复计算
         """
         try:
             logger.info(f"开始顺序计算 {symbol} 的所有指标...")
@@ -1764,35 +2104,16 @@ class QlibIndicatorsEnhancedCalculator:
             # 保存原始日期信息
             original_dates = price_data.index
             
-            # 1. 计算Alpha158指标体系 (~158个)
-            alpha158_indicators = self.calculate_alpha158_indicators(price_data)
-            
-            # 2. 计算Alpha360指标体系 (~360个)
-            alpha360_indicators = self.calculate_alpha360_indicators(price_data)
+            # 每只股票只清洗一次行情数据，各指标族共享
+            bars = PreparedBars(price_data)
             
-            # 3. 计算技术指标 (~60个)
-            technical_indicators = self.calculate_all_technical_indicators(price_data)
-            
-            # 4. 计算蜡烛图形态 (61个)
-            candlestick_patterns = self.calculate_candlestick_patterns(price_data)
-            
-            # 5. 计算财务指标 (~15个)
-            financial_data = self.calculate_financial_indicators(price_data, symbol)
-            
-            # 6. 计算波动率指标 (~8个)
-            volatility_indicators = self.calculate_volatility_indicators(price_data)
+            # 依次计算指标计划选中的指标族：Alpha158、Alpha360、技术指标、蜡烛图形态、财务指标、波动率指标
+            indicator_dfs = [price_data]
+            for _, task_func in self._planned_family_tasks(bars, symbol, precomputed):
+                indicator_dfs.append(task_func())
             
             # 合并所有指标（确保索引一致性并保留日期信息）
             base_index = price_data.index
-            indicator_dfs = [
-                price_data,
-                alpha158_indicators,
-                alpha360_indicators,
-                technical_indicators,
-                candlestick_patterns,
-                financial_data,  # 添加财务数据
-                volatility_indicators
-            ]
             
             # 重新索引所有DataFrame以确保一致性，并保留日期信息
             aligned_dfs = []
@@ -1838,16 +2159,19 @@ class QlibIndicatorsEnhancedCalculator:
             logger.info(f"✅ {symbol}: 顺序计算完成 {len(all_indicators.columns)-2} 个指标")
             return all_indicators
             
+        except MemoryError:
+            raise
         except Exception as e:
             logger.error(f"❌ {symbol}: 顺序计算失败 - {e}")
             return None
     
-    def calculate_all_indicators(self, max_stocks: Optional[int] = None) -> pd.DataFrame:
-        """计算所有股票的所有指标（支持并行处理）"""
-        stocks = self.get_available_stocks()
-        
-        if max_stocks:
-            stocks = stocks[:max_stocks]
+    def calculate_all_indicators(self, max_stocks: Optional[int] = None,
+                                 stocks: Optional[List[str]] = None) -> pd.DataFrame:
+        """计算所有股票（或指定的 stocks）的所有指标（支持并行处理）"""
+        if stocks is None:
+            stocks = self.select_stocks(max_stocks)
+        else:
+            stocks = list(stocks)[:max_stocks or None]
         
         if not stocks:
             logger.error("没有找到可用的股票数据")
@@ -1857,307 +2181,191 @@ class QlibIndicatorsEnhancedCalculator:
         start_time = time.time()
         
         if self.enable_parallel and len(stocks) > 1:
-            return self._calculate_all_stocks_parallel(stocks)
+            results_df = self._calculate_all_stocks_parallel(stocks)
         else:
-            return self._calculate_all_stocks_sequential(stocks)
+            results_df = self._calculate_all_stocks_sequential(stocks)
+        # 合并之后再把蜡烛图形态转换为稀疏列（未启用时原样返回）
+        return self.dtype_policy.sparsify(results_df)
     
-    def _calculate_all_stocks_parallel(self, stocks: List[str]) -> pd.DataFrame:
-        """并行计算多只股票的指标"""
-        logger.info(f"使用并行模式计算 {len(stocks)} 只股票 (最大线程数: {self.max_workers})")
+    def _process_worker_config(self) -> dict:
+        """工作进程重建计算器所需的参数（只传路径，由子进程自行读取数据）"""
+        return {
+            'data_dir': str(self.data_dir),
+            'financial_data_dir': str(self.financial_data_dir) if self.financial_data_dir else None,
+            'max_workers': 1,
+            'enable_parallel': False,
+            'warmup_days': self.warmup_days,
+            'cache_dir': str(self.cache.cache_dir) if self.cache is not None else None,
+            'cache_max_size_mb': self.cache.max_size_bytes / 1024 / 1024 if self.cache is not None else 2048,
+            'indicators': self.indicators,
+            'financial_cache_size': self.financial_store.max_cached_frames,
+            'price_dtype': self.dtype_policy.price_dtype.name,
+            'ratio_dtype': self.dtype_policy.ratio_dtype.name,
+            'timing_report': self.timing_report,
+            'profile_sample': self.profile_sample,
+            'kernel_backend': self.kernels.name,
+        }
+    
+    def _create_stock_executor(self):
+        """按执行器类型创建股票级线程池或进程池，返回 (executor, 提交函数)"""
+        if self.executor == 'process':
+            executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_process_worker,
+                initargs=(self._process_worker_config(), sorted(self.profiler.profile_symbols),
+                          self.profiler.trace_memory)
+            )
+            return executor, lambda *args: executor.submit(_calculate_stock_in_process, *args, time.time())
         
-        all_results = []
-        success_count = 0
-        failed_stocks = []
-        start_time = time.time()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return executor, lambda *args: executor.submit(self._compute_indicators_for_stock, *args, time.time())
+    
+    def _iter_stock_results(self, stocks: List[str], watermarks: Optional[Dict[str, Tuple[pd.Timestamp, Dict[str, float]]]] = None):
+        """
+        逐只股票产出 (symbol, 结果DataFrame或None)，启用检查点时记录每只股票的结果
+        
+        续算 (--resume) 时已完成且输入未变化的股票直接读取检查点，其余股票重新计算
+        """
+        checkpoint = self.checkpoint
+        if checkpoint is None or watermarks:
+            yield from self._compute_stock_results(stocks, watermarks)
+            return
+        
+        fingerprints = {symbol: self.stock_fingerprint(symbol) for symbol in stocks}
+        pending = []
+        for symbol in stocks:
+            result = checkpoint.load(symbol, fingerprints[symbol])
+            if result is None:
+                pending.append(symbol)
+                continue
+            yield symbol, result
+        if checkpoint.reused:
+            logger.info(f"♻️ 从检查点恢复 {checkpoint.reused} 只股票，剩余 {len(pending)} 只需要计算")
+        if not pending:
+            return
+        
+        for symbol, result in self._compute_stock_results(pending):
+            checkpoint.save(symbol, fingerprints[symbol], result)
+            yield symbol, result
+    
+    def _compute_stock_results(self, stocks: List[str], watermarks: Optional[Dict[str, Tuple[pd.Timestamp, Dict[str, float]]]] = None):
+        """
+        逐只股票产出 (symbol, 结果DataFrame或None)
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交所有股票的计算任务
-            future_to_symbol = {
-                executor.submit(self.calculate_all_indicators_for_stock, symbol): symbol 
-                for symbol in stocks
-            }
+        并行模式下按完成顺序产出，调用方可以在每只股票算完后立即处理（如流式写盘）。
+        给定 watermarks ({symbol: (水位线, 累积指标取值)}) 时按股票的水位线做增量计算。
+        """
+        watermarks = watermarks or {}
+        if self.profile_sample:
+            self.profiler.profile_symbols = set(sample_symbols(stocks, self.profile_sample))
+            logger.info(f"🔬 性能剖析的抽样股票: {sorted(self.profiler.profile_symbols)}")
+        if self.engine == 'panel':
+            if not watermarks:
+                # 面板引擎一次读入全部股票计算，不经过单只股票的指标缓存
+                yield from PanelIndicatorEngine(self, self.panel_chunk_size).iter_stock_results(stocks)
+                return
+            logger.info("增量模式按股票读取各自的预热窗口，改用逐只股票计算")
+        
+        if not (self.enable_parallel and len(stocks) > 1):
+            for i, symbol in enumerate(stocks, 1):
+                logger.info(f"📈 处理第 {i}/{len(stocks)} 只股票: {symbol}")
+                yield symbol, self.calculate_all_indicators_for_stock(symbol, *watermarks.get(symbol, ()))
+            return
+        
+        # 输入未变化（命中缓存）的股票直接产出，不再提交计算任务
+        pending = []
+        completed = 0
+        for symbol in stocks:
+            watermark, anchors = watermarks.get(symbol, (None, None))
+            cache_key = None
+            if self.cache is not None and watermark is None:
+                cache_key = self.stock_fingerprint(symbol)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    completed += 1
+                    logger.info(f"🗄️ 进度 {completed}/{len(stocks)}: {symbol} 命中指标缓存")
+                    yield symbol, cached
+                    continue
+            pending.append((symbol, watermark, anchors, cache_key))
+        
+        if not pending:
+            return
+        
+        executor, submit = self._create_stock_executor()
+        with executor:
+            # 提交需要计算的股票
+            future_to_symbol = {submit(*task): task[0] for task in pending}
             
-            # 收集结果（带进度显示）
-            completed = 0
             for future in as_completed(future_to_symbol):
                 symbol = future_to_symbol[future]
                 completed += 1
                 
                 try:
                     result = future.result(timeout=600)  # 10分钟超时
-                    if result is not None:
-                        all_results.append(result)
-                        success_count += 1
+                    if isinstance(result, StockResultBuffers):
+                        self.profiler.extend(result.timings)
+                        result = result.to_frame()
+                    if result is not None and result.empty:
+                        logger.info(f"✅ 进度 {completed}/{len(stocks)}: {symbol} 已是最新")
+                    elif result is not None:
                         logger.info(f"✅ 进度 {completed}/{len(stocks)}: {symbol} 计算完成 ({len(result.columns)-1} 个指标)")
                     else:
-                        failed_stocks.append(symbol)
                         logger.warning(f"⚠️ 进度 {completed}/{len(stocks)}: {symbol} 计算结果为空")
-                        
+                except MemoryError:
+                    raise
                 except Exception as e:
-                    failed_stocks.append(symbol)
+                    result = None
                     logger.error(f"❌ 进度 {completed}/{len(stocks)}: {symbol} 计算失败 - {e}")
+                
+                yield symbol, result
+        
+        if self.cache is not None and self.executor == 'process':
+            # 工作进程各自写入缓存，结束后统一按预算淘汰
+            self.cache.enforce_budget()
+    
+    def _calculate_all_stocks_parallel(self, stocks: List[str]) -> pd.DataFrame:
+        """并行计算多只股票的指标"""
+        logger.info(f"使用并行模式计算 {len(stocks)} 只股票 (执行器: {self.executor}, 最大并发数: {self.max_workers})")
+        
+        assembler = ResultAssembler()
+        success_count = 0
+        failed_stocks = []
+        start_time = time.time()
+        
+        # 收集结果（带进度显示），只登记不合并
+        for symbol, result in self._iter_stock_results(stocks):
+            if result is not None:
+                assembler.add(result)
+                success_count += 1
+            else:
+                failed_stocks.append(symbol)
         
         elapsed_time = time.time() - start_time
         
         if failed_stocks:
             logger.warning(f"计算失败的股票 ({len(failed_stocks)}): {failed_stocks[:5]}{'...' if len(failed_stocks) > 5 else ''}")
         
-        if all_results:
-            try:
-                # 数据合并前的预处理和检查
-                logger.info("开始合并多只股票的计算结果...")
-                
-                # 强化的DataFrame清理和标准化
-                logger.info("开始强化的DataFrame清理和标准化...")
-                
-                # 第一步：初步清理和验证
-                valid_dfs = []
-                for i, df in enumerate(all_results):
-                    if df is None or df.empty:
-                        logger.warning(f"跳过空的DataFrame (索引: {i})")
-                        continue
-                    
-                    # 完全重置索引，确保为连续数字索引
-                    df_clean = df.copy()
-                    df_clean = df_clean.reset_index(drop=True)
-                    
-                    # 检查索引唯一性
-                    if df_clean.index.has_duplicates:
-                        logger.warning(f"DataFrame {i} 存在重复索引，进行去重")
-                        df_clean = df_clean.loc[~df_clean.index.duplicated(keep='first')]
-                        df_clean = df_clean.reset_index(drop=True)
-                    
-                    valid_dfs.append((i, df_clean))
-                
-                if not valid_dfs:
-                    logger.error("❌ 没有有效的计算结果可以处理")
-                    return pd.DataFrame()
-                
-                # 第二步：统一列结构
-                logger.info(f"统一 {len(valid_dfs)} 个DataFrame的列结构...")
-                
-                # 获取所有唯一的列名
-                all_columns = set()
-                for _, df in valid_dfs:
-                    all_columns.update(df.columns)
-                
-                all_columns = sorted(list(all_columns))
-                logger.info(f"发现 {len(all_columns)} 个唯一列")
-                
-                # 使用简单安全的合并方法
-                cleaned_results = []
-                for i, df in valid_dfs:
-                    try:
-                        # 简单复制和重置索引
-                        clean_df = df.copy()
-                        clean_df = clean_df.reset_index(drop=True)
-                        
-                        # 确保所有列都是数值类型或字符串，但保护重要的字符串列和日期列
-                        # 需要保护的字符串列和日期列
-                        protected_cols = ['Symbol', 'Ticker', 'Name', 'ENName', 'Code', 'Date']
-                        
-                        for col in clean_df.columns:
-                            try:
-                                # 跳过重要的字符串列和日期列，不进行数值转换
-                                if col in protected_cols:
-                                    continue
-                                    
-                                # 尝试转换为数值，如果失败就保持原样
-                                if clean_df[col].dtype == 'object':
-                                    try:
-                                        clean_df[col] = pd.to_numeric(clean_df[col], errors='coerce')
-                                    except:
-                                        pass
-                            except:
-                                pass
-                        
-                        cleaned_results.append(clean_df)
-                        logger.debug(f"✅ 成功清理DataFrame {i}")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ 清理DataFrame {i} 时发生错误: {e}")
-                        continue
-                
-                if not cleaned_results:
-                    logger.error("❌ 没有有效的计算结果可以合并")
-                    return pd.DataFrame()
-                
-                # 安全合并DataFrame - 使用更保守的方法
-                logger.info(f"正在合并 {len(cleaned_results)} 个有效结果...")
-                try:
-                    # 逐个合并，避免列不匹配的问题
-                    combined_df = None
-                    for i, df in enumerate(cleaned_results):
-                        if combined_df is None:
-                            combined_df = df.copy()
-                        else:
-                            # 使用outer join确保所有列都被保留
-                            combined_df = pd.concat([combined_df, df], ignore_index=True, sort=False)
-                        logger.debug(f"合并第 {i+1}/{len(cleaned_results)} 个DataFrame")
-                    
-                    if combined_df is None or combined_df.empty:
-                        logger.error("❌ 合并后的DataFrame为空")
-                        return pd.DataFrame()
-                    
-                except Exception as merge_error:
-                    logger.error(f"❌ DataFrame合并失败: {merge_error}")
-                    # 降级到最简单的方法
-                    logger.info("尝试使用最简单的合并方法...")
-                    try:
-                        # 只保留列数最少的DataFrame的列
-                        min_cols = min(len(df.columns) for df in cleaned_results)
-                        logger.info(f"使用最小列数: {min_cols}")
-                        
-                        # 找到有最小列数的第一个DataFrame作为模板
-                        template_df = next(df for df in cleaned_results if len(df.columns) == min_cols)
-                        template_cols = template_df.columns.tolist()
-                        
-                        # 只保留公共列进行合并
-                        aligned_dfs = []
-                        for df in cleaned_results:
-                            aligned_df = df[template_cols].copy()
-                            aligned_dfs.append(aligned_df)
-                        
-                        combined_df = pd.concat(aligned_dfs, ignore_index=True)
-                        logger.info(f"✅ 简化合并成功，保留 {len(template_cols)} 列")
-                        
-                    except Exception as e2:
-                        logger.error(f"❌ 简化合并也失败: {e2}")
-                        return pd.DataFrame()
-                
-                # 验证合并结果
-                if combined_df.empty:
-                    logger.error("❌ 合并后的DataFrame为空")
-                    return pd.DataFrame()
-                
-                # 检查重复行
-                initial_rows = len(combined_df)
-                combined_df = combined_df.drop_duplicates()
-                if len(combined_df) < initial_rows:
-                    logger.info(f"移除了 {initial_rows - len(combined_df)} 行重复数据")
-                
-                logger.info(f"✅ 并行计算完成: {success_count}/{len(stocks)} 只股票成功 (耗时: {elapsed_time:.2f}s)")
-                # 计算指标数量：总列数减去Date和Symbol列
-                indicator_count = len(combined_df.columns) - (2 if 'Date' in combined_df.columns else 1)
-                logger.info(f"📊 总指标数量: {indicator_count}")
-                logger.info(f"📈 总数据行数: {len(combined_df)}")
-                logger.info(f"⚡ 平均每只股票耗时: {elapsed_time/len(stocks):.2f}s")
-                return combined_df
-                
-            except Exception as e:
-                logger.error(f"❌ 合并计算结果时发生错误: {e}")
-                logger.error(f"尝试降级为简单合并...")
-                
-                # 降级方案：最安全的逐个合并
-                try:
-                    logger.info("使用最安全的逐个合并方案...")
-                    
-                    # 只保留非空的结果
-                    valid_results = [df for df in all_results if df is not None and not df.empty]
-                    
-                    if not valid_results:
-                        logger.error("❌ 没有有效的计算结果")
-                        return pd.DataFrame()
-                    
-                    logger.info(f"开始逐个合并 {len(valid_results)} 个DataFrame...")
-                    
-                    # 逐个安全合并
-                    combined_df = None
-                    successful_merges = 0
-                    
-                    for i, df in enumerate(valid_results):
-                        try:
-                            # 彻底清理单个DataFrame
-                            clean_df = df.copy()
-                            clean_df = clean_df.reset_index(drop=True)
-                            
-                            # 确保列名为字符串
-                            clean_df.columns = [str(col) for col in clean_df.columns]
-                            
-                            # 去除任何可能的重复索引
-                            if clean_df.index.has_duplicates:
-                                clean_df = clean_df.loc[~clean_df.index.duplicated(keep='first')]
-                                clean_df = clean_df.reset_index(drop=True)
-                            
-                            # 转换为字典再转回DataFrame（最彻底的清理）
-                            # 保护重要的字符串列和日期列
-                            protected_cols = ['Symbol', 'Ticker', 'Name', 'ENName', 'Code', 'Date']
-                            data_dict = {}
-                            for col in clean_df.columns:
-                                try:
-                                    if col in protected_cols:
-                                        # 对于重要的字符串列和日期列，直接保留原值
-                                        data_dict[col] = clean_df[col].tolist()
-                                    else:
-                                        data_dict[col] = clean_df[col].values.tolist()
-                                except:
-                                    if col in protected_cols:
-                                        # 对于重要列，尝试保留原值而不是设为NaN
-                                        try:
-                                            data_dict[col] = clean_df[col].astype(str).tolist()
-                                        except:
-                                            data_dict[col] = [''] * len(clean_df)
-                                    else:
-                                        data_dict[col] = [np.nan] * len(clean_df)
-                            
-                            clean_df = pd.DataFrame(data_dict)
-                            
-                            if combined_df is None:
-                                combined_df = clean_df
-                            else:
-                                # 逐个添加行
-                                combined_df = pd.concat([combined_df, clean_df], ignore_index=True, sort=False)
-                            
-                            successful_merges += 1
-                            logger.debug(f"成功合并第 {i+1} 个DataFrame")
-                            
-                        except Exception as merge_error:
-                            logger.warning(f"跳过第 {i+1} 个DataFrame，合并失败: {merge_error}")
-                            continue
-                    
-                    if combined_df is not None and not combined_df.empty:
-                        logger.info(f"✅ 降级合并成功: {successful_merges}/{len(valid_results)} 个结果")
-                        # 计算指标数量：总列数减去Date和Symbol列
-                        indicator_count = len(combined_df.columns) - (2 if 'Date' in combined_df.columns else 1)
-                        logger.info(f"📊 总指标数量: {indicator_count}")
-                        logger.info(f"📈 总数据行数: {len(combined_df)}")
-                        return combined_df
-                    else:
-                        logger.error("❌ 降级合并后结果为空")
-                        return pd.DataFrame()
-                    
-                except Exception as e2:
-                    logger.error(f"❌ 降级合并也失败: {e2}")
-                    # 最后的备用方案：保存单个最大的结果
-                    try:
-                        if all_results:
-                            largest_df = max(all_results, key=lambda x: len(x) if x is not None else 0)
-                            if largest_df is not None and not largest_df.empty:
-                                result_df = largest_df.copy().reset_index(drop=True)
-                                logger.warning(f"⚠️ 使用最大的单个结果: {len(result_df)} 行")
-                                return result_df
-                    except:
-                        pass
-                    return pd.DataFrame()
-        else:
-            logger.error("❌ 没有成功计算任何股票的指标")
-            return pd.DataFrame()
+        combined_df = self._assemble_results(assembler)
+        if combined_df.empty:
+            return combined_df
+        
+        logger.info(f"✅ 并行计算完成: {success_count}/{len(stocks)} 只股票成功 (耗时: {elapsed_time:.2f}s)")
+        self._log_combined_summary(combined_df)
+        logger.info(f"⚡ 平均每只股票耗时: {elapsed_time/len(stocks):.2f}s")
+        return combined_df
     
     def _calculate_all_stocks_sequential(self, stocks: List[str]) -> pd.DataFrame:
         """顺序计算多只股票的指标"""
         logger.info(f"使用顺序模式计算 {len(stocks)} 只股票")
         
-        all_results = []
+        assembler = ResultAssembler()
         success_count = 0
         start_time = time.time()
         
-        for i, symbol in enumerate(stocks, 1):
-            stock_start_time = time.time()
-            logger.info(f"📈 处理第 {i}/{len(stocks)} 只股票: {symbol}")
-            
-            result = self.calculate_all_indicators_for_stock(symbol)
+        stock_start_time = time.time()
+        for symbol, result in self._iter_stock_results(stocks):
             if result is not None:
-                all_results.append(result)
+                assembler.add(result)
                 success_count += 1
                 stock_elapsed = time.time() - stock_start_time
                 # 计算指标数量：总列数减去Date和Symbol列
@@ -2165,83 +2373,78 @@ class QlibIndicatorsEnhancedCalculator:
                 logger.info(f"✅ {symbol}: 完成 {indicator_count} 个指标 (耗时: {stock_elapsed:.2f}s)")
             else:
                 logger.warning(f"⚠️ {symbol}: 计算失败")
+            stock_start_time = time.time()
         
         elapsed_time = time.time() - start_time
         
-        if all_results:
-            try:
-                # 数据合并前的预处理和检查
-                logger.info("开始合并多只股票的计算结果...")
-                
-                # 重置所有DataFrame的索引以避免冲突
-                cleaned_results = []
-                for i, df in enumerate(all_results):
-                    if df is None or df.empty:
-                        logger.warning(f"跳过空的DataFrame (索引: {i})")
-                        continue
-                    cleaned_results.append(df.reset_index(drop=True))
-                
-                if not cleaned_results:
-                    logger.error("❌ 没有有效的计算结果可以合并")
-                    return pd.DataFrame()
-                
-                # 安全合并DataFrame
-                combined_df = pd.concat(cleaned_results, ignore_index=True, sort=False)
-                
-                # 检查重复行
-                initial_rows = len(combined_df)
-                combined_df = combined_df.drop_duplicates()
-                if len(combined_df) < initial_rows:
-                    logger.info(f"移除了 {initial_rows - len(combined_df)} 行重复数据")
-                
-                logger.info(f"✅ 顺序计算完成: {success_count}/{len(stocks)} 只股票成功 (总耗时: {elapsed_time:.2f}s)")
-                # 计算指标数量：总列数减去Date和Symbol列
-                indicator_count = len(combined_df.columns) - (2 if 'Date' in combined_df.columns else 1)
-                logger.info(f"📊 总指标数量: {indicator_count}")
-                logger.info(f"📈 总数据行数: {len(combined_df)}")
-                logger.info(f"⏱️ 平均每只股票耗时: {elapsed_time/len(stocks):.2f}s")
-                return combined_df
-                
-            except Exception as e:
-                logger.error(f"❌ 顺序计算合并结果时发生错误: {e}")
-                return pd.DataFrame()
-        else:
+        combined_df = self._assemble_results(assembler)
+        if combined_df.empty:
+            return combined_df
+        
+        logger.info(f"✅ 顺序计算完成: {success_count}/{len(stocks)} 只股票成功 (总耗时: {elapsed_time:.2f}s)")
+        self._log_combined_summary(combined_df)
+        logger.info(f"⏱️ 平均每只股票耗时: {elapsed_time/len(stocks):.2f}s")
+        return combined_df
+    
+    def _assemble_results(self, assembler: ResultAssembler) -> pd.DataFrame:
+        """单次拼接所有股票的结果（按 Symbol/Date 去重），失败或为空时返回空DataFrame"""
+        if not len(assembler):
             logger.error("❌ 没有成功计算任何股票的指标")
             return pd.DataFrame()
+        
+        logger.info(f"开始合并 {len(assembler)} 只股票的计算结果 ({len(assembler.columns)} 列, {assembler.n_rows} 行)...")
+        try:
+            with self.profiler.measure('merge'):
+                return assembler.assemble()
+        except MemoryError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ 合并计算结果时发生错误: {e}")
+            return pd.DataFrame()
     
-    def save_results(self, df: pd.DataFrame, filename: str = "enhanced_quantitative_indicators.csv") -> str:
-        """保存结果到CSV文件，包含中文标签行，空值使用空字符串（兼容SAS）"""
+    @staticmethod
+    def _log_combined_summary(combined_df: pd.DataFrame):
+        # 计算指标数量：总列数减去Date和Symbol列
+        indicator_count = len(combined_df.columns) - (2 if 'Date' in combined_df.columns else 1)
+        logger.info(f"📊 总指标数量: {indicator_count}")
+        logger.info(f"📈 总数据行数: {len(combined_df)}")
+    
+    def save_results(self, df: pd.DataFrame, filename: str = "enhanced_quantitative_indicators.csv",
+                     output_format: str = 'csv', partition_by: Optional[str] = None) -> str:
+        """
+        保存结果
+        
+        - csv: 包含中文标签行，空值使用空字符串（兼容SAS）
+        - parquet/feather: 列式存储，可按股票或年份分区，中文标签保存在schema元数据中
+        """
         if df.empty:
             logger.warning("DataFrame为空，无法保存")
             return ""
         
         try:
             output_path = self.output_dir / filename
+            df = densify(df)
             
             # 获取列名和中文标签
             columns = df.columns.tolist()
             chinese_labels = self.get_field_labels(columns)
             
-            # 处理空值：将NaN替换为空字符串，以兼容SAS
-            df_clean = df.copy()
-            df_clean = df_clean.fillna('')  # 将NaN值替换为空字符串
+            if output_format != 'csv':
+                output_path = write_columnar_results(
+                    df, output_path, output_format,
+                    labels=dict(zip(columns, chinese_labels)),
+                    partition_by=partition_by
+                )
+                logger.info(f"结果已保存到: {output_path}")
+                logger.info(f"数据形状: {df.shape}")
+                logger.info(f"输出格式: {output_format}，分区方式: {partition_by or 'none'}，中文标签保存在schema元数据 field_labels 中")
+                return str(output_path)
             
             logger.info("📝 空值处理: 将NaN值替换为空字符串以兼容SAS")
             
-            # 使用手动方式写入CSV文件以包含中文标签行
-            with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-                import csv
-                writer = csv.writer(f)
-                
-                # 第一行：字段名（英文列名）
-                writer.writerow(columns)
-                
-                # 第二行：中文标签
-                writer.writerow(chinese_labels)
-                
-                # 第三行开始：具体数据
-                for _, row in df_clean.iterrows():
-                    writer.writerow(row.values)
+            # 分块写入：字段名行 + 中文标签行 + 数据行（NaN写为空字符串）
+            with StreamingCSVWriter(output_path, columns, chinese_labels) as writer:
+                writer.write(df)
             
             logger.info(f"结果已保存到: {output_path}")
             logger.info(f"数据形状: {df.shape}")
@@ -2261,17 +2464,168 @@ class QlibIndicatorsEnhancedCalculator:
             logger.error(f"保存结果失败: {e}")
             return ""
     
-    def run(self, max_stocks: Optional[int] = None, output_filename: str = "enhanced_quantitative_indicators.csv"):
+    def calculate_and_stream_results(self, max_stocks: Optional[int] = None,
+                                     filename: str = "enhanced_quantitative_indicators.csv") -> str:
+        """
+        流式计算并保存：每只股票算完立即写入CSV，不在内存中合并全部结果
+        
+        表头（字段名 + 中文标签）在计算前由指标计划确定，包含计划中的全部列；
+        某只股票没有的列（如历史太短无法计算的指标族）留空。
+        """
+        stocks = self.select_stocks(max_stocks)
+        
+        if not stocks:
+            logger.error("没有找到可用的股票数据")
+            return ""
+        
+        output_path = self.output_dir / filename
+        logger.info(f"开始流式计算 {len(stocks)} 只股票的指标，结果实时写入: {output_path}")
+        
+        columns = self.output_columns()
+        writer = None
+        success_count = 0
+        failed_stocks = []
+        try:
+            for symbol, result in self._iter_stock_results(stocks):
+                if result is None:
+                    failed_stocks.append(symbol)
+                    continue
+                if result.empty:
+                    continue
+                
+                if writer is None:
+                    writer = StreamingCSVWriter(output_path, columns, self.get_field_labels(columns)).open()
+                with self.profiler.measure('save', symbol):
+                    writer.write(drop_duplicate_keys(result))
+                success_count += 1
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        if failed_stocks:
+            logger.warning(f"计算失败的股票 ({len(failed_stocks)}): {failed_stocks[:5]}{'...' if len(failed_stocks) > 5 else ''}")
+        
+        if writer is None:
+            logger.error("❌ 没有成功计算任何股票的指标")
+            return ""
+        
+        logger.info(f"✅ 流式计算完成: {success_count}/{len(stocks)} 只股票成功")
+        logger.info(f"📈 总数据行数: {writer.rows_written}")
+        logger.info(f"结果已保存到: {output_path}")
+        return str(output_path)
+    
+    def update_results_incrementally(self, max_stocks: Optional[int] = None,
+                                     filename: str = "enhanced_quantitative_indicators.csv",
+                                     output_format: str = 'csv', partition_by: Optional[str] = None) -> str:
+        """
+        增量更新上一次的输出：按每只股票的水位线（已输出的最新日期）只计算并追加新的交易日
+        
+        每只股票只读取水位线前 warmup_days 个交易日作为预热窗口；上一次的输出不存在时执行全量计算。
+        """
+        output_path = resolve_output_path(self.output_dir / filename, output_format, partition_by)
+        if not output_path.exists():
+            logger.warning(f"未找到上一次的输出 {output_path}，执行全量计算")
+            results_df = self.calculate_all_indicators(max_stocks=max_stocks)
+            if results_df.empty:
+                return ""
+            return self.save_results(results_df, filename, output_format, partition_by)
+        
+        latest_rows = read_watermarks(output_path, output_format, self.ANCHORED_COLUMNS)
+        anchor_columns = [c for c in latest_rows.columns if c != 'Date']
+        watermarks = {
+            symbol: (row['Date'], {column: row[column] for column in anchor_columns})
+            for symbol, row in latest_rows.iterrows()
+        }
+        logger.info(f"读取到 {len(watermarks)} 只股票的水位线，预热窗口: {self.warmup_days} 个交易日")
+        
+        stocks = self.select_stocks(max_stocks)
+        
+        if not stocks:
+            logger.error("没有找到可用的股票数据")
+            return ""
+        
+        updated_count = 0
+        new_rows = 0
+        new_results = []
+        failed_stocks = []
+        writer = StreamingCSVWriter(output_path, append=True).open() if output_format == 'csv' else None
+        try:
+            for symbol, result in self._iter_stock_results(stocks, watermarks):
+                if result is None:
+                    failed_stocks.append(symbol)
+                    continue
+                if result.empty:
+                    continue
+                
+                updated_count += 1
+                new_rows += len(result)
+                if writer is not None:
+                    # CSV直接在文件末尾追加新行
+                    writer.write(result)
+                else:
+                    new_results.append(result)
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        if new_results:
+            # 列式文件无法原地追加：读取已有结果，合并新行后重写
+            previous = read_columnar_results(output_path, output_format)
+            columns = list(dict.fromkeys([*new_results[0].columns, *previous.columns]))
+            assembler = ResultAssembler()
+            for frame in [previous, *new_results]:
+                assembler.add(frame)
+            combined = assembler.assemble(deduplicate=False)[columns]
+            self.save_results(combined, filename, output_format, partition_by)
+        
+        if failed_stocks:
+            logger.warning(f"计算失败的股票 ({len(failed_stocks)}): {failed_stocks[:5]}{'...' if len(failed_stocks) > 5 else ''}")
+        logger.info(f"✅ 增量更新完成: {updated_count}/{len(stocks)} 只股票有新数据，新增 {new_rows} 行")
+        return str(output_path)
+    
+    def run(self, max_stocks: Optional[int] = None, output_filename: str = "enhanced_quantitative_indicators.csv",
+            stream_output: bool = False, output_format: str = 'csv', partition_by: Optional[str] = None,
+            incremental: bool = False):
         """运行完整的指标计算流程"""
         logger.info("=" * 80)
         logger.info("🚀 开始运行增强版Qlib指标计算器")
         logger.info(f"⚙️ 多线程模式: {'启用' if self.enable_parallel else '禁用'}")
         if self.enable_parallel:
-            logger.info(f"🧵 最大线程数: {self.max_workers}")
+            logger.info(f"🧵 执行器: {self.executor}, 最大并发数: {self.max_workers}")
         logger.info("=" * 80)
         
         start_time = time.time()
         
+        if self.num_shards > 1:
+            output_filename = shard_output_path(output_filename, self.num_shards, self.shard_index).name
+        
+        if incremental:
+            output_path = self.update_results_incrementally(max_stocks, output_filename, output_format, partition_by)
+            total_elapsed = time.time() - start_time
+            if output_path:
+                self._write_shard_sidecar(output_path, output_format)
+                logger.info(f"✅ 增量更新完成！总耗时: {total_elapsed:.2f} 秒，结果保存至: {output_path}")
+            else:
+                logger.error(f"❌ 增量更新失败 (耗时: {total_elapsed:.2f}s)")
+            self._write_timing_report(output_filename)
+            return
+        
+        if self.checkpoint_enabled:
+            self._open_checkpoint(output_filename)
+        
+        if stream_output:
+            output_path = self.calculate_and_stream_results(max_stocks=max_stocks, filename=output_filename)
+            total_elapsed = time.time() - start_time
+            if output_path:
+                self._finish_checkpoint()
+                self._write_shard_sidecar(output_path, output_format)
+                logger.info(f"✅ 指标计算完成！总耗时: {total_elapsed:.2f} 秒，结果保存至: {output_path}")
+            else:
+                logger.error(f"❌ 指标计算失败，没有生成任何结果 (耗时: {total_elapsed:.2f}s)")
+            self._log_cache_stats()
+            self._write_timing_report(output_filename)
+            return
+        
         # 计算指标
         results_df = self.calculate_all_indicators(max_stocks=max_stocks)
         
@@ -2279,7 +2633,11 @@ class QlibIndicatorsEnhancedCalculator:
         
         if not results_df.empty:
             # 保存结果
-            output_path = self.save_results(results_df, output_filename)
+            with self.profiler.measure('save'):
+                output_path = self.save_results(results_df, output_filename, output_format, partition_by)
+            if output_path:
+                self._finish_checkpoint()
+                self._write_shard_sidecar(output_path, output_format, rows=len(results_df))
             
             logger.info("=" * 80)
             logger.info("✅ 指标计算完成！")
@@ -2289,12 +2647,53 @@ class QlibIndicatorsEnhancedCalculator:
             logger.info(f"📈 包含 {results_df['Symbol'].nunique()} 只股票")
             logger.info(f"⏱️ 总耗时: {total_elapsed:.2f} 秒")
             logger.info(f"💾 结果保存至: {output_path}")
+            self._log_cache_stats()
             logger.info("=" * 80)
             
             # 显示指标统计
             self._show_indicators_summary(results_df)
         else:
             logger.error(f"❌ 指标计算失败，没有生成任何结果 (耗时: {total_elapsed:.2f}s)")
+        self._write_timing_report(output_filename)
+    
+    def _open_checkpoint(self, output_filename: str):
+        """在输出文件旁创建运行清单 (<输出文件名>_manifest.sqlite) 与逐只股票的结果目录 (<输出文件名>_checkpoint/)"""
+        stem = Path(output_filename).stem
+        self.checkpoint = RunCheckpoint(
+            self.output_dir / f"{stem}{MANIFEST_SUFFIX}", self.output_dir / f"{stem}_checkpoint", resume=self.resume
+        )
+        logger.info(f"📝 运行清单: {self.checkpoint.manifest.path}")
+    
+    def _finish_checkpoint(self):
+        """输出写出成功后删除逐只股票的检查点文件（清单保留）"""
+        if self.checkpoint is None:
+            return
+        counts = self.checkpoint.manifest.summary()
+        if counts['failed']:
+            logger.warning(f"⚠️ {counts['failed']} 只股票计算失败，可用 --resume 只重新计算这些股票")
+        # 有失败的股票时保留检查点文件，续算时只重新计算失败的股票
+        self.checkpoint.finish(keep_units=bool(counts['failed']))
+        self.checkpoint = None
+    
+    def _write_shard_sidecar(self, output_path: str, output_format: str, rows: Optional[int] = None):
+        """分片运行成功后在输出旁写出分片记录，供 merge-shards 校验与合并"""
+        if self.num_shards == 1:
+            return
+        # CSV 的第二行是中文标签行
+        header_rows = 2 if output_format == 'csv' else 1
+        path = write_shard_sidecar(output_path, self.num_shards, self.shard_index, self.shard_strategy,
+                                   self.shard_universe, self.shard_stocks, header_rows, rows)
+        logger.info(f"🧩 分片记录: {path}")
+    
+    def _write_timing_report(self, output_filename: str):
+        """输出分阶段计时汇总，并把明细写在输出文件旁边（<输出文件名>_timings.json/csv）"""
+        if not self.profiler.enabled:
+            return
+        self.profiler.log_summary()
+        report_path = self.output_dir / f"{Path(output_filename).stem}_timings"
+        report_path = self.profiler.write_report(report_path, self.timing_report)
+        self.profiler.close()
+        logger.info(f"⏱️ 计时报告已保存到: {report_path}")
     
     def _show_indicators_summary(self, df: pd.DataFrame):
         """显示指标统计摘要"""
@@ -2318,8 +2717,219 @@ class QlibIndicatorsEnhancedCalculator:
         logger.info(f"总计: {alpha158_count + alpha360_count + technical_count + candlestick_count + financial_count + volatility_count} 个")
 
 
+class StockResultBuffers:
+    """
+    单只股票计算结果的缓冲区形式，用于进程间传输
+    
+    按 dtype 把数值列合并成二维 NumPy 数组（pickle 协议5按原始缓冲区传输），
+    避免逐列序列化 DataFrame；Date 以 int64 纳秒传输，Symbol 只传一次。
+    """
+    
+    def __init__(self, frame: pd.DataFrame):
+        self.columns = list(frame.columns)
+        self.n_rows = len(frame)
+        self.symbol = None
+        self.dates = None
+        self.blocks = []
+        self.objects = {}
+        # 工作进程中记录的分阶段计时，随结果传回主进程
+        self.timings = []
+        
+        grouped = {}
+        for position, column in enumerate(self.columns):
+            series = frame.iloc[:, position]
+            if column == 'Symbol' and series.nunique(dropna=False) <= 1:
+                self.symbol = series.iloc[0] if self.n_rows else None
+            elif column == 'Date' and pd.api.types.is_datetime64_any_dtype(series):
+                self.dates = series.values.astype('datetime64[ns]').view(np.int64)
+            elif series.dtype.kind in 'biuf':
+                grouped.setdefault(series.dtype.str, []).append(position)
+            else:
+                self.objects[position] = series.values
+        
+        for dtype, positions in grouped.items():
+            block = np.ascontiguousarray(frame.iloc[:, positions].to_numpy(dtype=dtype))
+            self.blocks.append((positions, block))
+    
+    def to_frame(self) -> pd.DataFrame:
+        """还原为与原结果列顺序、dtype 一致的 DataFrame"""
+        arrays = dict(self.objects)
+        for positions, block in self.blocks:
+            for j, position in enumerate(positions):
+                arrays[position] = block[:, j]
+        for position, column in enumerate(self.columns):
+            if column == 'Date' and self.dates is not None:
+                arrays[position] = self.dates.view('datetime64[ns]')
+            elif column == 'Symbol' and position not in arrays:
+                arrays[position] = np.full(self.n_rows, self.symbol, dtype=object)
+        
+        frame = pd.DataFrame({position: arrays[position] for position in range(len(self.columns))})
+        frame.columns = self.columns
+        return frame
+
+
+class PricePanel(NamedTuple):
+    """按交易日历对齐的 (日期 × 股票) float32 行情面板，上市区间 [start, end) 之外为NaN"""
+    index: pd.DatetimeIndex
+    symbols: List[str]
+    fields: Dict[str, np.ndarray]
+    start: np.ndarray
+    end: np.ndarray
+
+
+class PanelIndicatorEngine:
+    """
+    截面面板引擎：Alpha158/Alpha360 在 (日期 × 股票) 面板上沿时间轴一次性向量化计算，
+    其余指标族（talib类）仍逐只股票计算，产出与逐只股票计算相同的长格式结果
+    
+    面板按 chunk_size 只股票一组计算，每组只保留覆盖该组上市区间的行；
+    峰值内存主要是一组的Alpha360取值块（行数 × chunk_size × 360 × 4字节）
+    """
+    
+    PANEL_FAMILIES = ('alpha158', 'alpha360')
+    # 与逐只股票计算时Alpha158/Alpha360要求的最少数据量一致
+    MIN_HISTORY_DAYS = 60
+    
+    def __init__(self, calculator: 'QlibIndicatorsEnhancedCalculator', chunk_size: int = 128):
+        self.calculator = calculator
+        self.chunk_size = max(1, int(chunk_size))
+    
+    def load_panel(self, stocks: List[str]) -> Optional[PricePanel]:
+        """
+        读取所有股票的行情并对齐到交易日历，只保留覆盖所有上市区间的行
+        
+        面板按股票连续存放（列优先），每只股票的行情填入面板后立即释放，不同时保留两份完整行情
+        """
+        frames = []
+        for symbol in stocks:
+            price_data = self.calculator.read_qlib_binary_data(symbol)
+            if price_data is None or price_data.empty:
+                logger.warning(f"No price data found for {symbol}")
+                continue
+            frames.append((symbol, price_data))
+        if not frames:
+            return None
+        
+        calendar = self.calculator._get_calendar()
+        if calendar is None:
+            calendar = pd.DatetimeIndex(sorted(set().union(*(price_data.index for _, price_data in frames))))
+        start = calendar.get_indexer([price_data.index[0] for _, price_data in frames])
+        end = start + np.array([len(price_data) for _, price_data in frames])
+        first_row, last_row = start.min(), end.max()
+        index = calendar[first_row:last_row]
+        
+        symbols = [symbol for symbol, _ in frames]
+        fields = {name: np.empty((len(index), len(frames)), dtype=np.float32, order='F')
+                  for name in ('Open', 'High', 'Low', 'Close', 'Volume')}
+        for j in range(len(frames)):
+            price_data = frames[j][1]
+            frames[j] = None
+            rows = slice(start[j] - first_row, end[j] - first_row)
+            for name, values in fields.items():
+                column = values[:, j]
+                column[:] = np.nan
+                if name in price_data.columns:
+                    column[rows] = price_data[name].values
+        
+        logger.info(f"面板: {len(index)} 个交易日 × {len(symbols)} 只股票")
+        return PricePanel(index, symbols, fields, start - first_row, end - first_row)
+    
+    def _chunk_inputs(self, panel: PricePanel, columns: slice):
+        """在一组股票的子面板上计算Alpha158/Alpha360，逐只股票产出 (symbol, 行情, 预先算好的指标族)"""
+        calculator = self.calculator
+        start, end = panel.start[columns], panel.end[columns]
+        first_row, last_row = start.min(), end.max()
+        index = panel.index[first_row:last_row]
+        raw = {name: values[first_row:last_row, columns] for name, values in panel.fields.items()}
+        start, end = start - first_row, end - first_row
+        bars = PanelBars(index, raw, start, end)
+        
+        calculator._reset_indicators_cache()
+        alpha158, alpha158_columns = None, []
+        if calculator.plan.includes('alpha158'):
+            # 堆叠为 (日期 × 股票 × 指标) 数组，每只股票的切片可以一次构造成单个数据块
+            arrays = calculator._alpha158_arrays(bars)
+            alpha158_columns = list(arrays)
+            alpha158 = np.stack([arrays.pop(name) for name in alpha158_columns], axis=-1)
+        alpha360 = calculator._alpha360_block(bars) if calculator.plan.includes('alpha360') else None
+        alpha360_columns = calculator._alpha360_columns()
+        
+        for j, symbol in enumerate(panel.symbols[columns]):
+            rows = slice(start[j], end[j])
+            dates = index[rows]
+            price_data = pd.DataFrame({name: values[rows, j] for name, values in raw.items()}, index=dates)
+            enough_history = len(dates) >= self.MIN_HISTORY_DAYS
+            precomputed = {}
+            if alpha158 is not None:
+                precomputed['alpha158'] = pd.DataFrame(
+                    alpha158[rows, j], index=dates, columns=alpha158_columns
+                ) if enough_history else pd.DataFrame()
+            if alpha360 is not None:
+                precomputed['alpha360'] = pd.DataFrame(
+                    alpha360[rows, j].reshape(len(dates), -1), index=dates, columns=alpha360_columns
+                ) if enough_history else pd.DataFrame()
+            yield symbol, price_data, precomputed
+    
+    def _calculate_stock(self, stock_inputs: Tuple[str, pd.DataFrame, Dict[str, pd.DataFrame]]):
+        """用面板上算好的指标族计算一只股票的其余指标族，返回 (symbol, 结果DataFrame或None)"""
+        symbol, price_data, precomputed = stock_inputs
+        return symbol, self.calculator._calculate_indicators_sequential(symbol, price_data, precomputed)
+    
+    def iter_stock_results(self, stocks: List[str]):
+        """逐只股票产出 (symbol, 结果DataFrame或None)，顺序与 stocks 一致"""
+        panel = self.load_panel(stocks)
+        if panel is None:
+            return
+        
+        calculator = self.calculator
+        for chunk_start in range(0, len(panel.symbols), self.chunk_size):
+            columns = slice(chunk_start, chunk_start + self.chunk_size)
+            chunk_time = time.time()
+            with calculator.profiler.measure('panel'):
+                inputs = list(self._chunk_inputs(panel, columns))
+            if calculator.enable_parallel:
+                # 其余指标族逐只股票在线程池中计算，按输入顺序返回（预先算好的指标族留在主进程中，不使用进程池）
+                with ThreadPoolExecutor(max_workers=calculator.max_workers) as executor:
+                    results = list(executor.map(self._calculate_stock, inputs))
+            else:
+                results = [self._calculate_stock(stock_inputs) for stock_inputs in inputs]
+            results = [(symbol, calculator.dtype_policy.apply(result)) for symbol, result in results]
+            logger.info(f"✅ 面板进度 {min(chunk_start + self.chunk_size, len(panel.symbols))}/{len(panel.symbols)} "
+                        f"(本组耗时: {time.time() - chunk_time:.2f}s)")
+            yield from results
+
+
+# 工作进程内的计算器实例（由进程池 initializer 创建，每个进程一个）
+_worker_calculator = None
+
+
+def _init_process_worker(calculator_kwargs: dict, profile_symbols: List[str] = (), trace_memory: bool = True):
+    """进程池初始化：每个工作进程只构建一次计算器（内存跟踪的开关与主进程一致）"""
+    global _worker_calculator
+    _worker_calculator = QlibIndicatorsEnhancedCalculator(**calculator_kwargs)
+    _worker_calculator.profiler.profile_symbols = set(profile_symbols)
+    if not trace_memory:
+        _worker_calculator.profiler.close()
+
+
+def _calculate_stock_in_process(symbol: str, watermark: Optional[pd.Timestamp] = None,
+                                anchors: Optional[Dict[str, float]] = None,
+                                cache_key: Optional[str] = None,
+                                submitted_at: Optional[float] = None) -> Optional[StockResultBuffers]:
+    """在工作进程中计算单只股票，结果以 NumPy 缓冲区返回（命中缓存的股票已在主进程中跳过）"""
+    result = _worker_calculator._compute_indicators_for_stock(symbol, watermark, anchors, cache_key, submitted_at)
+    if result is None:
+        return None
+    buffers = StockResultBuffers(result)
+    buffers.timings = _worker_calculator.profiler.pop_records(symbol)
+    return buffers
+
+
 def main():
     """主函数"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge-shards':
+        sys.exit(0 if merge_shards_main(sys.argv[2:], prog=f"{Path(sys.argv[0]).name} merge-shards") else 1)
+    
     parser = argparse.ArgumentParser(
         description='增强版Qlib指标计算器 - 集成Alpha158、Alpha360指标体系',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -2343,6 +2953,44 @@ def main():
   # 自定义线程数量
   python qlib_indicators.py --max-workers 16
   
+  # 使用多进程计算（绕开GIL，适合多核机器）
+  python qlib_indicators.py --executor process --max-workers 8
+  
+  # 每只股票算完立即写盘（全市场计算时降低内存峰值）
+  python qlib_indicators.py --stream-output
+  
+  # 输出为按股票分区的Parquet，下游可只读取需要的列
+  python qlib_indicators.py --format parquet --partition-by symbol
+  
+  # 增量更新：只计算上一次输出之后的新交易日并追加
+  python qlib_indicators.py --incremental
+  
+  # 启用指标缓存：行情/财务数据未变化的股票直接复用上次结果
+  python qlib_indicators.py --cache-dir ./indicator_cache --cache-max-size-mb 4096
+  
+  # 只计算选中的指标（指标族名、列名或通配符），中间结果按依赖自动计算
+  python qlib_indicators.py --indicators "ALPHA158_CORR*,RSI_14,candlestick"
+  
+  # 面板引擎：Alpha158/Alpha360 对全部股票按 (日期 × 股票) 面板一次性计算，适合短历史、大量股票
+  python qlib_indicators.py --engine panel --panel-chunk-size 256
+  
+  # 记录各指标族的耗时并对5只抽样股票做 cProfile 剖析
+  python qlib_indicators.py --max-stocks 100 --timing-report json --profile
+  
+  # 把财务数据CSV压缩为每个数据类型一个列式文件，之后的运行以内存映射方式读取
+  python qlib_indicators.py --compact-financial
+  
+  # 长时间运行：每只股票算完即写入检查点，中断后用 --resume 继续
+  python qlib_indicators.py --checkpoint
+  python qlib_indicators.py --resume
+  
+  # 使用 numba 编译的滚动窗口内核（默认 numpy 参考实现）
+  python qlib_indicators.py --kernel-backend numba
+  
+  # 多台机器分片计算（每台机器运行一个分片），全部完成后校验并合并
+  python qlib_indicators.py --num-shards 4 --shard-index 0
+  python qlib_indicators.py merge-shards --output enhanced_quantitative_indicators.csv
+  
   # 调试模式
   python qlib_indicators.py --log-level DEBUG --max-stocks 5
 
@@ -2404,11 +3052,191 @@ def main():
     parser.add_argument(
         '--max-workers',
         type=int,
-        help='最大线程数 (默认: CPU核心数+4，最大32)'
+        help='最大线程/进程数 (默认: 线程模式为CPU核心数+4，最大32；进程模式为CPU核心数)'
+    )
+    
+    parser.add_argument(
+        '--executor',
+        choices=QlibIndicatorsEnhancedCalculator.EXECUTORS,
+        default='thread',
+        help='股票级并行执行器: thread(线程池) 或 process(进程池)'
+    )
+    
+    parser.add_argument(
+        '--stream-output',
+        action='store_true',
+        help='每只股票计算完成后立即写入输出文件，不在内存中合并全部结果（仅支持csv格式）'
+    )
+    
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=OUTPUT_FORMATS,
+        default='csv',
+        help='输出格式: csv(含中文标签行) / parquet / feather'
+    )
+    
+    parser.add_argument(
+        '--partition-by',
+        choices=PARTITION_CHOICES,
+        default='none',
+        help='parquet/feather输出的分区方式: none / symbol(按股票) / year(按年份)'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='增量模式：读取上一次输出中每只股票的最新日期，只计算并追加之后的新交易日'
+    )
+    
+    parser.add_argument(
+        '--warmup-days',
+        type=int,
+        default=QlibIndicatorsEnhancedCalculator.INCREMENTAL_WARMUP_DAYS,
+        help=f'增量模式下每只股票回读的预热交易日数 (默认: {QlibIndicatorsEnhancedCalculator.INCREMENTAL_WARMUP_DAYS})'
+    )
+    
+    parser.add_argument(
+        '--cache-dir',
+        help='单只股票指标结果的缓存目录 (默认不启用缓存)'
+    )
+    
+    parser.add_argument(
+        '--cache-max-size-mb',
+        type=float,
+        default=2048,
+        help='指标缓存的最大占用空间，超出后按LRU淘汰 (默认: 2048MB)'
+    )
+    
+    parser.add_argument(
+        '--indicators',
+        help=f'逗号分隔的指标选择，可以是指标族 ({"/".join(FAMILIES)})、列名或通配符，'
+             f'如 "ALPHA158_CORR*,RSI_14" (默认: 全部指标)'
+    )
+    
+    parser.add_argument(
+        '--engine',
+        choices=QlibIndicatorsEnhancedCalculator.ENGINES,
+        default='stock',
+        help='计算引擎: stock(逐只股票) 或 panel(Alpha158/Alpha360 在日期×股票面板上向量化计算)'
+    )
+    
+    parser.add_argument(
+        '--panel-chunk-size',
+        type=int,
+        default=128,
+        help='面板引擎每组计算的股票数，越大越快但内存占用越高 (默认: 128)'
+    )
+    
+    parser.add_argument(
+        '--financial-cache-size',
+        type=int,
+        default=256,
+        help='内存中保留的财务数据表数量上限，按LRU淘汰 (默认: 256)'
+    )
+    
+    parser.add_argument(
+        '--price-dtype',
+        choices=FLOAT_DTYPES,
+        default='float32',
+        help='价格列 (Open/High/Low/Close) 的输出类型，成交量始终为 float64 (默认: float32)'
+    )
+    
+    parser.add_argument(
+        '--ratio-dtype',
+        choices=FLOAT_DTYPES,
+        default='float32',
+        help='比率类浮点指标的输出类型；OBV/AD/MarketCap 始终为 float64 (默认: float32)'
+    )
+    
+    parser.add_argument(
+        '--sparse-patterns',
+        action='store_true',
+        help='合并结果中的蜡烛图形态列以稀疏方式保存（只存非0值），写出文件时还原'
+    )
+    
+    parser.add_argument(
+        '--timing-report',
+        choices=REPORT_FORMATS,
+        help='记录每只股票各指标族的墙钟/CPU时间与内存峰值、排队等待及合并/保存耗时，'
+             '写入输出文件旁的 <输出文件名>_timings.json/csv'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='对抽样的股票运行 cProfile，结果写入 <数据目录>/profiles/<股票代码>.pstats'
+    )
+    
+    parser.add_argument(
+        '--profile-sample',
+        type=int,
+        default=5,
+        help='--profile 抽样的股票数量 (默认: 5)'
+    )
+    
+    parser.add_argument(
+        '--compact-financial',
+        action='store_true',
+        help='计算前把每类财务数据的全部CSV压缩为一个列式文件（后续运行以内存映射方式读取）'
+    )
+    
+    parser.add_argument(
+        '--checkpoint',
+        action='store_true',
+        help='每只股票算完即写入检查点，并在输出文件旁记录运行清单 (<输出文件名>_manifest.sqlite)'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='从上一次中断的运行继续：跳过清单中已完成且输入未变化的股票（隐含 --checkpoint）'
+    )
+    
+    parser.add_argument(
+        '--kernel-backend',
+        choices=KERNEL_BACKENDS,
+        default='numpy',
+        help='滚动窗口内核的实现: numpy 参考实现, numba 编译实现 (未安装 numba 时回退到 numpy), '
+             'auto 已安装 numba 时使用 numba (默认: numpy)'
+    )
+    
+    parser.add_argument(
+        '--num-shards',
+        type=int,
+        default=1,
+        help='把股票划分为N个分片，由多台机器分别计算 (默认: 1，不分片)'
+    )
+    
+    parser.add_argument(
+        '--shard-index',
+        type=int,
+        default=0,
+        help='本机计算的分片编号，从0开始 (默认: 0)'
+    )
+    
+    parser.add_argument(
+        '--shard-strategy',
+        choices=SHARD_STRATEGIES,
+        default='balanced',
+        help='分片划分方式: balanced 按历史长度均衡工作量, hash 按股票代码哈希 (默认: balanced)'
     )
     
     args = parser.parse_args()
     
+    try:
+        validate_shard(args.num_shards, args.shard_index, args.shard_strategy)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.stream_output and args.output_format != 'csv':
+        parser.error('--stream-output 仅支持 --format csv')
+    
+    try:
+        IndicatorPlan.from_patterns(args.indicators, QlibIndicatorsEnhancedCalculator.indicator_catalog())
+    except ValueError as e:
+        parser.error(f'--indicators: {e}')
+    
     # 设置日志级别
     logger.remove()
     logger.add(
@@ -2423,12 +3251,38 @@ def main():
             data_dir=args.data_dir,
             financial_data_dir=args.financial_dir,
             enable_parallel=not args.disable_parallel,
-            max_workers=args.max_workers
+            max_workers=args.max_workers,
+            executor=args.executor,
+            warmup_days=args.warmup_days,
+            cache_dir=args.cache_dir,
+            cache_max_size_mb=args.cache_max_size_mb,
+            indicators=args.indicators,
+            engine=args.engine,
+            panel_chunk_size=args.panel_chunk_size,
+            financial_cache_size=args.financial_cache_size,
+            price_dtype=args.price_dtype,
+            ratio_dtype=args.ratio_dtype,
+            sparse_patterns=args.sparse_patterns,
+            timing_report=args.timing_report,
+            profile_sample=args.profile_sample if args.profile else 0,
+            checkpoint=args.checkpoint,
+            resume=args.resume,
+            num_shards=args.num_shards,
+            shard_index=args.shard_index,
+            shard_strategy=args.shard_strategy,
+            kernel_backend=args.kernel_backend
         )
         
+        if args.compact_financial:
+            calculator.financial_store.compact()
+        
         calculator.run(
             max_stocks=args.max_stocks,
-            output_filename=args.output
+            output_filename=args.output,
+            stream_output=args.stream_output,
+            output_format=args.output_format,
+            partition_by=args.partition_by,
+            incremental=args.incremental
         )
         
     except Exception as e:
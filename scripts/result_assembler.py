@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多只股票指标结果的单次拼接
+
+ResultAssembler 替代逐个 pd.concat 的级联合并：
+- add 只登记每只股票的结果（不复制），按首次出现的顺序合并列结构并推断每列的输出类型
+- assemble 为每种输出类型预分配一块 (列数 × 总行数) 的数组，逐只股票按dtype分组整块写入对应行区间，
+  总拷贝量与结果大小成正比；某只股票缺少的列保持预填的缺失值 (NaN/NaT/None)，
+  所有股票都有的列（如 int16 的形态列）不预填
+- 重复行只按 (Symbol, Date) 键判断，保留第一次出现的行
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+KEY_COLUMNS = ('Symbol', 'Date')
+
+
+def _missing_value(dtype: np.dtype):
+    """可空类型 (float/datetime/object) 的缺失值"""
+    if dtype.kind == 'M':
+        return np.datetime64('NaT')
+    if dtype.kind == 'O':
+        return None
+    return np.nan
+
+
+def _merge_dtypes(current: np.dtype, new: np.dtype) -> np.dtype:
+    """两只股票同名列类型不一致时的输出类型：数值取公共类型，其余退化为object"""
+    if current == new:
+        return current
+    if current.kind in 'biuf' and new.kind in 'biuf':
+        return np.promote_types(current, new)
+    return np.dtype(object)
+
+
+def _nullable_dtype(dtype: np.dtype) -> np.dtype:
+    """需要填充缺失值的列：整数/布尔提升为float64（与 pd.concat 的外连接一致）"""
+    return np.dtype(np.float64) if dtype.kind in 'biu' else dtype
+
+
+def drop_duplicate_keys(frame: pd.DataFrame, keys: Sequence[str] = KEY_COLUMNS) -> pd.DataFrame:
+    """按 (Symbol, Date) 去重，保留第一次出现的行；没有重复时原样返回"""
+    keys = [key for key in keys if key in frame.columns]
+    if not keys or frame.empty:
+        return frame
+    duplicated = frame.duplicated(keys, keep='first').values
+    if not duplicated.any():
+        return frame
+    logger.info(f"移除了 {int(duplicated.sum())} 行重复数据 (按 {'/'.join(keys)} 判断)")
+    return frame.loc[~duplicated].reset_index(drop=True)
+
+
+def unify_dtypes(schemas: Sequence[Dict[str, np.dtype]]) -> Dict[str, np.dtype]:
+    """
+    多块结果（如批处理的各批次）的统一列结构
+
+    列按首次出现的顺序合并，类型取公共类型；部分块缺少的列提升为能填充缺失值的类型
+    """
+    dtypes: Dict[str, np.dtype] = {}
+    counts: Dict[str, int] = {}
+    for schema in schemas:
+        for column, dtype in schema.items():
+            dtype = np.dtype(object) if not isinstance(dtype, np.dtype) else dtype
+            dtypes[column] = _merge_dtypes(dtypes[column], dtype) if column in dtypes else dtype
+            counts[column] = counts.get(column, 0) + 1
+    return {
+        column: dtype if counts[column] == len(schemas) else _nullable_dtype(dtype)
+        for column, dtype in dtypes.items()
+    }
+
+
+def conform(frame: pd.DataFrame, dtypes: Dict[str, np.dtype]) -> pd.DataFrame:
+    """把一块结果对齐到统一列结构：按统一的列顺序排列，缺少的列填缺失值，类型不同的列转换"""
+    columns = {}
+    for column, dtype in dtypes.items():
+        if column not in frame.columns:
+            if _nullable_dtype(dtype) != dtype:
+                raise ValueError(f"Column {column} is missing but its dtype {dtype} cannot hold missing values")
+            columns[column] = np.full(len(frame), _missing_value(dtype), dtype=dtype)
+        elif frame[column].dtype != dtype:
+            columns[column] = frame[column].to_numpy(dtype=dtype)
+        else:
+            columns[column] = frame[column].values
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+
+class ResultAssembler:
+    """把逐只股票的长格式结果一次性拼接为一个DataFrame"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """清空登记的结果"""
+        self._frames: List[pd.DataFrame] = []
+        self.n_rows = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def add(self, frame: Optional[pd.DataFrame]):
+        """登记一只股票的结果，空结果忽略"""
+        if frame is None or frame.empty:
+            return
+        if frame.columns.has_duplicates:
+            frame = frame.loc[:, ~frame.columns.duplicated(keep='first')]
+        self._frames.append(frame)
+        self.n_rows += len(frame)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(dict.fromkeys(column for frame in self._frames for column in frame.columns))
+
+    def _output_dtypes(self) -> Dict[str, np.dtype]:
+        return unify_dtypes([dict(frame.dtypes.items()) for frame in self._frames])
+
+    def assemble(self, deduplicate: bool = True) -> pd.DataFrame:
+        """预分配输出并逐只股票整块填入，返回拼接后的DataFrame（列顺序为首次出现的顺序）"""
+        if not self._frames:
+            return pd.DataFrame()
+
+        output_dtypes = self._output_dtypes()
+        complete = set.intersection(*(set(frame.columns) for frame in self._frames))
+        # 每种输出类型一块 (列数 × 总行数) 的数组，每一列在内存中连续
+        groups: Dict[np.dtype, List[str]] = {}
+        for column, dtype in output_dtypes.items():
+            groups.setdefault(dtype, []).append(column)
+        blocks = {}
+        slot = {}
+        for dtype, columns in groups.items():
+            # 所有股票都有的列会被整块写满，不需要预填缺失值（缺列只出现在可空类型中）
+            if complete.issuperset(columns):
+                blocks[dtype] = np.empty((len(columns), self.n_rows), dtype=dtype)
+            else:
+                blocks[dtype] = np.full((len(columns), self.n_rows), _missing_value(dtype), dtype=dtype)
+            for position, column in enumerate(columns):
+                slot[column] = (dtype, position)
+
+        offset = 0
+        for frame in self._frames:
+            rows = slice(offset, offset + len(frame))
+            # 同一输出类型、同一源类型的列一次取出
+            targets: Dict[tuple, Tuple[List[int], List[int]]] = {}
+            for source, (column, dtype) in enumerate(zip(frame.columns, frame.dtypes.tolist())):
+                output_dtype, position = slot[column]
+                sources, positions = targets.setdefault((output_dtype, dtype), ([], []))
+                sources.append(source)
+                positions.append(position)
+            for (output_dtype, _), (sources, positions) in targets.items():
+                values = frame.iloc[:, sources].to_numpy(dtype=output_dtype)
+                blocks[output_dtype][positions, rows] = values.T
+            offset += len(frame)
+
+        combined = pd.DataFrame(
+            {column: blocks[slot[column][0]][slot[column][1]] for column in output_dtypes},
+            copy=False,
+        )
+        # 释放登记的单只股票结果，assembler 可以继续用于下一次拼接
+        self.reset()
+        if deduplicate:
+            combined = drop_duplicate_keys(combined)
+        return combined
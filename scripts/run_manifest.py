@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+长时间运行的检查点与断点续算
+
+RunManifest 是输出文件旁的 SQLite 清单（<输出文件名>_manifest.sqlite），每个计算单元一行：
+- 单元为批处理的一个批次 (batch_00001) 或全量计算中的一只股票
+- 记录状态 (running/done/failed)、落盘的结果文件、行数、输入指纹、包含的股票与失败原因
+- 每个单元完成时单独提交一次，进程崩溃时已完成的单元不会丢失
+
+输入指纹由行情 .bin 文件、财务数据文件与指标配置计算（与指标缓存键相同），
+续算时只有状态为 done、指纹一致且结果文件仍然存在的单元会被跳过，其余单元重新计算。
+
+RunCheckpoint 把清单与逐只股票的结果文件（BatchSpill）组合起来，供全量计算按股票续算。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import pandas as pd
+from loguru import logger
+
+from batch_spill import BatchSpill
+
+STATUSES = ('running', 'done', 'failed')
+MANIFEST_SUFFIX = '_manifest.sqlite'
+
+
+def manifest_path_for(output_path: Union[str, Path]) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}{MANIFEST_SUFFIX}")
+
+
+class RunManifest:
+    """按计算单元记录运行进度的 SQLite 清单（线程安全）"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS units ("
+                "unit TEXT PRIMARY KEY, status TEXT NOT NULL, output TEXT, rows INTEGER, "
+                "fingerprint TEXT, stocks TEXT, error TEXT, updated REAL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _upsert(self, unit: str, status: str, fingerprint: Optional[str] = None,
+                stocks: Optional[Sequence[str]] = None, output: Optional[Union[str, Path]] = None,
+                rows: Optional[int] = None, error: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO units (unit, status, output, rows, fingerprint, stocks, error, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (unit, status, str(output) if output is not None else None, rows, fingerprint,
+                 json.dumps(list(stocks)) if stocks is not None else None, error, time.time()),
+            )
+
+    def mark_running(self, unit: str, fingerprint: str, stocks: Optional[Sequence[str]] = None):
+        self._upsert(unit, 'running', fingerprint, stocks)
+
+    def mark_done(self, unit: str, fingerprint: str, output: Union[str, Path], rows: int,
+                  stocks: Optional[Sequence[str]] = None):
+        self._upsert(unit, 'done', fingerprint, stocks, output, rows)
+
+    def mark_failed(self, unit: str, fingerprint: str, error: str, stocks: Optional[Sequence[str]] = None):
+        self._upsert(unit, 'failed', fingerprint, stocks, error=error)
+
+    def remove(self, unit: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM units WHERE unit = ?", (unit,))
+
+    def get(self, unit: str) -> Optional[dict]:
+        units = self._select("WHERE unit = ?", (unit,))
+        return units[0] if units else None
+
+    def units(self, status: Optional[str] = None) -> List[dict]:
+        """按单元名排序的全部记录（可按状态筛选）"""
+        if status is None:
+            return self._select("ORDER BY unit", ())
+        return self._select("WHERE status = ? ORDER BY unit", (status,))
+
+    def _select(self, clause: str, params: tuple) -> List[dict]:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT unit, status, output, rows, fingerprint, stocks, error, updated FROM units {clause}", params
+            )
+            records = cursor.fetchall()
+        return [
+            {
+                'unit': unit, 'status': status, 'output': output, 'rows': rows, 'fingerprint': fingerprint,
+                'stocks': json.loads(stocks) if stocks else [], 'error': error, 'updated': updated,
+            }
+            for unit, status, output, rows, fingerprint, stocks, error, updated in records
+        ]
+
+    def is_complete(self, unit: str, fingerprint: str) -> bool:
+        """单元已完成、输入未变化且结果文件仍然存在"""
+        record = self.get(unit)
+        return (record is not None and record['status'] == 'done' and record['fingerprint'] == fingerprint
+                and record['output'] is not None and Path(record['output']).exists())
+
+    def set_meta(self, key: str, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def get_meta(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def reset(self):
+        """清空清单（不续算时的新一次运行）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM units")
+            self._conn.execute("DELETE FROM meta")
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RunCheckpoint:
+    """
+    全量计算的逐只股票检查点：每只股票算完即落盘并记入清单
+
+    resume=False 时清空上一次的清单与结果文件；resume=True 时 load 返回已完成股票的结果
+    """
+
+    def __init__(self, manifest_path: Union[str, Path], units_dir: Union[str, Path], resume: bool = False,
+                 spill_format: str = 'arrow'):
+        self.manifest = RunManifest(manifest_path)
+        self.spill = BatchSpill(units_dir, spill_format)
+        self.resume = resume
+        self.reused = 0
+        if not resume:
+            self.manifest.reset()
+            self.spill.cleanup()
+        else:
+            counts = self.manifest.summary()
+            logger.info(f"♻️ 续算: 清单中已完成 {counts['done']} 个单元, 失败 {counts['failed']} 个, "
+                        f"未完成 {counts['running']} 个 ({self.manifest.path})")
+
+    def load(self, unit: str, fingerprint: str) -> Optional[pd.DataFrame]:
+        """续算时读取已完成单元的结果；未完成或输入已变化时返回 None"""
+        if not self.resume or not self.manifest.is_complete(unit, fingerprint):
+            return None
+        try:
+            result = self.spill.read(Path(self.manifest.get(unit)['output']))
+        except Exception as e:
+            logger.warning(f"⚠️ {unit}: 检查点文件读取失败，重新计算 - {e}")
+            return None
+        self.reused += 1
+        return result
+
+    def save(self, unit: str, fingerprint: str, result: Optional[pd.DataFrame],
+             stocks: Optional[Sequence[str]] = None):
+        """记录一个单元的结果：非空结果落盘并标记 done，None 标记为 failed"""
+        if result is None:
+            self.manifest.mark_failed(unit, fingerprint, 'no result', stocks)
+            return
+        path = self.spill.write(unit, result)
+        self.manifest.mark_done(unit, fingerprint, path, len(result), stocks)
+
+    def finish(self, keep_units: bool = False):
+        """整次运行成功写出后调用：删除逐单元的结果文件，清单保留为运行记录"""
+        self.manifest.set_meta('completed_at', time.time())
+        if not keep_units:
+            self.spill.cleanup()
+        self.manifest.close()
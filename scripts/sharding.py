@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多台机器分片计算
+
+共享同一个数据目录的多台机器各自计算一部分股票（--num-shards N --shard-index k）：
+- 分片只取决于股票列表（和各股票的历史长度），各台机器独立得到相同的划分
+- hash: 按股票代码的稳定哈希 (MD5) 取模，股票增减时其余股票的分片不变
+- balanced: 按历史长度（交易日数）估算工作量，从长到短依次分给当前工作量最小的分片，
+  避免少数长历史股票集中在同一分片而拖慢整体完成时间
+- 每个分片的输出文件名带分片标记（如 indicators.shard001-of-004.csv），
+  旁边的 .json 记录分片参数、全部股票的指纹与本分片的股票列表
+- merge-shards 检查分片是否齐全、参数一致、股票不重叠且覆盖全部股票，再合并为一个输出文件：
+  CSV 按文本逐块合并（统一列结构，缺少的列留空），Parquet/Feather 单文件按统一的 schema 逐个分片写出
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import pandas as pd
+from loguru import logger
+
+from indicator_writers import FIELD_LABELS_METADATA_KEY
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+SHARD_STRATEGIES = ('balanced', 'hash')
+CSV_CHUNK_ROWS = 100000
+
+
+def stable_hash(symbol: str) -> int:
+    """与进程无关的稳定哈希（内置 hash() 每个进程的随机种子不同）"""
+    return int.from_bytes(hashlib.md5(symbol.encode('utf-8')).digest()[:8], 'little')
+
+
+def universe_fingerprint(stocks: Sequence[str]) -> str:
+    return hashlib.sha1('\n'.join(sorted(stocks)).encode('utf-8')).hexdigest()
+
+
+def validate_shard(num_shards: int, shard_index: int, strategy: str = 'balanced'):
+    if num_shards < 1:
+        raise ValueError(f"num_shards must be >= 1, got {num_shards}")
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+    if strategy not in SHARD_STRATEGIES:
+        raise ValueError(f"Unsupported shard strategy: {strategy}, expected one of {SHARD_STRATEGIES}")
+
+
+def assign_shards(stocks: Sequence[str], num_shards: int, strategy: str = 'balanced',
+                  weights: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+    """股票 -> 分片编号；balanced 按 weights（缺省为每只股票相同）做最长处理时间优先的贪心分配"""
+    if strategy == 'hash':
+        return {symbol: stable_hash(symbol) % num_shards for symbol in stocks}
+
+    weights = weights or {}
+    loads = [0.0] * num_shards
+    assignment = {}
+    # 权重相同时按代码排序，保证各台机器的分配顺序一致
+    for symbol in sorted(stocks, key=lambda s: (-weights.get(s, 1.0), s)):
+        shard = min(range(num_shards), key=lambda i: (loads[i], i))
+        assignment[symbol] = shard
+        loads[shard] += weights.get(symbol, 1.0)
+    return assignment
+
+
+def shard_stocks(stocks: Sequence[str], num_shards: int, shard_index: int, strategy: str = 'balanced',
+                 weights: Optional[Dict[str, float]] = None) -> List[str]:
+    """本分片的股票（保持原有顺序）"""
+    validate_shard(num_shards, shard_index, strategy)
+    if num_shards == 1:
+        return list(stocks)
+    assignment = assign_shards(stocks, num_shards, strategy, weights)
+    return [symbol for symbol in stocks if assignment[symbol] == shard_index]
+
+
+def shard_tag(num_shards: int, shard_index: int) -> str:
+    return f"shard{shard_index:03d}-of-{num_shards:03d}"
+
+
+def shard_output_path(path: Union[str, Path], num_shards: int, shard_index: int) -> Path:
+    """在文件名后缀之前加上分片标记：indicators.csv -> indicators.shard001-of-004.csv"""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{shard_tag(num_shards, shard_index)}{path.suffix}")
+
+
+def sidecar_path(output_path: Union[str, Path]) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.name}.json")
+
+
+def write_shard_sidecar(output_path: Union[str, Path], num_shards: int, shard_index: int, strategy: str,
+                        universe: Sequence[str], stocks: Sequence[str], header_rows: int = 1,
+                        rows: Optional[int] = None) -> Path:
+    """在分片输出旁写出 <输出文件>.json：分片参数、全部股票的指纹与本分片的股票"""
+    path = sidecar_path(output_path)
+    payload = {
+        'num_shards': num_shards,
+        'shard_index': shard_index,
+        'strategy': strategy,
+        'universe': universe_fingerprint(universe),
+        'universe_size': len(universe),
+        'stocks': list(stocks),
+        'output': Path(output_path).name,
+        'header_rows': header_rows,
+        'rows': rows,
+    }
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path
+
+
+def find_shards(output_path: Union[str, Path]) -> List[dict]:
+    """查找输出文件旁的全部分片记录，按分片编号排序"""
+    output_path = Path(output_path)
+    shards = []
+    for path in output_path.parent.glob(f"{output_path.stem}.shard*{output_path.suffix}.json"):
+        info = json.loads(path.read_text(encoding='utf-8'))
+        info['path'] = path.parent / info['output']
+        shards.append(info)
+    return sorted(shards, key=lambda info: info['shard_index'])
+
+
+def validate_shards(output_path: Union[str, Path], num_shards: Optional[int] = None) -> List[dict]:
+    """检查分片齐全且一致，返回分片记录；有问题时抛出 ValueError 并列出全部问题"""
+    shards = find_shards(output_path)
+    if not shards:
+        raise ValueError(f"没有找到 {output_path} 的分片输出")
+
+    problems = []
+    expected = num_shards or shards[0]['num_shards']
+    for field in ('num_shards', 'strategy', 'universe'):
+        values = {info[field] for info in shards}
+        if len(values) > 1:
+            problems.append(f"分片的 {field} 不一致: {sorted(map(str, values))}")
+    indices = [info['shard_index'] for info in shards]
+    missing = sorted(set(range(expected)) - set(indices))
+    if missing:
+        problems.append(f"缺少分片: {missing} (共 {expected} 个)")
+    extra = sorted(set(indices) - set(range(expected)))
+    if extra:
+        problems.append(f"分片编号超出范围: {extra}")
+
+    seen: Dict[str, int] = {}
+    for info in shards:
+        if not info['path'].exists():
+            problems.append(f"分片 {info['shard_index']} 的输出文件不存在: {info['path']}")
+        for symbol in info['stocks']:
+            if symbol in seen:
+                problems.append(f"股票 {symbol} 同时出现在分片 {seen[symbol]} 和 {info['shard_index']}")
+            seen[symbol] = info['shard_index']
+    universe_size = shards[0]['universe_size']
+    if not problems and len(seen) != universe_size:
+        problems.append(f"分片共包含 {len(seen)} 只股票，与全部股票数 {universe_size} 不一致")
+
+    if problems:
+        raise ValueError("分片校验失败:\n" + "\n".join(f"  - {problem}" for problem in problems))
+    return shards
+
+
+def _merge_csv(shards: List[dict], output_path: Path) -> int:
+    """按文本合并CSV分片：列按首次出现的顺序合并，缺少的列留空，原样保留每个单元格的文本"""
+    header_rows = shards[0]['header_rows']
+    columns: List[str] = []
+    labels: Dict[str, str] = {}
+    for info in shards:
+        with open(info['path'], 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            label_row = next(reader) if header_rows > 1 else header
+        for column, label in zip(header, label_row):
+            if column not in labels:
+                columns.append(column)
+                labels[column] = label
+
+    # 沿用分片文件的换行符（save_results 为 \r\n，批处理的 to_csv 为 \n）
+    with open(shards[0]['path'], 'rb') as f:
+        lineterminator = '\r\n' if f.readline().endswith(b'\r\n') else '\n'
+
+    rows = 0
+    with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, lineterminator=lineterminator)
+        writer.writerow(columns)
+        if header_rows > 1:
+            writer.writerow([labels[column] for column in columns])
+        for info in shards:
+            chunks = pd.read_csv(info['path'], skiprows=range(1, header_rows), dtype=str, keep_default_na=False,
+                                 chunksize=CSV_CHUNK_ROWS, encoding='utf-8-sig')
+            for chunk in chunks:
+                chunk.reindex(columns=columns, fill_value='').to_csv(f, header=False, index=False, lineterminator=lineterminator)
+                rows += len(chunk)
+            logger.info(f"合并分片 {info['shard_index']}: 累计 {rows} 行")
+    return rows
+
+
+def _merge_columnar(shards: List[dict], output_path: Path, output_format: str) -> int:
+    """按统一的 schema 逐个分片写出 Parquet/Feather（缺少的列为空值，类型不同的列取公共类型）"""
+    if pa is None:
+        raise ImportError("pyarrow is required to merge parquet/feather shards")
+
+    def read(path: Path, schema_only: bool = False):
+        if output_format == 'parquet':
+            return pq.read_schema(str(path)) if schema_only else pq.read_table(str(path))
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            return reader.schema if schema_only else reader.read_all()
+
+    schemas = [read(info['path'], schema_only=True) for info in shards]
+    schema = pa.unify_schemas([s.remove_metadata() for s in schemas], promote_options='permissive')
+    # 合并各分片的中文标签；pandas 元数据只描述单个分片的列，不保留
+    labels: Dict[str, str] = {}
+    for s in schemas:
+        labels.update(json.loads((s.metadata or {}).get(FIELD_LABELS_METADATA_KEY, b'{}')))
+    schema = schema.with_metadata({FIELD_LABELS_METADATA_KEY: json.dumps(labels, ensure_ascii=False).encode('utf-8')})
+
+    rows = 0
+    sink = pa.OSFile(str(output_path), 'wb')
+    writer = pq.ParquetWriter(sink, schema) if output_format == 'parquet' else pa.ipc.new_file(sink, schema)
+    try:
+        for info in shards:
+            table = read(info['path'])
+            columns = [
+                table.column(field.name).cast(field.type) if field.name in table.column_names
+                else pa.nulls(len(table), field.type)
+                for field in schema
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            rows += len(table)
+            del table, columns
+            logger.info(f"合并分片 {info['shard_index']}: 累计 {rows} 行")
+    finally:
+        writer.close()
+        sink.close()
+    return rows
+
+
+def merge_shards(output_path: Union[str, Path], num_shards: Optional[int] = None,
+                 remove_shards: bool = False) -> dict:
+    """校验并合并分片输出为 output_path，返回 {'shards', 'stocks', 'rows', 'output'}"""
+    output_path = Path(output_path)
+    shards = validate_shards(output_path, num_shards)
+    if any(info['path'].is_dir() for info in shards):
+        raise ValueError("分区输出（目录）不支持合并，请使用单文件输出")
+
+    suffix = output_path.suffix.lower()
+    if suffix == '.csv':
+        rows = _merge_csv(shards, output_path)
+    elif suffix in ('.parquet', '.feather'):
+        rows = _merge_columnar(shards, output_path, suffix[1:])
+    else:
+        raise ValueError(f"Unsupported output format: {output_path.suffix}")
+
+    if remove_shards:
+        for info in shards:
+            info['path'].unlink()
+            sidecar_path(info['path']).unlink()
+    return {
+        'shards': len(shards),
+        'stocks': sum(len(info['stocks']) for info in shards),
+        'rows': rows,
+        'output': str(output_path),
+    }
+
+
+def merge_shards_main(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    """merge-shards 子命令"""
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description='校验各分片输出是否齐全、一致，并合并为一个输出文件',
+    )
+    parser.add_argument('--output', required=True,
+                        help='合并后的输出文件（分片文件在同一目录，如 indicators.csv 对应 indicators.shard000-of-004.csv）')
+    parser.add_argument('--num-shards', type=int, default=None, help='期望的分片数量 (默认: 以分片记录为准)')
+    parser.add_argument('--remove-shards', action='store_true', help='合并成功后删除分片文件')
+    args = parser.parse_args(argv)
+
+    try:
+        summary = merge_shards(args.output, args.num_shards, args.remove_shards)
+    except ValueError as e:
+        logger.error(str(e))
+        return False
+    logger.info(f"✅ 已合并 {summary['shards']} 个分片: {summary['stocks']} 只股票, {summary['rows']} 行 -> {summary['output']}")
+    return True
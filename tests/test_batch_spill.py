@@ -0,0 +1,79 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from batch_spill import BatchSpill
+from result_assembler import ResultAssembler
+
+
+def make_batch(symbols, n=5, extra=None):
+    frames = []
+    for symbol in symbols:
+        frame = pd.DataFrame(
+            {
+                "Date": pd.bdate_range("2024-01-01", periods=n),
+                "Symbol": symbol,
+                "Close": np.arange(n, dtype=np.float32) + 10,
+                "CDLDOJI": np.where(np.arange(n) % 2 == 0, 100, 0).astype(np.int16),
+            }
+        )
+        if extra:
+            frame[extra] = np.linspace(0, 1, n)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+class TestBatchSpill(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_streaming_merge_matches_in_memory(self):
+        batches = [make_batch(["AAA", "BBB"]), make_batch(["CCC"], extra="ROE"), make_batch(["DDD"])]
+        for spill_format in ("arrow", "parquet"):
+            spill = BatchSpill(self.root.joinpath(spill_format), spill_format)
+            for i, batch in enumerate(batches, 1):
+                spill.write(f"batch_{i:05d}", batch)
+            self.assertEqual([path.stem for path in spill.files], ["batch_00001", "batch_00002", "batch_00003"])
+
+            # 部分批次缺少的整数列提升为 float64，列顺序为首次出现的顺序
+            dtypes = spill.unified_dtypes()
+            self.assertEqual(list(dtypes), ["Date", "Symbol", "Close", "CDLDOJI", "ROE"])
+            self.assertEqual(dtypes["CDLDOJI"], np.int16)
+            self.assertEqual(dtypes["Close"], np.float32)
+
+            output = self.root.joinpath(f"out_{spill_format}.csv")
+            summary = spill.write_csv(output)
+            self.assertEqual(summary, {"rows": 20, "symbols": 4, "columns": 5, "files": 3})
+
+            assembler = ResultAssembler()
+            for batch in batches:
+                assembler.add(batch)
+            expected = assembler.assemble()
+            expected.to_csv(self.root.joinpath("expected.csv"), index=False, encoding="utf-8-sig")
+            self.assertEqual(output.read_bytes(), self.root.joinpath("expected.csv").read_bytes())
+
+    def test_repeated_symbols_keep_first_batch(self):
+        spill = BatchSpill(self.root.joinpath("spill"))
+        spill.write("batch_00001", make_batch(["AAA"]))
+        later = make_batch(["AAA", "BBB"])
+        later["Close"] = -1.0
+        spill.write("batch_00002", later)
+        merged = pd.concat(spill.iter_frames(), ignore_index=True)
+        self.assertEqual(len(merged), 10)
+        self.assertTrue((merged.loc[merged["Symbol"] == "AAA", "Close"] >= 10).all())
+
+        spill.cleanup()
+        self.assertEqual(spill.files, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from benchmarks.synthetic import FIELDS, synthetic_symbols, write_synthetic_tree
+from benchmarks.bench_indicators import run_benchmark
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_synthetic_tree(self):
+        write_synthetic_tree(self.root, n_stocks=4, n_days=120, seed=1)
+        calendar = self.root.joinpath("calendars", "day.txt").read_text().split()
+        self.assertEqual(len(calendar), 120)
+
+        instruments = [line.split("\t") for line in self.root.joinpath("instruments", "all.txt").read_text().splitlines()]
+        self.assertEqual([row[0] for row in instruments], synthetic_symbols(4))
+        for symbol, start_date, end_date in instruments:
+            close = np.fromfile(self.root.joinpath("features", symbol.lower(), "close.day.bin"), dtype="<f")
+            start = int(close[0])
+            self.assertEqual(calendar[start], start_date)
+            self.assertEqual(calendar[start + len(close) - 2], end_date)
+            for field in FIELDS:
+                values = np.fromfile(self.root.joinpath("features", symbol.lower(), f"{field}.day.bin"), dtype="<f")
+                self.assertEqual(len(values), len(close))
+
+        # 相同的随机种子生成相同的数据
+        other = Path(tempfile.mkdtemp())
+        try:
+            write_synthetic_tree(other, n_stocks=4, n_days=120, seed=1)
+            for symbol in synthetic_symbols(4):
+                path = Path("features", symbol.lower(), "close.day.bin")
+                self.assertEqual(self.root.joinpath(path).read_bytes(), other.joinpath(path).read_bytes())
+        finally:
+            shutil.rmtree(str(other))
+
+    def test_run_benchmark_in_process(self):
+        write_synthetic_tree(self.root, n_stocks=3, n_days=300)
+        results = run_benchmark(str(self.root), ["sequential"], isolate=False)
+        result = results["sequential"]
+        self.assertEqual(result["stocks"], 3)
+        self.assertGreater(result["rows"], 0)
+        self.assertEqual(result["speedup"], 1.0)
+        self.assertEqual(result["stages"]["stock"]["count"], 3)
+        self.assertIn("alpha158", result["stages"])
+        self.assertGreater(result["peak_rss_mb"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from dtype_policy import DtypePolicy, densify
+
+
+def make_result(n: int = 10) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "Date": pd.bdate_range("2024-01-01", periods=n),
+            "Symbol": "AAA",
+            "Close": rng.random(n).astype(np.float32),
+            "ALPHA158_ROC5": rng.random(n),
+            "ALPHA360_CLOSE5": rng.random(n).astype(np.float32),
+            "OBV": rng.random(n) * 1e12,
+            "CDLDOJI": np.where(np.arange(n) % 4 == 0, 100, 0).astype(np.int32),
+            "CDLHIKKAKE": np.where(np.arange(n) == 3, -200, 0).astype(np.int32),
+            "HT_TRENDMODE": np.ones(n, dtype=np.int32),
+            "MAXINDEX": np.arange(n, dtype=np.int32) + 1000,
+        }
+    )
+
+
+class TestDtypePolicy(unittest.TestCase):
+    def test_default_policy(self):
+        df = make_result()
+        result = DtypePolicy().apply(df)
+        expected = {
+            "Close": np.float32, "ALPHA158_ROC5": np.float32, "ALPHA360_CLOSE5": np.float32, "OBV": np.float64,
+            "CDLDOJI": np.int16, "CDLHIKKAKE": np.int16, "HT_TRENDMODE": np.int8, "MAXINDEX": np.int32,
+        }
+        for column, dtype in expected.items():
+            self.assertEqual(result[column].dtype, dtype, column)
+        pd.testing.assert_frame_equal(result, df, check_dtype=False, rtol=1e-6)
+        self.assertEqual(result["Date"].dtype, df["Date"].dtype)
+
+    def test_large_volume_is_exact(self):
+        # float32 只能精确表示 2^24 以内的整数，成交量始终保持 float64
+        df = make_result(3).assign(Volume=[123456789.0, 2.5e9 + 1, 16777217.0])
+        result = DtypePolicy().apply(df)
+        self.assertEqual(result["Volume"].dtype, np.float64)
+        self.assertEqual(result["Volume"].tolist(), [123456789.0, 2.5e9 + 1, 16777217.0])
+        self.assertEqual(result["Close"].dtype, np.float32)
+
+    def test_configured_widths(self):
+        df = make_result()
+        result = DtypePolicy(price_dtype="float64", ratio_dtype="float64").apply(df)
+        self.assertEqual(result["Close"].dtype, np.float64)
+        # float64 只表示不收窄，已经是 float32 的指标保持不变
+        self.assertEqual(result["ALPHA360_CLOSE5"].dtype, np.float32)
+        pd.testing.assert_series_equal(result["ALPHA158_ROC5"], df["ALPHA158_ROC5"])
+        with self.assertRaises(ValueError):
+            DtypePolicy(ratio_dtype="float16")
+
+    def test_pattern_with_missing_values_is_kept(self):
+        df = make_result().astype({"CDLDOJI": np.float64})
+        df.loc[0, "CDLDOJI"] = np.nan
+        self.assertEqual(DtypePolicy().apply(df)["CDLDOJI"].dtype, np.float64)
+
+    def test_sparse_patterns_roundtrip(self):
+        policy = DtypePolicy(sparse_patterns=True)
+        dense = policy.apply(make_result(1000))
+        sparse = policy.sparsify(dense)
+        self.assertIsInstance(sparse["CDLDOJI"].dtype, pd.SparseDtype)
+        self.assertLess(sparse["CDLHIKKAKE"].memory_usage(), dense["CDLHIKKAKE"].memory_usage() / 10)
+        pd.testing.assert_frame_equal(densify(sparse), dense)
+        self.assertIs(DtypePolicy().sparsify(dense), dense)
+
+
+if __name__ == "__main__":
+    unittest.main()
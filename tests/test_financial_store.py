@@ -0,0 +1,78 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from financial_store import FinancialDataStore, canonical_symbol
+
+
+class TestFinancialDataStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+        info_dir = self.root.joinpath("info")
+        info_dir.mkdir()
+        # 同名列在不同股票中类型不同（数值/字符串、整数/浮点）
+        info_dir.joinpath("aaa.csv").write_text(",marketCap,priceToBook,sector,isEsgPopulated\n0,1000,1.5,Tech,True\n")
+        info_dir.joinpath("bbb.csv").write_text(",marketCap,priceToBook,quickRatio\n0,2000.5,N/A,0.8\n")
+        balance_dir = self.root.joinpath("balance_sheet")
+        balance_dir.mkdir()
+        balance_dir.joinpath("aaa.csv").write_text(
+            ",2024-12-31,2023-12-31\nTotal Assets,100,90\nTotal Current Assets,40,\nTotal Current Liabilities,20,18\n"
+        )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def expected(self, data_type: str, symbol: str) -> pd.DataFrame:
+        return pd.read_csv(self.root.joinpath(data_type, f"{symbol.lower()}.csv"), index_col=0)
+
+    def test_lazy_loading_and_lru(self):
+        store = FinancialDataStore(self.root, max_cached_frames=2)
+        self.assertEqual(store.loads, 0)
+        self.assertEqual(store.symbols("info"), ["AAA", "BBB"])
+        self.assertEqual(store.files("AAA"), [self.root.joinpath("info", "aaa.csv"), self.root.joinpath("balance_sheet", "aaa.csv")])
+        self.assertIsNone(store.get("info", "CCC"))
+        self.assertIsNone(store.get("cashflow", "AAA"))
+
+        pd.testing.assert_frame_equal(store.get("info", "AAA"), self.expected("info", "AAA"))
+        store.get("info", "AAA")
+        self.assertEqual(store.loads, 1)
+        store.get("info", "BBB")
+        store.get("balance_sheet", "AAA")
+        self.assertEqual(store.stats()["cached_frames"], 2)
+        store.get("info", "AAA")
+        self.assertEqual(store.loads, 4)
+
+    def test_canonical_symbol_index(self):
+        self.root.joinpath("info", "0002.HK.csv").write_text(",marketCap\n0,5000\n")
+        store = FinancialDataStore(self.root)
+        self.assertEqual(canonical_symbol("0002.hk"), "0002_HK")
+        for symbol in ("0002.HK", "0002_HK", "0002_hk"):
+            self.assertTrue(store.has(symbol))
+            self.assertEqual(store.get("info", symbol)["marketCap"].iloc[0], 5000)
+        self.assertEqual(store.files("0002_hk"), [self.root.joinpath("info", "0002.HK.csv")])
+        # 有行情数据但没有财务数据的股票
+        self.assertEqual(store.missing_symbols(["aaa", "0002_hk", "ccc"]), ["ccc"])
+        self.assertFalse(store.has("BBB", "balance_sheet"))
+
+    def test_compacted_roundtrip(self):
+        written = FinancialDataStore(self.root).compact()
+        self.assertEqual(len(written), 2)
+
+        store = FinancialDataStore(self.root)
+        self.assertEqual(store.stats()["compacted"], ["balance_sheet", "info"])
+        for data_type, symbol in [("info", "AAA"), ("info", "BBB"), ("balance_sheet", "AAA")]:
+            pd.testing.assert_frame_equal(store.get(data_type, symbol), self.expected(data_type, symbol))
+
+        # 压缩之后修改过的CSV回退为直接读取
+        self.root.joinpath("info", "bbb.csv").write_text(",marketCap\n0,3000\n")
+        store = FinancialDataStore(self.root)
+        pd.testing.assert_frame_equal(store.get("info", "BBB"), self.expected("info", "BBB"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_cache import IndicatorCache
+
+
+def make_result(symbol: str, n: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(len(symbol))
+    return pd.DataFrame(
+        {
+            "Date": pd.bdate_range("2024-01-01", periods=n),
+            "Symbol": symbol,
+            "Close": rng.random(n).astype(np.float32),
+            "CDLDOJI": np.zeros(n, dtype=np.int32),
+            "ALPHA158_ROC5": rng.random(n),
+        }
+    )
+
+
+class TestIndicatorCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+        self.input_file = self.root.joinpath("close.day.bin")
+        self.input_file.write_bytes(b"\x00" * 8)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_roundtrip_and_counters(self):
+        cache = IndicatorCache(self.root.joinpath("cache"))
+        key = IndicatorCache.make_key("AAA", [self.input_file], "cfg")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, make_result("AAA"))
+        pd.testing.assert_frame_equal(cache.get(key), make_result("AAA"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key_changes_with_inputs_and_config(self):
+        key = IndicatorCache.make_key("AAA", [self.input_file], "cfg")
+        self.assertEqual(key, IndicatorCache.make_key("AAA", [self.input_file], "cfg"))
+        self.assertNotEqual(key, IndicatorCache.make_key("AAA", [self.input_file], "cfg2"))
+        self.assertNotEqual(key, IndicatorCache.make_key("BBB", [self.input_file], "cfg"))
+        self.input_file.write_bytes(b"\x00" * 12)
+        self.assertNotEqual(key, IndicatorCache.make_key("AAA", [self.input_file], "cfg"))
+
+    def test_lru_eviction(self):
+        cache = IndicatorCache(self.root.joinpath("cache"))
+        keys = [IndicatorCache.make_key(symbol, [], "cfg") for symbol in ("AAA", "BBB", "CCC")]
+        cache.put(keys[0], make_result("AAA", 20))
+        cache.put(keys[1], make_result("BBB", 20))
+        # 预算只够保留两个条目
+        cache.max_size_bytes = int(cache.stats()["size_mb"] * 1.25 * 1024 * 1024)
+        self.assertIsNotNone(cache.get(keys[0]))  # AAA 成为最近使用
+        cache.put(keys[2], make_result("CCC", 20))
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+        # 重新打开时从磁盘恢复索引
+        reopened = IndicatorCache(self.root.joinpath("cache"))
+        self.assertEqual(len(reopened._entries), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_kernels import (
+    rolling_corr, rolling_extrema, rolling_mean, rolling_mean_std, rolling_ols, rolling_quantile, rolling_rank,
+    rolling_std, rolling_sum
+)
+
+
+WINDOWS = [5, 10, 20, 30, 60]
+
+
+def random_walk(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.03, n)))
+    close[100:110] = close[99]
+    close[:3] = np.nan
+    return close
+
+
+class TestRollingOLS(unittest.TestCase):
+    def test_matches_polyfit(self):
+        close = random_walk(600)
+        results = rolling_ols(close, WINDOWS)
+        for d in WINDOWS:
+            slope, rsqr, resid = results[d]
+            self.assertTrue(np.isnan(slope[: d - 1]).all())
+            for i in range(d - 1, len(close)):
+                y = close[i - d + 1 : i + 1]
+                if not np.isfinite(y).all():
+                    self.assertEqual((slope[i], rsqr[i], resid[i]), (0.0, 0.0, 0.0))
+                    continue
+                b, a = np.polyfit(np.arange(d), y, 1)
+                r = np.corrcoef(np.arange(d), y)[0, 1] if y.std() > 0 else 0.0
+                np.testing.assert_allclose(slope[i], b, rtol=1e-9, atol=1e-12)
+                np.testing.assert_allclose(rsqr[i], r**2, rtol=1e-9, atol=1e-12)
+                np.testing.assert_allclose(resid[i], y[-1] - (b * (d - 1) + a), rtol=1e-9, atol=1e-9)
+
+    def test_panel_matches_columns(self):
+        panel = np.column_stack([random_walk(300, seed) for seed in range(4)])
+        panel[:40, 1] = np.nan
+        results = rolling_ols(panel, WINDOWS)
+        for j in range(panel.shape[1]):
+            single = rolling_ols(panel[:, j], WINDOWS)
+            for d in WINDOWS:
+                for expected, actual in zip(single[d], results[d]):
+                    np.testing.assert_allclose(actual[:, j], expected, equal_nan=True)
+
+
+class TestRollingExtrema(unittest.TestCase):
+    def test_matches_pandas_and_argmax(self):
+        high = random_walk(400, seed=3)
+        for kind, locate in (("max", np.argmax), ("min", np.argmin)):
+            results = rolling_extrema(high, WINDOWS, kind)
+            for d in WINDOWS:
+                extreme, position = results[d]
+                expected = getattr(pd.Series(high).rolling(window=d, min_periods=1), kind)().values
+                np.testing.assert_array_equal(extreme, expected)
+                self.assertTrue(np.isnan(position[: d - 1]).all())
+                for i in range(d - 1, len(high)):
+                    self.assertEqual(position[i], d - 1 - locate(high[i - d + 1 : i + 1]))
+
+
+class TestRollingCorr(unittest.TestCase):
+    def test_matches_corrcoef(self):
+        close = random_walk(400, seed=4)
+        volume = np.random.default_rng(4).integers(100_000, 10_000_000, 400).astype(float)
+        log_volume = np.log(volume + 1)
+        results = rolling_corr(close, log_volume, WINDOWS)
+        for d in WINDOWS:
+            corr = results[d]
+            self.assertTrue(np.isnan(corr[: d - 1]).all())
+            for i in range(d - 1, len(close)):
+                x, y = close[i - d + 1 : i + 1], log_volume[i - d + 1 : i + 1]
+                expected = np.corrcoef(x, y)[0, 1] if np.std(x) > 1e-8 and np.std(y) > 1e-8 else 0.0
+                np.testing.assert_allclose(corr[i], expected, rtol=1e-9, atol=1e-12)
+
+
+class TestRollingSums(unittest.TestCase):
+    def test_sum_mean_std_match_slices(self):
+        changes = np.diff(random_walk(400, seed=5)) * 1e6
+        sums = rolling_sum(changes, WINDOWS)
+        moments = rolling_mean_std(changes, WINDOWS)
+        for d in WINDOWS:
+            for i in range(d - 1, len(changes)):
+                window = changes[i - d + 1 : i + 1]
+                np.testing.assert_allclose(sums[d][i], np.sum(window), rtol=1e-9, atol=1e-6)
+                np.testing.assert_allclose(moments[d][0][i], np.mean(window), rtol=1e-9, atol=1e-6)
+                np.testing.assert_allclose(moments[d][1][i], np.std(window), rtol=1e-9, atol=1e-6)
+
+
+class TestPartialWindows(unittest.TestCase):
+    def test_match_pandas_rolling(self):
+        close = random_walk(400, seed=6)
+        close[200:205] = np.nan
+        windows = WINDOWS + [1, 500]
+        means, stds = rolling_mean(close, windows), rolling_std(close, windows)
+        upper, ranks = rolling_quantile(close, windows, 0.8), rolling_rank(close, windows)
+        for d in windows:
+            rolling = pd.Series(close).rolling(window=d, min_periods=1)
+            np.testing.assert_allclose(means[d], rolling.mean().values, rtol=1e-9, equal_nan=True)
+            np.testing.assert_allclose(stds[d], rolling.std().values, rtol=1e-7, atol=1e-12, equal_nan=True)
+            np.testing.assert_array_equal(upper[d], rolling.quantile(0.8).values)
+            np.testing.assert_array_equal(ranks[d], rolling.rank(pct=True).values)
+            # 取值全部相同的窗口标准差严格为 0
+            if 1 < d <= 10:
+                self.assertTrue((stds[d][98 + d : 110] == 0).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_planner import FAMILIES, IndicatorPlan
+
+CATALOG = {
+    "alpha158": ["ALPHA158_KMID", "ALPHA158_CORR5", "ALPHA158_CORR10", "ALPHA158_IMXD5", "ALPHA158_MAX5"],
+    "technical": ["RSI_14", "MACD", "MACD_Signal"],
+    "candlestick": ["CDLDOJI", "CDLDOJISTAR", "CDLHAMMER"],
+}
+
+
+class TestIndicatorPlan(unittest.TestCase):
+    def test_empty_selection_is_full(self):
+        plan = IndicatorPlan.from_patterns(None, CATALOG)
+        self.assertTrue(plan.is_full)
+        self.assertIsNone(plan.signature())
+        self.assertTrue(all(plan.includes(family) for family in FAMILIES))
+        self.assertTrue(plan.wants("technical", "ANYTHING"))
+
+    def test_families_columns_and_globs(self):
+        plan = IndicatorPlan.from_patterns("alpha158_corr*, rsi_14,Candlestick", CATALOG)
+        self.assertEqual(plan.columns("alpha158"), {"ALPHA158_CORR5", "ALPHA158_CORR10"})
+        self.assertEqual(plan.columns("technical"), {"RSI_14"})
+        self.assertIsNone(plan.columns("candlestick"))
+        self.assertFalse(plan.includes("alpha360"))
+        self.assertEqual(plan.select("alpha158", CATALOG["alpha158"]), ["ALPHA158_CORR5", "ALPHA158_CORR10"])
+        self.assertEqual(plan.signature(), IndicatorPlan.from_patterns(["Candlestick", "RSI_14", "ALPHA158_CORR*"], CATALOG).signature())
+
+    def test_resolve_dependencies(self):
+        groups = {"KBAR": ["ALPHA158_KMID"], "MAX": ["ALPHA158_MAX5"], "IMXD": ["ALPHA158_IMXD5"], "CORR": ["ALPHA158_CORR5"]}
+        dependencies = {"MAX": ("high_extrema",), "IMXD": ("high_extrema", "low_extrema")}
+        plan = IndicatorPlan.from_patterns("ALPHA158_IMXD5", CATALOG)
+        self.assertEqual(plan.resolve("alpha158", groups, dependencies), {"IMXD", "high_extrema", "low_extrema"})
+        self.assertEqual(plan.resolve("technical", groups, dependencies), set())
+
+    def test_unknown_pattern(self):
+        with self.assertRaises(ValueError):
+            IndicatorPlan.from_patterns("RSI_14,NOT_AN_INDICATOR*", CATALOG)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import sys
+import csv
+import json
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_profiler import IndicatorProfiler, sample_symbols
+
+
+class TestIndicatorProfiler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_measure_and_report(self):
+        profiler = IndicatorProfiler(enabled=True)
+        try:
+            with profiler.measure("alpha158", "AAA"):
+                block = np.ones((1024, 1024))  # 8MB
+                del block
+            with profiler.measure("merge"):
+                pass
+            profiler.record_wait("AAA", time.time() - 0.5)
+        finally:
+            profiler.close()
+
+        records = {record["stage"]: record for record in profiler.records}
+        self.assertEqual(set(records), {"alpha158", "merge", "queue"})
+        self.assertEqual(records["merge"]["symbol"], "*")
+        self.assertGreaterEqual(records["alpha158"]["peak_mb"], 7.9)
+        self.assertGreaterEqual(records["queue"]["wall_s"], 0.5)
+        self.assertEqual(profiler.summary()["alpha158"]["count"], 1)
+
+        report = json.loads(profiler.write_report(self.root.joinpath("run_timings"), "json").read_text())
+        self.assertEqual(len(report["records"]), 3)
+        self.assertIn("queue", report["summary"])
+        with open(profiler.write_report(self.root.joinpath("run_timings"), "csv")) as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 3)
+
+        self.assertEqual(len(profiler.pop_records("AAA")), 2)
+        self.assertEqual(len(profiler.records), 1)
+
+    def test_nested_measures_keep_outer_peak(self):
+        profiler = IndicatorProfiler(enabled=True)
+        try:
+            with profiler.measure("stock", "AAA"):
+                with profiler.measure("read", "AAA"):
+                    pass
+                with profiler.measure("alpha158", "AAA"):
+                    block = np.ones((2048, 1024))  # 16MB
+                    del block
+                with profiler.measure("technical", "AAA"):
+                    pass
+        finally:
+            profiler.close()
+
+        peaks = {record["stage"]: record["peak_mb"] for record in profiler.records}
+        self.assertGreaterEqual(peaks["alpha158"], 15.9)
+        self.assertLess(peaks["technical"], 1.0)
+        # 外层阶段的峰值不会被内层阶段重置
+        self.assertGreaterEqual(peaks["stock"], peaks["alpha158"])
+        self.assertEqual(profiler.summary()["stock"]["count"], 1)
+
+    def test_disabled_is_noop(self):
+        profiler = IndicatorProfiler()
+        with profiler.measure("alpha158", "AAA"):
+            pass
+        profiler.record_wait("AAA", time.time())
+        self.assertEqual(profiler.records, [])
+
+    def test_profile_sampled_symbols(self):
+        symbols = [f"S{i:03d}" for i in range(10)]
+        self.assertEqual(sample_symbols(symbols, 3), ["S000", "S004", "S009"])
+        self.assertEqual(sample_symbols(symbols[:2], 5), ["S000", "S001"])
+        self.assertEqual(sample_symbols(symbols, 0), [])
+
+        profiler = IndicatorProfiler(profile_dir=self.root.joinpath("profiles"), profile_symbols=["S000"])
+        for symbol in ("S000", "S001"):
+            with profiler.profile(symbol):
+                sorted(range(1000))
+        self.assertEqual([path.name for path in self.root.joinpath("profiles").iterdir()], ["S000.pstats"])
+        self.assertGreater(pstats.Stats(str(self.root.joinpath("profiles", "S000.pstats"))).total_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from indicator_writers import StreamingCSVWriter, compact_dtypes, read_field_labels, write_columnar_results
+
+
+class TestStreamingCSVWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.output_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.output_dir))
+
+    def make_frame(self, symbol: str, n: int) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "Date": pd.bdate_range("2024-01-01", periods=n),
+                "Symbol": symbol,
+                "Close": np.arange(n, dtype=np.float32) + 0.5,
+                "CDLDOJI": np.zeros(n, dtype=np.int32),
+                "ALPHA158_ROC5": np.where(np.arange(n) < 5, np.nan, 0.25),
+            }
+        )
+
+    def test_header_labels_and_empty_nan(self):
+        path = self.output_dir.joinpath("out.csv")
+        first, second = self.make_frame("AAA", 7), self.make_frame("BBB", 3)
+        columns = first.columns.tolist()
+        with StreamingCSVWriter(path, columns, ["日期", "股票代码", "收盘价", "十字星", "5日变化率"], chunk_rows=2) as writer:
+            writer.write(first)
+            writer.write(second[columns[::-1]])
+        self.assertEqual(writer.rows_written, 10)
+
+        lines = path.read_text(encoding="utf-8-sig").splitlines()
+        self.assertEqual(lines[0], ",".join(columns))
+        self.assertEqual(lines[1], "日期,股票代码,收盘价,十字星,5日变化率")
+        self.assertEqual(lines[2], "2024-01-01 00:00:00,AAA,0.5,0,")
+        self.assertEqual(len(lines), 12)
+
+        restored = pd.read_csv(path, skiprows=[1], parse_dates=["Date"])
+        expected = pd.concat([first, second], ignore_index=True)
+        pd.testing.assert_frame_equal(restored, expected, check_dtype=False)
+
+    def test_compact_dtypes_is_lossless(self):
+        frame = self.make_frame("AAA", 4).assign(
+            Volume=np.array([1e6, 2e6, np.nan, 3e6]), RATIO=np.array([1 / 3, 0.5, 0.25, 1.0]), CDL3OUTSIDE=np.array([0, 200, -100, 0], dtype=np.int32)
+        )
+        compacted = compact_dtypes(frame)
+        self.assertEqual(compacted["Volume"].dtype, np.float32)
+        self.assertEqual(compacted["RATIO"].dtype, np.float64)
+        self.assertEqual(compacted["CDLDOJI"].dtype, np.int8)
+        self.assertEqual(compacted["CDL3OUTSIDE"].dtype, np.int16)
+        pd.testing.assert_frame_equal(compacted.astype(frame.dtypes.to_dict()), frame)
+
+    def test_columnar_partitions_and_labels(self):
+        frame = pd.concat([self.make_frame("AAA", 300), self.make_frame("BBB", 5)], ignore_index=True)
+        labels = {"Close": "收盘价", "ALPHA158_ROC5": "5日变化率"}
+        for output_format in ("parquet", "feather"):
+            for partition_by in ("none", "symbol", "year"):
+                path = write_columnar_results(frame, self.output_dir.joinpath(f"{output_format}_{partition_by}.csv"), output_format, labels, partition_by)
+                self.assertEqual(read_field_labels(path, output_format), labels)
+                if partition_by == "none":
+                    self.assertEqual(path.suffix, f".{output_format}")
+                else:
+                    self.assertTrue(path.is_dir())
+                    self.assertTrue(path.joinpath("Symbol=BBB" if partition_by == "symbol" else "year=2025").exists())
+
+        restored = pd.read_parquet(self.output_dir.joinpath("parquet_symbol"), columns=["Symbol", "Date", "ALPHA158_ROC5"])
+        self.assertEqual(len(restored), len(frame))
+        self.assertEqual(restored["ALPHA158_ROC5"].isna().sum(), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+import kernel_backends
+from benchmarks.synthetic import write_synthetic_tree
+from kernel_backends import KERNEL_NAMES, available_backends, get_kernel_backend
+from qlib_indicators import QlibIndicatorsEnhancedCalculator
+
+
+WINDOWS = [1, 2, 5, 10, 20, 30, 60, 500]
+HAS_NUMBA = "numba" in available_backends()
+
+
+def random_inputs(n: int, seed: int, stocks: int = 0) -> np.ndarray:
+    """随机游走，带缺失段、价格不变的区间与 ±inf"""
+    rng = np.random.default_rng(seed)
+    shape = (n, stocks) if stocks else (n,)
+    x = 20 * np.exp(np.cumsum(rng.normal(0, 0.03, shape), axis=0))
+    start = int(rng.integers(10, n // 2))
+    x[start : start + 12] = x[start - 1]
+    x[rng.random(shape) < 0.03] = np.nan
+    x[:3] = np.nan
+    x[rng.integers(0, n, 2)] = np.inf
+    x[rng.integers(0, n)] = -np.inf
+    return x
+
+
+def kernel_calls(x: np.ndarray, y: np.ndarray):
+    """每个内核一组 (名称, 参数)"""
+    return [
+        ("rolling_mean", (x, WINDOWS), {}),
+        ("rolling_std", (x, WINDOWS), {}),
+        ("rolling_quantile", (x, WINDOWS, 0.8), {}),
+        ("rolling_quantile", (x, WINDOWS, 0.2), {}),
+        ("rolling_rank", (x, WINDOWS), {}),
+        ("rolling_sum", (x, WINDOWS), {}),
+        ("rolling_mean_std", (x, WINDOWS), {"ddof": 0}),
+        ("rolling_ols", (x, WINDOWS), {}),
+        ("rolling_extrema", (x, WINDOWS, "max"), {}),
+        ("rolling_extrema", (x, WINDOWS, "min"), {}),
+        ("rolling_corr", (x, y, WINDOWS), {}),
+    ]
+
+
+def assert_results_close(actual, expected):
+    for d, value in expected.items():
+        values = value if isinstance(value, tuple) else (value,)
+        others = actual[d] if isinstance(actual[d], tuple) else (actual[d],)
+        for a, e in zip(others, values):
+            np.testing.assert_allclose(a, e, rtol=1e-7, atol=1e-9, equal_nan=True, err_msg=f"window={d}")
+
+
+class TestKernelBackends(unittest.TestCase):
+    def test_backend_selection(self):
+        numpy_backend = get_kernel_backend("numpy")
+        self.assertEqual(numpy_backend.name, "numpy")
+        self.assertTrue(all(callable(getattr(numpy_backend, kernel)) for kernel in KERNEL_NAMES))
+        self.assertEqual(get_kernel_backend().name, "numpy")
+        self.assertEqual(get_kernel_backend("auto").name, "numba" if HAS_NUMBA else "numpy")
+        with self.assertRaises(ValueError):
+            get_kernel_backend("cuda")
+
+    def test_fallback_without_numba(self):
+        with mock.patch.object(kernel_backends, "numba_kernels", None):
+            self.assertEqual(available_backends(), ["numpy"])
+            self.assertEqual(get_kernel_backend("numba").name, "numpy")
+            self.assertEqual(get_kernel_backend("auto").name, "numpy")
+
+    @unittest.skipUnless(HAS_NUMBA, "numba 未安装")
+    def test_numba_matches_reference(self):
+        reference, numba = get_kernel_backend("numpy"), get_kernel_backend("numba")
+        for seed in range(3):
+            for x, y in (
+                (random_inputs(400, seed), random_inputs(400, seed + 10)),
+                (random_inputs(300, seed, stocks=4), random_inputs(300, seed + 10, stocks=4)),
+            ):
+                for kernel, args, kwargs in kernel_calls(x, y):
+                    with self.subTest(seed=seed, kernel=kernel, ndim=x.ndim):
+                        assert_results_close(getattr(numba, kernel)(*args, **kwargs),
+                                             getattr(reference, kernel)(*args, **kwargs))
+
+
+class TestCalculatorBackends(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+        write_synthetic_tree(self.root, n_stocks=3, n_days=150)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_default_backend_is_numpy(self):
+        calculator = QlibIndicatorsEnhancedCalculator(data_dir=str(self.root), enable_parallel=False)
+        self.assertEqual(calculator.kernels.name, "numpy")
+
+    @unittest.skipUnless(HAS_NUMBA, "numba 未安装")
+    def test_alpha158_matches_across_backends(self):
+        results = {}
+        for backend in ("numpy", "numba"):
+            calculator = QlibIndicatorsEnhancedCalculator(
+                data_dir=str(self.root), enable_parallel=False, kernel_backend=backend
+            )
+            self.assertEqual(calculator.kernels.name, backend)
+            calculator.run(output_filename=f"{backend}.parquet", output_format="parquet")
+            results[backend] = pd.read_parquet(self.root.joinpath(f"{backend}.parquet"))
+        pd.testing.assert_frame_equal(results["numba"], results["numpy"], rtol=1e-7, atol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
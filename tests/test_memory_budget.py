@@ -0,0 +1,101 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+import memory_budget
+from batch_calculator import BatchIndicatorCalculator
+from benchmarks.synthetic import write_synthetic_tree
+from memory_budget import MemoryBudget, RSSMonitor, history_length
+
+MB = 1024 * 1024
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_take_batch_and_calibration(self):
+        # 每行 100 列 × 8 字节，初始系数 4：每只 1000 日的股票估算 3.2MB
+        budget = MemoryBudget(limit_mb=100, n_columns=100, safety=0.5)
+        lengths = {f"S{i}": 1000 for i in range(40)}
+        stocks = sorted(lengths)
+        with mock.patch.object(memory_budget, "current_rss_bytes", return_value=34 * MB):
+            batch, rest = budget.take_batch(stocks, lengths)
+            self.assertEqual(len(batch), 5)
+            self.assertEqual(batch + rest, stocks)
+
+            # 实测每行只占估算的一半以下：系数调低，批次变大；调高立即生效
+            budget.observe(5000, 5000 * 100 * 8)
+            self.assertEqual(budget.scale, 1.0)
+            self.assertEqual(len(budget.take_batch(stocks, lengths)[0]), 20)
+            budget.observe(5000, 5000 * 100 * 8 * 3)
+            self.assertEqual(budget.scale, 3.0)
+            budget.penalize()
+            self.assertEqual(budget.scale, 6.0)
+
+            # MemoryError 之后的第一次校准不调小系数，之后才逐步调小
+            budget.observe(5000, 5000 * 100 * 8)
+            self.assertEqual(budget.scale, 6.0)
+            budget.observe(5000, 5000 * 100 * 8)
+            self.assertEqual(budget.scale, 3.5)
+
+            # 尚未校准时出现 MemoryError，加倍后的系数同样不会被第一次校准覆盖
+            fresh = MemoryBudget(limit_mb=100, n_columns=100)
+            fresh.penalize()
+            fresh.observe(5000, 5000 * 100 * 8)
+            self.assertEqual(fresh.scale, memory_budget.INITIAL_SCALE * 2)
+
+            # 预算不足时至少取一只，max_batch_size 限制每批上限
+            self.assertEqual(len(MemoryBudget(10, 100).take_batch(stocks, lengths)[0]), 1)
+            capped = MemoryBudget(10000, 100, max_batch_size=3)
+            self.assertEqual(len(capped.take_batch(stocks, lengths)[0]), 3)
+
+    def test_history_length_and_monitor(self):
+        root = Path(tempfile.mkdtemp())
+        try:
+            write_synthetic_tree(root, n_stocks=2, n_days=50)
+            self.assertEqual(history_length(root / "features", "SYN00000"), 50)
+            self.assertEqual(history_length(root / "features", "MISSING"), 0)
+        finally:
+            shutil.rmtree(str(root))
+
+        with RSSMonitor(interval=0.01) as monitor:
+            block = bytearray(64 * MB)
+            block[::4096] = b"x" * len(block[::4096])
+        del block
+        self.assertGreaterEqual(monitor.growth, 32 * MB)
+
+
+class TestAdaptiveBatching(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+        write_synthetic_tree(self.root, n_stocks=4, n_days=200)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_memory_error_splits_batch(self):
+        batch_calc = BatchIndicatorCalculator(data_dir=str(self.root), max_workers=2, memory_limit_mb=4096)
+        calculate_batch = batch_calc._calculate_batch
+        attempts = []
+
+        def flaky_batch(stocks):
+            attempts.append(list(stocks))
+            if len(stocks) > 1 or stocks == ["SYN00003"]:
+                raise MemoryError
+            return calculate_batch(stocks)
+
+        # RSS 固定不变：实测增长为 0，结果不受进程中其它内存占用的影响
+        with mock.patch.object(batch_calc, "_calculate_batch", side_effect=flaky_batch), \
+                mock.patch.object(memory_budget, "current_rss_bytes", return_value=256 * MB):
+            result = batch_calc.process_single_batch(["SYN00000", "SYN00001", "SYN00002", "SYN00003"], 1)
+
+        # 4 -> 2 + 2 -> 1 + 1 + 1 + 1，单独仍然失败的股票被跳过
+        self.assertEqual(len(attempts), 7)
+        self.assertEqual(sorted(result["Symbol"].unique()), ["SYN00000", "SYN00001", "SYN00002"])
+        self.assertGreater(batch_calc.memory_budget.scale, memory_budget.INITIAL_SCALE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from benchmarks.synthetic import write_synthetic_tree
+from qlib_indicators import PanelIndicatorEngine, PreparedBars, QlibIndicatorsEnhancedCalculator, StockResultBuffers
+
+
+def write_qlib_tree(root: Path, symbols: dict, calendar: pd.DatetimeIndex):
+    """按 dump_bin 的格式写入日历和 features/*/*.day.bin"""
+    root.joinpath("calendars").mkdir(parents=True, exist_ok=True)
+    root.joinpath("calendars", "day.txt").write_text("\n".join(calendar.strftime("%Y-%m-%d")) + "\n")
+    for symbol, (start_index, fields) in symbols.items():
+        features_dir = root.joinpath("features", symbol.lower())
+        features_dir.mkdir(parents=True, exist_ok=True)
+        for field, values in fields.items():
+            np.hstack([start_index, values]).astype("<f").tofile(str(features_dir.joinpath(f"{field}.day.bin")))
+
+
+def make_ohlcv(n: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    open_price = close * (1 + rng.normal(0, 0.01, n))
+    high = np.maximum(open_price, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_price, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    volume = rng.integers(100_000, 10_000_000, n).astype(float)
+    return {"open": open_price, "high": high, "low": low, "close": close, "volume": volume}
+
+
+class TestQlibIndicators(unittest.TestCase):
+    CALENDAR = pd.bdate_range("2020-01-01", periods=300)
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.DATA_DIR = Path(tempfile.mkdtemp())
+        cls.FIELDS = {"AAA": (0, make_ohlcv(300, seed=1)), "BBB": (120, make_ohlcv(150, seed=2))}
+        write_qlib_tree(cls.DATA_DIR, cls.FIELDS, cls.CALENDAR)
+        cls.calculator = QlibIndicatorsEnhancedCalculator(
+            data_dir=str(cls.DATA_DIR), financial_data_dir=str(cls.DATA_DIR.joinpath("financial")), enable_parallel=False
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(str(cls.DATA_DIR))
+
+    def test_read_qlib_binary_data(self):
+        df = self.calculator.read_qlib_binary_data("BBB")
+        start_index, fields = self.FIELDS["BBB"]
+        self.assertEqual(len(df), 150)
+        self.assertTrue(df.index.equals(self.CALENDAR[start_index : start_index + 150]))
+        self.assertEqual(df["Close"].dtype, np.float32)
+        np.testing.assert_allclose(df["Close"].values, fields["close"].astype(np.float32))
+        self.assertIsNone(self.calculator.read_qlib_binary_data("MISSING"))
+
+    def test_alpha360_block(self):
+        df = self.calculator.read_qlib_binary_data("AAA")
+        self.calculator._reset_indicators_cache()
+        alpha360 = self.calculator.calculate_alpha360_indicators(df)
+        self.assertEqual(alpha360.shape, (len(df), 360))
+        self.assertTrue((alpha360.dtypes == np.float32).all())
+        close = df["Close"].values.astype(np.float64)
+        np.testing.assert_allclose(alpha360["ALPHA360_CLOSE5"].values[5:], close[:-5] / close[5:], rtol=1e-6)
+        self.assertTrue(alpha360["ALPHA360_HIGH59"].iloc[:59].isna().all())
+        np.testing.assert_allclose(alpha360["ALPHA360_VOLUME0"].values, 1.0, rtol=1e-6)
+
+    def test_prepared_bars(self):
+        df = self.calculator.read_qlib_binary_data("AAA")
+        df.iloc[10, df.columns.get_loc("Close")] = np.nan
+        df.iloc[11, df.columns.get_loc("Volume")] = np.nan
+        bars = PreparedBars(df)
+        self.assertIs(PreparedBars.from_data(bars), bars)
+        self.assertEqual(bars.close.dtype, np.float64)
+        self.assertEqual(bars.close[10], bars.close[9])
+        self.assertEqual(bars.volume[11], 0.0)
+        self.assertEqual(bars.matrix32.shape, (len(df), len(PreparedBars.MATRIX_COLUMNS)))
+        self.assertEqual(bars.matrix32.dtype, np.float32)
+
+    def test_stock_result_buffers_roundtrip(self):
+        result = self.calculator.calculate_all_indicators_for_stock("BBB")
+        restored = StockResultBuffers(result).to_frame()
+        pd.testing.assert_frame_equal(restored, result)
+
+    def test_process_executor_matches_thread(self):
+        kwargs = dict(data_dir=str(self.DATA_DIR), financial_data_dir=str(self.DATA_DIR.joinpath("financial")), max_workers=2)
+        by_thread = QlibIndicatorsEnhancedCalculator(executor="thread", **kwargs).calculate_all_indicators()
+        by_process = QlibIndicatorsEnhancedCalculator(executor="process", **kwargs).calculate_all_indicators()
+        by_thread = by_thread.sort_values(["Symbol", "Date"]).reset_index(drop=True)
+        by_process = by_process.sort_values(["Symbol", "Date"]).reset_index(drop=True)[by_thread.columns]
+        pd.testing.assert_frame_equal(by_process, by_thread)
+        with self.assertRaises(ValueError):
+            QlibIndicatorsEnhancedCalculator(executor="fiber", **kwargs)
+
+    def test_incremental_update_appends_new_rows(self):
+        data_dir = Path(tempfile.mkdtemp())
+        try:
+            calendar = pd.bdate_range("2019-01-01", periods=600)
+            symbols = {"AAA": (0, make_ohlcv(600, seed=3)), "BBB": (250, make_ohlcv(350, seed=4))}
+
+            def write_until(n):
+                write_qlib_tree(data_dir, {s: (st, {k: v[: n - st] for k, v in f.items()}) for s, (st, f) in symbols.items()}, calendar[:n])
+
+            kwargs = dict(data_dir=str(data_dir), financial_data_dir=str(data_dir.joinpath("financial")), enable_parallel=False)
+            write_until(590)
+            QlibIndicatorsEnhancedCalculator(**kwargs).run()
+            write_until(600)
+            calculator = QlibIndicatorsEnhancedCalculator(**kwargs)
+            tail = calculator.read_qlib_binary_data("AAA", start_position=500)
+            self.assertTrue(tail.index.equals(calendar[500:600]))
+            calculator.run(incremental=True)
+
+            output = pd.read_csv(data_dir.joinpath("enhanced_quantitative_indicators.csv"), skiprows=[1], parse_dates=["Date"])
+            self.assertEqual(len(output), 600 + 350)
+            self.assertFalse(output.duplicated(["Symbol", "Date"]).any())
+
+            expected = QlibIndicatorsEnhancedCalculator(**kwargs).calculate_all_indicators()
+            columns = ["Symbol", "Date", "ALPHA158_CORR20", "ALPHA158_RSQR60", "ALPHA360_CLOSE59", "EMA_50", "OBV", "AD", "MAXINDEX"]
+            new_rows = output[output["Date"] > calendar[589]].sort_values(["Symbol", "Date"]).reset_index(drop=True)[columns]
+            expected = expected[expected["Date"] > calendar[589]].sort_values(["Symbol", "Date"]).reset_index(drop=True)[columns]
+            self.assertEqual(len(new_rows), 20)
+            pd.testing.assert_frame_equal(new_rows, expected, check_dtype=False, rtol=1e-5)
+        finally:
+            shutil.rmtree(str(data_dir))
+
+    def test_indicator_cache_skips_unchanged_stocks(self):
+        cache_dir = self.DATA_DIR.joinpath("indicator_cache")
+        kwargs = dict(data_dir=str(self.DATA_DIR), financial_data_dir=str(self.DATA_DIR.joinpath("financial")), cache_dir=str(cache_dir))
+        first = QlibIndicatorsEnhancedCalculator(**kwargs)
+        expected = first.calculate_all_indicators()
+        self.assertEqual((first.cache.hits, first.cache.misses), (0, 2))
+
+        second = QlibIndicatorsEnhancedCalculator(executor="process", max_workers=2, **kwargs)
+        cached = second.calculate_all_indicators()
+        self.assertEqual((second.cache.hits, second.cache.misses), (2, 0))
+        cached = cached.sort_values(["Symbol", "Date"]).reset_index(drop=True)
+        expected = expected.sort_values(["Symbol", "Date"]).reset_index(drop=True)[cached.columns]
+        pd.testing.assert_frame_equal(cached, expected)
+        shutil.rmtree(str(cache_dir))
+
+    def test_indicator_plan_computes_selected_columns(self):
+        kwargs = dict(data_dir=str(self.DATA_DIR), financial_data_dir=str(self.DATA_DIR.joinpath("financial")), max_workers=2)
+        full = self.calculator.calculate_all_indicators_for_stock("AAA")
+        selected = QlibIndicatorsEnhancedCalculator(indicators="ALPHA158_CORR*,ALPHA158_IMXD20,RSI_14,cdl*doji", **kwargs)
+        result = selected.calculate_all_indicators_for_stock("AAA")
+        indicator_columns = [c for c in result.columns if c not in QlibIndicatorsEnhancedCalculator.BASE_COLUMNS]
+        expected_columns = [f"ALPHA158_CORR{d}" for d in (5, 10, 20, 30, 60)] + ["ALPHA158_IMXD20", "RSI_14", "CDLDOJI", "CDLDRAGONFLYDOJI", "CDLGRAVESTONEDOJI", "CDLLONGLEGGEDDOJI"]
+        self.assertEqual(sorted(indicator_columns), sorted(expected_columns))
+        pd.testing.assert_frame_equal(result, full[result.columns])
+        self.assertNotEqual(selected._indicator_config_hash, self.calculator._indicator_config_hash)
+        with self.assertRaises(ValueError):
+            QlibIndicatorsEnhancedCalculator(indicators="NO_SUCH_INDICATOR", **kwargs)
+
+    def test_stream_output_keeps_columns_of_later_stocks(self):
+        root = Path(tempfile.mkdtemp())
+        try:
+            # 第一只股票历史太短，没有 Alpha158/Alpha360/技术指标列
+            write_qlib_tree(root, {"AAA": (260, make_ohlcv(40, seed=3)), "BBB": (0, make_ohlcv(300, seed=4))}, self.CALENDAR)
+            calculator = QlibIndicatorsEnhancedCalculator(
+                data_dir=str(root), financial_data_dir=str(root.joinpath("financial")), enable_parallel=False
+            )
+            calculator.run(output_filename="stream.csv", stream_output=True)
+            calculator.run(output_filename="full.csv")
+            streamed = pd.read_csv(root.joinpath("stream.csv"), skiprows=[1])
+            full = pd.read_csv(root.joinpath("full.csv"), skiprows=[1])
+            self.assertEqual(list(streamed.columns), calculator.output_columns())
+            self.assertEqual(set(streamed.columns), set(full.columns))
+            self.assertIn("ALPHA158_CORR20", streamed.columns)
+            pd.testing.assert_frame_equal(streamed, full[streamed.columns])
+        finally:
+            shutil.rmtree(str(root))
+
+    def test_panel_engine_matches_stock_engine(self):
+        kwargs = dict(data_dir=str(self.DATA_DIR), financial_data_dir=str(self.DATA_DIR.joinpath("financial")), enable_parallel=False)
+        by_stock = self.calculator.calculate_all_indicators().sort_values(["Symbol", "Date"]).reset_index(drop=True)
+        # 组大小 2 时两只上市/退市区间不同的股票在同一个二维子面板中计算
+        for chunk_size in (1, 2):
+            with self.subTest(chunk_size=chunk_size):
+                panel_calculator = QlibIndicatorsEnhancedCalculator(engine="panel", panel_chunk_size=chunk_size, **kwargs)
+                by_panel = panel_calculator.calculate_all_indicators().sort_values(["Symbol", "Date"]).reset_index(drop=True)
+                self.assertEqual(list(by_panel.columns), list(by_stock.columns))
+                pd.testing.assert_frame_equal(by_panel, by_stock, rtol=1e-9)
+
+        # 面板引擎的其余指标族只在线程池中计算：指定进程池时给出警告，结果不变
+        warnings = []
+        handler = logger.add(warnings.append, level="WARNING")
+        try:
+            threaded = QlibIndicatorsEnhancedCalculator(
+                engine="panel", executor="process", **dict(kwargs, enable_parallel=True, max_workers=2)
+            )
+        finally:
+            logger.remove(handler)
+        self.assertTrue(any("--executor process" in message for message in warnings))
+        by_threads = threaded.calculate_all_indicators().sort_values(["Symbol", "Date"]).reset_index(drop=True)
+        pd.testing.assert_frame_equal(by_threads, by_stock, rtol=1e-9)
+
+        panel = PanelIndicatorEngine(panel_calculator).load_panel(["AAA", "BBB"])
+        self.assertEqual(panel.fields["Close"].shape, (300, 2))
+        self.assertEqual((panel.start.tolist(), panel.end.tolist()), ([0, 120], [300, 270]))
+        self.assertTrue(np.isnan(panel.fields["Close"][:120, 1]).all())
+        self.assertTrue(np.isnan(panel.fields["Close"][270:, 1]).all())
+        self.assertTrue(panel.fields["Close"][:, 1].flags.c_contiguous)
+        with self.assertRaises(ValueError):
+            QlibIndicatorsEnhancedCalculator(engine="gpu", **kwargs)
+
+    def test_panel_engine_chunks_match_stock_engine(self):
+        root = Path(tempfile.mkdtemp())
+        try:
+            # 各股票上市日期错开，奇数序号的股票提前退市；组大小不整除股票数时最后一组较小
+            write_synthetic_tree(root, n_stocks=5, n_days=200, seed=7)
+            kwargs = dict(data_dir=str(root), financial_data_dir=str(root.joinpath("financial")), enable_parallel=False,
+                          indicators="alpha158,alpha360")
+            by_stock = QlibIndicatorsEnhancedCalculator(**kwargs).calculate_all_indicators()
+            by_stock = by_stock.sort_values(["Symbol", "Date"]).reset_index(drop=True)
+            for chunk_size in (2, 5):
+                with self.subTest(chunk_size=chunk_size):
+                    calculator = QlibIndicatorsEnhancedCalculator(engine="panel", panel_chunk_size=chunk_size, **kwargs)
+                    by_panel = calculator.calculate_all_indicators().sort_values(["Symbol", "Date"]).reset_index(drop=True)
+                    pd.testing.assert_frame_equal(by_panel, by_stock, rtol=1e-9)
+        finally:
+            shutil.rmtree(str(root))
+
+    def test_timing_report_and_profile(self):
+        calculator = QlibIndicatorsEnhancedCalculator(
+            data_dir=str(self.DATA_DIR), financial_data_dir=str(self.DATA_DIR.joinpath("financial")), max_workers=2,
+            timing_report="json", profile_sample=1
+        )
+        calculator.run(output_filename="timed.csv")
+        report = json.loads(self.DATA_DIR.joinpath("timed_timings.json").read_text())
+        stages = {"queue", "read", "stock", "merge", "save", "alpha158", "alpha360", "technical", "candlestick", "financial", "volatility"}
+        self.assertEqual(set(report["summary"]), stages)
+        self.assertEqual(report["summary"]["alpha158"]["count"], 2)
+        self.assertTrue(self.DATA_DIR.joinpath("profiles", "AAA.pstats").exists())
+        with self.assertRaises(ValueError):
+            QlibIndicatorsEnhancedCalculator(data_dir=str(self.DATA_DIR), timing_report="xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
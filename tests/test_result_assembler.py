@@ -0,0 +1,84 @@
+import sys
+import unittest
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from result_assembler import ResultAssembler, conform, drop_duplicate_keys, unify_dtypes
+
+
+def make_result(symbol: str, n: int, **extra) -> pd.DataFrame:
+    frame = pd.DataFrame(
+        {
+            "Date": pd.bdate_range("2024-01-01", periods=n),
+            "Symbol": symbol,
+            "Close": np.arange(n, dtype=np.float32),
+            "CDLDOJI": np.zeros(n, dtype=np.int32),
+        }
+    )
+    return frame.assign(**extra)
+
+
+class TestResultAssembler(unittest.TestCase):
+    def test_matches_concat(self):
+        frames = [make_result("AAA", 5), make_result("BBB", 3), make_result("CCC", 4)]
+        assembler = ResultAssembler()
+        for frame in frames:
+            assembler.add(frame)
+        self.assertEqual((len(assembler), assembler.n_rows), (3, 12))
+        expected = pd.concat(frames, ignore_index=True, sort=False)
+        combined = assembler.assemble()
+        pd.testing.assert_frame_equal(combined, expected)
+        self.assertEqual(combined["CDLDOJI"].dtype, np.int32)
+        self.assertEqual(len(assembler), 0)
+
+    def test_schema_union_fills_missing_columns(self):
+        frames = [make_result("AAA", 3), make_result("BBB", 2, ALPHA158_ROC5=[1.5, 2.5]).drop(columns="CDLDOJI")]
+        assembler = ResultAssembler()
+        for frame in frames:
+            assembler.add(frame)
+        assembler.add(pd.DataFrame())
+        combined = assembler.assemble()
+        self.assertEqual(list(combined.columns), ["Date", "Symbol", "Close", "CDLDOJI", "ALPHA158_ROC5"])
+        # 缺失列填充 NaN，整数列提升为 float64（与 pd.concat 一致）
+        pd.testing.assert_frame_equal(combined, pd.concat(frames, ignore_index=True, sort=False)[combined.columns])
+        self.assertEqual(combined["CDLDOJI"].dtype, np.float64)
+        self.assertTrue(combined["ALPHA158_ROC5"].iloc[:3].isna().all())
+
+    def test_integer_columns_are_not_prefilled(self):
+        frames = [
+            make_result("AAA", 3, CDLHAMMER=np.int16(100), HT_TRENDMODE=np.int8(1)),
+            make_result("BBB", 2, CDLHAMMER=np.int16(-200), HT_TRENDMODE=np.int8(0)),
+        ]
+        assembler = ResultAssembler()
+        for frame in frames:
+            assembler.add(frame)
+        # 整数列不能填 NaN，转换时的 RuntimeWarning 视为错误
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            combined = assembler.assemble()
+        pd.testing.assert_frame_equal(combined, pd.concat(frames, ignore_index=True, sort=False))
+        self.assertEqual((combined["CDLHAMMER"].dtype, combined["HT_TRENDMODE"].dtype), (np.int16, np.int8))
+
+        # 统一列结构中缺失的列总是可空类型；不可空类型的列缺失时报错
+        dtypes = unify_dtypes([dict(frame.dtypes.items()) for frame in frames])
+        with self.assertRaises(ValueError):
+            conform(frames[0].drop(columns="CDLHAMMER"), dtypes)
+
+    def test_duplicates_by_key(self):
+        first = make_result("AAA", 4)
+        again = make_result("AAA", 2).assign(Close=np.float32(99))
+        assembler = ResultAssembler()
+        assembler.add(first)
+        assembler.add(again)
+        combined = assembler.assemble()
+        # 只按 (Symbol, Date) 判断重复，保留第一次出现的行
+        pd.testing.assert_frame_equal(combined, first)
+        self.assertIs(drop_duplicate_keys(first), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
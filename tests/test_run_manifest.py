@@ -0,0 +1,132 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from batch_calculator import BatchIndicatorCalculator
+from benchmarks.synthetic import synthetic_symbols, write_synthetic_tree
+from qlib_indicators import QlibIndicatorsEnhancedCalculator
+from run_manifest import RunManifest
+
+
+def read_output(path):
+    return pd.read_csv(path).sort_values(["Symbol", "Date"]).reset_index(drop=True)
+
+
+class TestRunManifest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_unit_records(self):
+        output = self.root.joinpath("batch_00001.arrow")
+        output.write_bytes(b"")
+        manifest = RunManifest(self.root.joinpath("run_manifest.sqlite"))
+        manifest.mark_running("batch_00001", "abc", ["AAA", "BBB"])
+        self.assertFalse(manifest.is_complete("batch_00001", "abc"))
+        manifest.mark_done("batch_00001", "abc", output, 10, ["AAA", "BBB"])
+        manifest.mark_failed("batch_00002", "def", "MemoryError", ["CCC"])
+        manifest.close()
+
+        # 重新打开后记录仍在
+        manifest = RunManifest(self.root.joinpath("run_manifest.sqlite"))
+        self.assertTrue(manifest.is_complete("batch_00001", "abc"))
+        self.assertFalse(manifest.is_complete("batch_00001", "changed"))
+        self.assertEqual(manifest.get("batch_00001")["stocks"], ["AAA", "BBB"])
+        self.assertEqual(manifest.get("batch_00001")["rows"], 10)
+        self.assertEqual(manifest.summary(), {"running": 0, "done": 1, "failed": 1})
+        self.assertEqual([unit["unit"] for unit in manifest.units("failed")], ["batch_00002"])
+        output.unlink()
+        self.assertFalse(manifest.is_complete("batch_00001", "abc"))
+        manifest.close()
+
+
+class TestResume(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+        write_synthetic_tree(self.root, n_stocks=6, n_days=150)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_batch_resume_skips_completed_batches(self):
+        output = self.root.joinpath("batch_indicators.csv")
+        batch_calc = BatchIndicatorCalculator(data_dir=str(self.root), batch_size=2, max_workers=2)
+        process_single_batch = batch_calc.process_single_batch
+
+        def crash_on_third(batch, batch_num, total_batches=None):
+            if batch_num == 3:
+                raise KeyboardInterrupt
+            return process_single_batch(batch, batch_num, total_batches)
+
+        with mock.patch.object(batch_calc, "process_single_batch", side_effect=crash_on_third):
+            with self.assertRaises(KeyboardInterrupt):
+                batch_calc.run_batch_calculation(output_file=str(output))
+        manifest = RunManifest(self.root.joinpath("batch_indicators_manifest.sqlite"))
+        self.assertEqual(manifest.summary(), {"running": 1, "done": 2, "failed": 0})
+        manifest.close()
+
+        computed = []
+
+        def record(batch, batch_num, total_batches=None):
+            computed.append(list(batch))
+            return process_single_batch(batch, batch_num, total_batches)
+
+        with mock.patch.object(batch_calc, "process_single_batch", side_effect=record):
+            self.assertTrue(batch_calc.run_batch_calculation(output_file=str(output), resume=True))
+        self.assertEqual(computed, [synthetic_symbols(6)[4:]])
+        self.assertFalse(self.root.joinpath("batch_indicators_spill").exists())
+
+        expected = self.root.joinpath("expected.csv")
+        self.assertTrue(batch_calc.run_batch_calculation(output_file=str(expected)))
+        pd.testing.assert_frame_equal(read_output(output), read_output(expected))
+
+    def test_stock_checkpoint_resume(self):
+        calculator = QlibIndicatorsEnhancedCalculator(data_dir=str(self.root), enable_parallel=False, checkpoint=True)
+        compute = calculator._compute_indicators_for_stock
+
+        def crash_on_fourth(symbol, *args):
+            if symbol == synthetic_symbols(6)[3]:
+                raise KeyboardInterrupt
+            return compute(symbol, *args)
+
+        with mock.patch.object(calculator, "_compute_indicators_for_stock", side_effect=crash_on_fourth):
+            with self.assertRaises(KeyboardInterrupt):
+                calculator.run(output_filename="indicators.csv")
+        self.assertEqual(len(list(self.root.joinpath("indicators_checkpoint").iterdir())), 3)
+
+        resumed = QlibIndicatorsEnhancedCalculator(data_dir=str(self.root), enable_parallel=False, resume=True)
+        computed = []
+        compute = resumed._compute_indicators_for_stock
+
+        def record(symbol, *args):
+            computed.append(symbol)
+            return compute(symbol, *args)
+
+        with mock.patch.object(resumed, "_compute_indicators_for_stock", side_effect=record):
+            resumed.run(output_filename="indicators.csv")
+        self.assertEqual(computed, synthetic_symbols(6)[3:])
+        self.assertFalse(self.root.joinpath("indicators_checkpoint").exists())
+        manifest = RunManifest(self.root.joinpath("indicators_manifest.sqlite"))
+        self.assertEqual(manifest.summary()["done"], 6)
+        manifest.close()
+
+        fresh = QlibIndicatorsEnhancedCalculator(data_dir=str(self.root), enable_parallel=False)
+        fresh.run(output_filename="expected.csv")
+        resumed_df = pd.read_csv(self.root.joinpath("indicators.csv"), skiprows=[1])
+        expected_df = pd.read_csv(self.root.joinpath("expected.csv"), skiprows=[1])
+        pd.testing.assert_frame_equal(
+            resumed_df.sort_values(["Symbol", "Date"]).reset_index(drop=True),
+            expected_df.sort_values(["Symbol", "Date"]).reset_index(drop=True),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
+from benchmarks.synthetic import synthetic_symbols, write_synthetic_tree
+from qlib_indicators import QlibIndicatorsEnhancedCalculator
+from sharding import assign_shards, merge_shards, shard_stocks, validate_shards, write_shard_sidecar
+
+
+def read_output(path):
+    return pd.read_csv(path, skiprows=[1]).sort_values(["Symbol", "Date"]).reset_index(drop=True)
+
+
+class TestShardAssignment(unittest.TestCase):
+    def test_shards_cover_universe(self):
+        stocks = [f"S{i:04d}" for i in range(200)]
+        weights = {symbol: (i * 37) % 500 + 10 for i, symbol in enumerate(stocks)}
+        for strategy in ("balanced", "hash"):
+            shards = [shard_stocks(stocks, 4, k, strategy, weights) for k in range(4)]
+            self.assertEqual(sorted(sum(shards, [])), stocks)
+            # 与输入顺序无关，且保持原有顺序
+            self.assertEqual(shards[1], shard_stocks(stocks[::-1], 4, 1, strategy, weights)[::-1])
+
+        loads = {}
+        for strategy in ("balanced", "hash"):
+            assignment = assign_shards(stocks, 4, strategy, weights)
+            per_shard = [sum(weights[s] for s, k in assignment.items() if k == shard) for shard in range(4)]
+            loads[strategy] = max(per_shard) - min(per_shard)
+        self.assertLessEqual(loads["balanced"], max(weights.values()))
+        self.assertLess(loads["balanced"], loads["hash"])
+
+        with self.assertRaises(ValueError):
+            shard_stocks(stocks, 4, 4)
+
+
+class TestMergeShards(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(str(self.root))
+
+    def test_validate_and_merge_csv(self):
+        universe = ["AAA", "BBB", "CCC"]
+        parts = [
+            (["AAA", "BBB"], "Symbol,Date,RSI\r\n代码,日期,相对强弱\r\nAAA,2024-01-02,1.5\r\nBBB,2024-01-02,\r\n"),
+            (["CCC"], "Symbol,Date,MACD\r\n代码,日期,指数平滑异同\r\nCCC,2024-01-02,0.25\r\n"),
+        ]
+        for k, (stocks, text) in enumerate(parts):
+            path = self.root.joinpath(f"indicators.shard{k:03d}-of-002.csv")
+            path.write_text(text, encoding="utf-8-sig")
+            write_shard_sidecar(path, 2, k, "balanced", universe, stocks, header_rows=2)
+
+        output = self.root.joinpath("indicators.csv")
+        summary = merge_shards(output)
+        self.assertEqual((summary["shards"], summary["stocks"], summary["rows"]), (2, 3, 3))
+        self.assertEqual(
+            output.read_bytes().decode("utf-8-sig"),
+            "Symbol,Date,RSI,MACD\r\n代码,日期,相对强弱,指数平滑异同\r\n"
+            "AAA,2024-01-02,1.5,\r\nBBB,2024-01-02,,\r\nCCC,2024-01-02,,0.25\r\n",
+        )
+
+        # 股票重叠与缺少分片时给出全部问题
+        write_shard_sidecar(self.root.joinpath("indicators.shard001-of-002.csv"), 2, 1, "balanced",
+                            universe, ["BBB", "CCC"], header_rows=2)
+        with self.assertRaisesRegex(ValueError, "BBB"):
+            validate_shards(output)
+        self.root.joinpath("indicators.shard001-of-002.csv.json").unlink()
+        with self.assertRaisesRegex(ValueError, r"缺少分片: \[1\]"):
+            merge_shards(output)
+
+    def test_sharded_runs_match_unsharded(self):
+        write_synthetic_tree(self.root, n_stocks=5, n_days=150)
+        for output_format in ("csv", "parquet"):
+            for k in range(2):
+                calculator = QlibIndicatorsEnhancedCalculator(
+                    data_dir=str(self.root), enable_parallel=False, num_shards=2, shard_index=k
+                )
+                calculator.run(output_filename="indicators.csv", output_format=output_format)
+            fresh = QlibIndicatorsEnhancedCalculator(data_dir=str(self.root), enable_parallel=False)
+            fresh.run(output_filename="expected.csv", output_format=output_format)
+
+            suffix = f".{output_format}"
+            shards = validate_shards(self.root.joinpath(f"indicators{suffix}"))
+            self.assertEqual(sorted(sum((info["stocks"] for info in shards), [])), synthetic_symbols(5))
+            merge_shards(self.root.joinpath(f"indicators{suffix}"), num_shards=2, remove_shards=True)
+            self.assertEqual(list(self.root.glob("indicators.shard*")), [])
+
+            if output_format == "csv":
+                merged, expected = read_output(self.root.joinpath("indicators.csv")), read_output(
+                    self.root.joinpath("expected.csv"))
+            else:
+                merged = pd.read_parquet(self.root.joinpath("indicators.parquet"))
+                expected = pd.read_parquet(self.root.joinpath("expected.parquet"))
+                merged = merged.sort_values(["Symbol", "Date"]).reset_index(drop=True)
+                expected = expected.sort_values(["Symbol", "Date"]).reset_index(drop=True)
+            pd.testing.assert_frame_equal(merged[expected.columns], expected, check_dtype=output_format != "csv")
+
+
+if __name__ == "__main__":
+    unittest.main()